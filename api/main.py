@@ -11,6 +11,7 @@ from .models import TestRequest, JobResponse, TestResult
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from operate.operate import run_automated_test
+from operate.utils.ocr_engine import ocr_engines
 
 # In-memory storage for job queue and results
 job_queue = queue.Queue()
@@ -42,6 +43,8 @@ def worker():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manages the startup and shutdown of the application."""
+    # Load EasyOCR before accepting jobs so the first test doesn't pay for it
+    ocr_engines.get_reader(["en"], gpu=True)
     # Start the worker thread
     worker_thread = threading.Thread(target=worker)
     worker_thread.start()
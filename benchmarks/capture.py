@@ -0,0 +1,81 @@
+"""
+Capture latency benchmark.
+
+Compares the screen capture backends on the current display, e.g. under Xvfb:
+
+    Xvfb :99 -screen 0 3840x2160x24 &
+    DISPLAY=:99 python -m benchmarks.capture --backend default --backend xshm
+"""
+import argparse
+import json
+import statistics
+import time
+
+from operate.utils.screenshot import CAPTURE_BACKENDS, get_capture_backend
+
+
+def benchmark_backend(name, iterations=50, warmup=3):
+    """
+    Times `iterations` captures with the named backend.
+
+    :param name: A key of `CAPTURE_BACKENDS`.
+    :return: A dictionary of latency statistics in milliseconds.
+    """
+    backend = get_capture_backend(name)
+    for _ in range(warmup):
+        backend.grab()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        image = backend.grab()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "backend": backend.name,
+        "size": list(image.size),
+        "iterations": iterations,
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ms": timings[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screen capture backends.")
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=sorted(CAPTURE_BACKENDS),
+        help="Backend to benchmark, can be repeated. Defaults to all of them.",
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.backend or sorted(CAPTURE_BACKENDS):
+        try:
+            results.append(benchmark_backend(name, args.iterations))
+        except Exception as e:
+            results.append({"backend": name, "error": str(e)})
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:>8}: unavailable ({result['error']})")
+        else:
+            print(
+                f"{result['backend']:>8}: {result['size'][0]}x{result['size'][1]} "
+                f"mean {result['mean_ms']:.1f}ms p50 {result['p50_ms']:.1f}ms "
+                f"p95 {result['p95_ms']:.1f}ms max {result['max_ms']:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Detector latency and parity benchmark.
+
+Runs the set-of-marks detector backends over recorded screenshots and
+compares the ONNX boxes with the ultralytics ones:
+
+    pip install -r requirements-onnx.txt
+    python -m benchmarks.detector screenshots/*.png --threads 4
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from operate.config import Config
+from operate.models.detector import DETECTOR_BACKENDS, box_iou, detectors
+
+config = Config()
+
+
+def match_boxes(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily pairs boxes of two detections by intersection over union.
+
+    :return: A list of IoU values of the matched pairs.
+    """
+    unmatched = list(range(len(candidate)))
+    ious = []
+    for box in reference:
+        if not unmatched:
+            break
+        overlaps = box_iou(box, candidate[unmatched])
+        best = int(overlaps.argmax())
+        if overlaps[best] >= iou_threshold:
+            ious.append(float(overlaps[best]))
+            unmatched.pop(best)
+    return ious
+
+
+def benchmark_backend(name, images, iterations=5):
+    """
+    Times `iterations` detections per image with the named backend.
+
+    :return: The latency statistics in milliseconds and the boxes found per image.
+    """
+    detector = detectors.get_detector(backend=name, warmup=True)
+
+    timings, boxes = [], []
+    for image in images:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            detections = detector.detect(image)
+            timings.append((time.perf_counter() - start) * 1000)
+        boxes.append(detections.xyxy)
+
+    timings.sort()
+    return {
+        "backend": name,
+        "load_time": detector.load_time,
+        "warmup_time": detector.warmup_time,
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "boxes": sum(len(image_boxes) for image_boxes in boxes),
+    }, boxes
+
+
+def parity(reference_boxes, candidate_boxes):
+    """
+    Summarizes how well one backend's detections reproduce another's.
+    """
+    reference_total = sum(len(boxes) for boxes in reference_boxes)
+    candidate_total = sum(len(boxes) for boxes in candidate_boxes)
+    ious = []
+    for reference, candidate in zip(reference_boxes, candidate_boxes):
+        ious.extend(match_boxes(reference, candidate))
+    return {
+        "matched": len(ious),
+        "recall": len(ious) / reference_total if reference_total else 1.0,
+        "precision": len(ious) / candidate_total if candidate_total else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the set-of-marks detector backends.")
+    parser.add_argument("screenshots", nargs="+", help="Screenshot files or directories")
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=sorted(DETECTOR_BACKENDS),
+        help="Backend to benchmark, can be repeated. Defaults to all of them.",
+    )
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    parser.add_argument("--threads", type=int, help="onnxruntime thread count")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    if args.threads is not None:
+        config.detector_threads = args.threads
+
+    paths = []
+    for path in args.screenshots:
+        if os.path.isdir(path):
+            paths.extend(sorted(glob.glob(os.path.join(path, "*.png"))))
+        else:
+            paths.append(path)
+    images = [Image.open(path).convert("RGB") for path in paths]
+
+    results, boxes = [], {}
+    for name in args.backend or ["ultralytics", "onnx"]:
+        try:
+            result, boxes[name] = benchmark_backend(name, images, args.iterations)
+            results.append(result)
+        except Exception as e:
+            results.append({"backend": name, "error": str(e)})
+
+    if "ultralytics" in boxes:
+        for result in results:
+            if result["backend"] != "ultralytics" and result["backend"] in boxes:
+                result["parity"] = parity(boxes["ultralytics"], boxes[result["backend"]])
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    print(f"{len(images)} screenshots, {args.iterations} iterations each")
+    for result in results:
+        if "error" in result:
+            print(f"{result['backend']:>12}: unavailable ({result['error']})")
+            continue
+        print(
+            f"{result['backend']:>12}: load {result['load_time']:.2f}s "
+            f"mean {result['mean_ms']:.1f}ms p50 {result['p50_ms']:.1f}ms "
+            f"p95 {result['p95_ms']:.1f}ms boxes {result['boxes']}"
+        )
+        if "parity" in result:
+            match = result["parity"]
+            mean_iou = f"{match['mean_iou']:.3f}" if match["mean_iou"] is not None else "n/a"
+            print(
+                f"{'':>12}  vs ultralytics: recall {match['recall']:.3f} "
+                f"precision {match['precision']:.3f} mean IoU {mean_iou}"
+            )
+
+
+if __name__ == "__main__":
+    main()
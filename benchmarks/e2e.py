@@ -0,0 +1,232 @@
+"""
+Hermetic end-to-end benchmark of the agent loop.
+
+Starts a virtual display, the synthetic scene of `benchmarks.scene` and
+the mock model API of `benchmarks.mock_server`, then runs the operation
+loop against them and reports the latency of each stage from the session
+log: settling, capture, the model call, OCR hidden behind it and every
+executed operation. Nothing leaves the machine, so runs are repeatable in
+CI:
+
+    python -m benchmarks.e2e --xvfb --latency 0.8 --runs 3
+    python -m benchmarks.e2e --xvfb --stream --chunk-latency 0.05 --json
+    python -m benchmarks.e2e --xvfb --model claude-3
+
+Each model is run in turn, gpt-4-with-ocr and gemini-2.5-flash by default.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_server import MockServer, ScriptedReplies, load_script
+from benchmarks.scene import load_scene
+from benchmarks.stats import summarize
+
+# One model per API of the mock server that the OCR scene can be run with
+DEFAULT_MODELS = ("gpt-4-with-ocr", "gemini-2.5-flash")
+DEFAULT_OBJECTIVE = "Fill in the benchmark form with the name Ada Lovelace and submit it"
+
+
+def start_xvfb(size="1280x800", timeout=10):
+    """
+    Starts Xvfb on the first free display and points `DISPLAY` at it.
+
+    :return: The Xvfb process.
+    """
+    if shutil.which("Xvfb") is None:
+        raise RuntimeError("Xvfb is not installed")
+    display = 99
+    while os.path.exists(f"/tmp/.X11-unix/X{display}") or os.path.exists(f"/tmp/.X{display}-lock"):
+        display += 1
+    process = subprocess.Popen(
+        ["Xvfb", f":{display}", "-screen", "0", f"{size}x24", "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while not os.path.exists(f"/tmp/.X11-unix/X{display}"):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError(f"Xvfb did not start on :{display}")
+        time.sleep(0.05)
+    os.environ["DISPLAY"] = f":{display}"
+    return process
+
+
+def read_events(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def start_scene(scene_path, events_path, timeout=10):
+    """
+    Starts the scene in a subprocess and waits until its first screen is shown.
+    """
+    command = [sys.executable, "-m", "benchmarks.scene", "--events", events_path]
+    if scene_path:
+        command += ["--scene", scene_path]
+    process = subprocess.Popen(command)
+    deadline = time.time() + timeout
+    while not read_events(events_path):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError("The scene did not start")
+        time.sleep(0.05)
+    # Give the window a moment to be mapped and drawn
+    time.sleep(0.5)
+    return process
+
+
+def stage_timings(log_data):
+    """
+    Returns the durations of a session log in seconds, per stage.
+    """
+    stages = {}
+
+    def add(stage, seconds):
+        if seconds is not None:
+            stages.setdefault(stage, []).append(seconds)
+
+    for step in log_data["steps"]:
+        operation = step["operation"]
+        kind = operation.get("operation")
+        if kind == "model_call":
+            add("settle", operation.get("settle_time"))
+            add("capture", operation.get("capture_time"))
+            add("model_call", step["duration"])
+            add("first_operation", operation.get("first_operation_time"))
+            add("hidden_ocr", operation.get("hidden_ocr_time"))
+        else:
+            add(kind, step["duration"])
+    return stages
+
+
+def run_session(model, objective, log_dir):
+    """
+    Runs one session of the operation loop the way `run_automated_test` does, logging to `log_dir`.
+
+    :return: The session log.
+    """
+    # The agent connects to the display on import, so it is imported once the display is up
+    from operate.models.prompts import get_system_prompt
+    from operate.operate import _run_operation_loop, config
+    from operate.utils.logger import Logger
+
+    config.validation(model, voice_mode=False)
+    logger = Logger(log_dir=log_dir)
+    logger.log_task_info(objective, model)
+    messages = [{"role": "system", "content": get_system_prompt(model, objective)}]
+    _run_operation_loop(model, objective, messages, logger, use_gpu=False)
+    return logger.log_data
+
+
+def benchmark(args):
+    xvfb = start_xvfb(args.screen) if args.xvfb else None
+    replies = ScriptedReplies(load_script(args.script), args.latency, args.chunk_latency, args.chunk_size)
+    server = MockServer(replies)
+    server.start()
+    os.environ.update(server.environment())
+    os.environ["OPERATE_STREAM"] = "1" if args.stream else "0"
+
+    screens = load_scene(args.scene)
+    work_dir = tempfile.mkdtemp(prefix="operate-e2e-")
+    results = []
+    try:
+        for model in args.models:
+            runs = []
+            stages = {}
+            for index in range(args.runs):
+                replies.reset()
+                events_path = os.path.join(work_dir, f"scene-{model}-{index}.jsonl")
+                scene = start_scene(args.scene, events_path)
+                run = {"run": index}
+                try:
+                    log_data = run_session(model, args.objective, os.path.join(work_dir, "logs"))
+                    run["total_time"] = log_data["summary"]["total_time"]
+                    run["steps"] = len(log_data["steps"])
+                    run["tokens"] = log_data["summary"]["tokens"]
+                    for stage, timings in stage_timings(log_data).items():
+                        stages.setdefault(stage, []).extend(timings)
+                except Exception as e:
+                    run["error"] = str(e)
+                finally:
+                    scene.terminate()
+                    scene.wait()
+                shown = [event["screen"] for event in read_events(events_path) if event["event"] == "show"]
+                run["completed"] = bool(shown) and shown[-1] == len(screens) - 1
+                runs.append(run)
+            results.append(
+                {
+                    "model": model,
+                    "runs": runs,
+                    "stages": {stage: summarize(timings) for stage, timings in stages.items()},
+                    "mock_server": replies.stats(),
+                }
+            )
+    finally:
+        server.stop()
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "stream": args.stream,
+        "latency": args.latency,
+        "chunk_latency": args.chunk_latency,
+        "models": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent loop against a mock model and a synthetic scene.")
+    parser.add_argument(
+        "--model",
+        dest="models",
+        action="append",
+        help=f"A model to run, may be repeated (default: {', '.join(DEFAULT_MODELS)})",
+    )
+    parser.add_argument("--objective", default=DEFAULT_OBJECTIVE)
+    parser.add_argument("--script", help="Mock server replies, see benchmarks.mock_server")
+    parser.add_argument("--scene", help="Scene screens, see benchmarks.scene")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the mock's first byte")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="Stream model replies")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--xvfb", action="store_true", help="Run on a new Xvfb display")
+    parser.add_argument("--screen", default="1280x800", help="Xvfb screen size")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    args.models = args.models or list(DEFAULT_MODELS)
+
+    results = benchmark(args)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+
+    for result in results["models"]:
+        print(result["model"])
+        for run in result["runs"]:
+            if "error" in run:
+                print(f"run {run['run']}: failed ({run['error']})")
+            else:
+                status = "completed" if run["completed"] else "incomplete"
+                print(f"run {run['run']}: {status} in {run['total_time']:.2f}s, {run['steps']} logged steps")
+        for stage, summary in result["stages"].items():
+            print(
+                f"{stage:>16}: n {summary['count']:>3} mean {summary['mean_ms']:.1f}ms "
+                f"p50 {summary['p50_ms']:.1f}ms p95 {summary['p95_ms']:.1f}ms p99 {summary['p99_ms']:.1f}ms "
+                f"max {summary['max_ms']:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Offline stand-in for the model APIs.
+
+Serves the OpenAI chat completions, Anthropic messages and Gemini
+generateContent endpoints, streaming included, and answers every request
+with the next reply of a script instead of asking a model. Requests for
+schema-constrained output get the reply in that form. A script is a
+JSON list of replies, each a list of operations or a raw string, or the
+`trajectory.json` of a `--record` run. Latency is added before the first
+byte and between streamed chunks so runs look like a real provider.
+
+    python -m benchmarks.mock_server --script replies.json --latency 0.8
+    OPENAI_API_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=mock operate --model gpt-4-with-ocr
+
+Claude and Gemini models are pointed at it with `ANTHROPIC_API_BASE_URL`
+and `GOOGLE_API_BASE_URL` (without a path).
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+# Replies for the scene of `benchmarks.scene` when no script is given
+DEFAULT_SCRIPT = [
+    [{"thought": "Open the form", "operation": "click", "text": "Start"}],
+    [
+        {"thought": "Enter the name", "operation": "write", "content": "Ada Lovelace"},
+        {"thought": "Submit the form", "operation": "click", "text": "Submit"},
+    ],
+    [{"thought": "The form was submitted", "operation": "done", "summary": "Submitted the form"}],
+]
+
+# A screenshot counts like a high detail OpenAI image
+IMAGE_TOKENS = 765
+
+
+def load_script(path=None):
+    """
+    Returns the reply texts of a script file, or of `DEFAULT_SCRIPT` without a path.
+
+    :param path: A JSON list of replies or the `trajectory.json` of a recording.
+    """
+    if path is None:
+        replies = DEFAULT_SCRIPT
+    else:
+        with open(path) as file:
+            replies = json.load(file)
+        if isinstance(replies, dict) and "steps" in replies:
+            replies = [
+                step["response"] or step["operations"]
+                for step in replies["steps"]
+                if step["operations"]
+            ]
+    if not replies:
+        raise ValueError(f"The script {path} has no replies")
+    return [reply if isinstance(reply, str) else json.dumps(reply) for reply in replies]
+
+
+def structured(reply):
+    """
+    Returns a reply in the `{"operations": [...]}` form of schema-constrained output.
+    """
+    try:
+        operations = json.loads(reply)
+    except ValueError:
+        return reply
+    if isinstance(operations, dict):
+        operations = operations.get("operations", [operations])
+    return json.dumps({"operations": operations})
+
+
+def estimate_tokens(value):
+    """
+    Roughly counts the tokens of a request body, four characters per token and a fixed count per image.
+    """
+    if isinstance(value, str):
+        if len(value) > 1000 and " " not in value[:1000]:
+            return IMAGE_TOKENS
+        return max(1, len(value) // 4)
+    if isinstance(value, dict):
+        return sum(estimate_tokens(item) for item in value.values())
+    if isinstance(value, list):
+        return sum(estimate_tokens(item) for item in value)
+    return 0
+
+
+class ScriptedReplies:
+    """
+    Hands out the replies of a script in order and remembers the last request of each API.
+
+    Once the script runs out the last reply is repeated, usually the `done`
+    operation. Consecutive requests that start with the same messages report
+    those as cached tokens, like a provider's prompt cache would.
+
+    Attributes:
+        latency (float): Seconds before the first byte of a reply.
+        chunk_latency (float): Seconds between streamed chunks.
+        chunk_size (int): Characters per streamed chunk.
+        requests (dict): Requests served per API.
+    """
+
+    def __init__(self, replies, latency=0.0, chunk_latency=0.0, chunk_size=16):
+        self.replies = replies
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunk_size = max(1, chunk_size)
+        self.requests = {}
+        self._cursor = 0
+        self._previous = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._cursor = 0
+            self._previous = {}
+            self.requests = {}
+
+    def next(self, api, messages):
+        """
+        Returns the next reply and the token usage of the request that asked for it.
+        """
+        with self._lock:
+            reply = self.replies[min(self._cursor, len(self.replies) - 1)]
+            self._cursor += 1
+            self.requests[api] = self.requests.get(api, 0) + 1
+
+            previous = self._previous.get(api, [])
+            shared = 0
+            while shared < min(len(previous), len(messages)) and previous[shared] == messages[shared]:
+                shared += 1
+            self._previous[api] = messages
+
+        usage = {
+            "input_tokens": estimate_tokens(messages),
+            "output_tokens": estimate_tokens(reply),
+            "cached_tokens": estimate_tokens(messages[:shared]),
+        }
+        return reply, usage
+
+    def chunks(self, reply):
+        return [reply[i : i + self.chunk_size] for i in range(0, len(reply), self.chunk_size)]
+
+    def stats(self):
+        return {"replies": len(self.replies), "served": self._cursor, "requests": dict(self.requests)}
+
+
+async def _sse(request, events):
+    """
+    Writes `events`, pairs of an event name or None and a payload, as server-sent events.
+    """
+    replies = request.app["replies"]
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    for index, (event, payload) in enumerate(events):
+        if index and replies.chunk_latency:
+            await asyncio.sleep(replies.chunk_latency)
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        line = f"event: {event}\ndata: {data}\n\n" if event else f"data: {data}\n\n"
+        await response.write(line.encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+async def openai_chat_completions(request):
+    body = await request.json()
+    replies = request.app["replies"]
+    reply, usage = replies.next("openai", body.get("messages", []))
+    if (body.get("response_format") or {}).get("type") == "json_schema":
+        reply = structured(reply)
+    await asyncio.sleep(replies.latency)
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    openai_usage = {
+        "prompt_tokens": usage["input_tokens"],
+        "completion_tokens": usage["output_tokens"],
+        "total_tokens": usage["input_tokens"] + usage["output_tokens"],
+        "prompt_tokens_details": {"cached_tokens": usage["cached_tokens"]},
+    }
+    if not body.get("stream"):
+        return web.json_response(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": openai_usage,
+            }
+        )
+
+    def chunk(delta, finish_reason=None):
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    events = [(None, chunk({"role": "assistant", "content": ""}))]
+    events += [(None, chunk({"content": text})) for text in replies.chunks(reply)]
+    events.append((None, chunk({}, "stop")))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        events.append((None, {**chunk({}), "choices": [], "usage": openai_usage}))
+    events.append((None, "[DONE]"))
+    return await _sse(request, events)
+
+
+async def anthropic_messages(request):
+    body = await request.json()
+    replies = request.app["replies"]
+    reply, usage = replies.next("anthropic", [body.get("system")] + body.get("messages", []))
+    await asyncio.sleep(replies.latency)
+
+    # A forced tool call answers with the tool input instead of text
+    tool_choice = body.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool" and structured(reply) != reply:
+        reply = structured(reply)
+        block = {
+            "type": "tool_use",
+            "id": f"toolu_{uuid.uuid4().hex}",
+            "name": tool_choice["name"],
+            "input": json.loads(reply),
+        }
+        empty_block, delta_type, delta_field = {**block, "input": {}}, "input_json_delta", "partial_json"
+    else:
+        block = {"type": "text", "text": reply}
+        empty_block, delta_type, delta_field = {"type": "text", "text": ""}, "text_delta", "text"
+
+    message = {
+        "id": f"msg_{uuid.uuid4().hex}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model"),
+        "content": [block],
+        "stop_reason": "tool_use" if block["type"] == "tool_use" else "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": usage["input_tokens"] - usage["cached_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "cache_read_input_tokens": usage["cached_tokens"],
+            "cache_creation_input_tokens": 0,
+        },
+    }
+    if not body.get("stream"):
+        return web.json_response(message)
+
+    start = {**message, "content": [], "stop_reason": None, "usage": {**message["usage"], "output_tokens": 1}}
+    events = [
+        ("message_start", {"type": "message_start", "message": start}),
+        ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": empty_block}),
+    ]
+    events += [
+        (
+            "content_block_delta",
+            {"type": "content_block_delta", "index": 0, "delta": {"type": delta_type, delta_field: text}},
+        )
+        for text in replies.chunks(reply)
+    ]
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        (
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": message["stop_reason"], "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]},
+            },
+        ),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return await _sse(request, events)
+
+
+async def gemini_generate_content(request):
+    model, _, method = request.match_info["model"].partition(":")
+    if method not in ("generateContent", "streamGenerateContent"):
+        raise web.HTTPNotFound(text=f"Unknown method {method}")
+    body = await request.json()
+    replies = request.app["replies"]
+    reply, usage = replies.next("gemini", [body.get("systemInstruction")] + body.get("contents", []))
+    if (body.get("generationConfig") or {}).get("responseMimeType") == "application/json":
+        reply = structured(reply)
+    await asyncio.sleep(replies.latency)
+
+    def candidate(text, usage_metadata=None):
+        response = {
+            "candidates": [
+                {
+                    "content": {"role": "model", "parts": [{"text": text}]},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }
+            ]
+        }
+        if usage_metadata:
+            response["usageMetadata"] = usage_metadata
+        return response
+
+    usage_metadata = {
+        "promptTokenCount": usage["input_tokens"],
+        "candidatesTokenCount": usage["output_tokens"],
+        "totalTokenCount": usage["input_tokens"] + usage["output_tokens"],
+        "cachedContentTokenCount": usage["cached_tokens"],
+    }
+    if method == "generateContent":
+        return web.json_response(candidate(reply, usage_metadata))
+
+    chunks = replies.chunks(reply)
+    responses = [candidate(text, usage_metadata if index == len(chunks) - 1 else None) for index, text in enumerate(chunks)]
+    if request.query.get("alt") == "sse":
+        return await _sse(request, [(None, response) for response in responses])
+
+    # Without `alt=sse` the REST API streams one JSON array
+    response = web.StreamResponse(headers={"Content-Type": "application/json"})
+    await response.prepare(request)
+    for index, item in enumerate(responses):
+        if index and replies.chunk_latency:
+            await asyncio.sleep(replies.chunk_latency)
+        prefix = "[" if index == 0 else ",\n"
+        await response.write((prefix + json.dumps(item)).encode("utf-8"))
+    await response.write(b"]")
+    await response.write_eof()
+    return response
+
+
+async def reset(request):
+    request.app["replies"].reset()
+    return web.json_response({"reset": True})
+
+
+async def stats(request):
+    return web.json_response(request.app["replies"].stats())
+
+
+def create_app(replies):
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["replies"] = replies
+    app.router.add_post("/v1/chat/completions", openai_chat_completions)
+    app.router.add_post("/v1/messages", anthropic_messages)
+    app.router.add_post("/v1beta/models/{model}", gemini_generate_content)
+    app.router.add_post("/v1/models/{model}", gemini_generate_content)
+    app.router.add_post("/mock/reset", reset)
+    app.router.add_get("/mock/stats", stats)
+    return app
+
+
+class MockServer:
+    """
+    Runs the mock API in a daemon thread, for harnesses that drive the agent in the same process.
+
+    Attributes:
+        replies (ScriptedReplies): The script being served.
+        url (str): The server's base URL once started.
+    """
+
+    def __init__(self, replies, host="127.0.0.1", port=0):
+        self.replies = replies
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def start(self):
+        started = threading.Event()
+        errors = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._runner = web.AppRunner(create_app(self.replies), access_log=None)
+                self._loop.run_until_complete(self._runner.setup())
+                site = web.TCPSite(self._runner, self.host, self.port)
+                self._loop.run_until_complete(site.start())
+                port = self._runner.addresses[0][1]
+                self.url = f"http://{self.host}:{port}"
+            except Exception as e:
+                errors.append(e)
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name="mock-model-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        return self.url
+
+    def stop(self):
+        if self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop)
+        future.result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def environment(self):
+        """
+        Returns the environment variables that point every provider at this server.
+        """
+        return {
+            "OPENAI_API_BASE_URL": f"{self.url}/v1",
+            "OPENAI_API_KEY": "mock",
+            "ANTHROPIC_API_BASE_URL": self.url,
+            "ANTHROPIC_API_KEY": "mock",
+            "GOOGLE_API_BASE_URL": self.url,
+            "GOOGLE_API_KEY": "mock",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve scripted model replies on the provider APIs.")
+    parser.add_argument("--script", help="JSON list of replies or a recorded trajectory.json")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    replies = ScriptedReplies(load_script(args.script), args.latency, args.chunk_latency, args.chunk_size)
+    web.run_app(create_app(replies), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Synthetic screen for end-to-end benchmarks.
+
+Shows a scripted sequence of screens in a full screen Tk window, meant to
+run under Xvfb next to `benchmarks.mock_server`. Each screen has a title,
+an optional text entry and a button that moves on to the next screen, in
+large type so OCR finds the text reliably. The default scene matches the
+default script of the mock server.
+
+    Xvfb :99 -screen 0 1280x800x24 &
+    DISPLAY=:99 python -m benchmarks.scene --events scene.jsonl
+"""
+import argparse
+import json
+import time
+import tkinter as tk
+
+DEFAULT_SCENE = [
+    {"title": "Welcome to the benchmark", "button": "Start"},
+    {"title": "Tell us who you are", "entry": "Name", "button": "Submit"},
+    {"title": "Thank you, all done"},
+]
+
+
+def load_scene(path=None):
+    """
+    Returns the screens of a scene file, or `DEFAULT_SCENE` without a path.
+
+    :param path: A JSON list of screens with a `title` and optionally an `entry` label and a `button`.
+    """
+    if path is None:
+        return DEFAULT_SCENE
+    with open(path) as file:
+        return json.load(file)
+
+
+class Scene:
+    """
+    Steps through the screens of a scene, one per button press.
+
+    Every screen shown and every button press is appended to `events_path`
+    as a JSON line, so a harness can check how far the agent got.
+    """
+
+    def __init__(self, screens, events_path=None, font_size=32):
+        self.screens = screens
+        self.events_path = events_path
+        self.font = ("Helvetica", font_size)
+        self.index = 0
+        self.entry = None
+
+        self.root = tk.Tk()
+        self.root.title("Benchmark scene")
+        self.root.configure(background="white")
+        self.root.attributes("-fullscreen", True)
+        self.frame = None
+        self.show(0)
+
+    def log(self, event, **data):
+        if self.events_path is None:
+            return
+        with open(self.events_path, "a") as file:
+            file.write(json.dumps({"event": event, "screen": self.index, "time": time.time(), **data}) + "\n")
+
+    def show(self, index):
+        if self.frame is not None:
+            self.frame.destroy()
+        self.index = index
+        screen = self.screens[index]
+
+        self.frame = tk.Frame(self.root, background="white")
+        self.frame.place(relx=0.5, rely=0.5, anchor="center")
+        tk.Label(self.frame, text=screen["title"], font=self.font, background="white").pack(pady=30)
+
+        self.entry = None
+        if screen.get("entry"):
+            tk.Label(self.frame, text=screen["entry"], font=self.font, background="white").pack()
+            self.entry = tk.Entry(self.frame, font=self.font, width=20)
+            self.entry.pack(pady=20)
+            self.entry.bind("<Return>", lambda _: self.next())
+            self.entry.focus_force()
+
+        if screen.get("button"):
+            tk.Button(self.frame, text=screen["button"], font=self.font, command=self.next).pack(pady=30)
+        self.log("show", title=screen["title"])
+
+    def next(self):
+        screen = self.screens[self.index]
+        self.log("press", button=screen.get("button"), entry=self.entry.get() if self.entry else None)
+        if self.index + 1 < len(self.screens):
+            self.show(self.index + 1)
+
+    def run(self):
+        self.root.mainloop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a scripted scene for end-to-end benchmarks.")
+    parser.add_argument("--scene", help="JSON list of screens")
+    parser.add_argument("--events", help="File the scene's events are appended to as JSON lines")
+    parser.add_argument("--font-size", type=int, default=32)
+    args = parser.parse_args()
+
+    Scene(load_scene(args.scene), args.events, args.font_size).run()
+
+
+if __name__ == "__main__":
+    main()
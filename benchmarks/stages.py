@@ -0,0 +1,349 @@
+"""
+Per-stage latency benchmark of the See-Think-Act loop.
+
+Times every stage a step goes through on recorded screenshots, or on
+synthetic 1080p and 4K frames when none are given: resizing, PNG and JPEG
+encoding, base64, EasyOCR, the text lookup behind clicks, set-of-marks
+labeling, prompt assembly and reply parsing. Capture and the
+`OperatingSystem` actions need a display and move the real cursor, so
+they only run when requested. Results are p50/p95/p99 latencies per stage
+and frame, as JSON that can be compared with an earlier run:
+
+    python -m benchmarks.stages --json --output stages.json
+    python -m benchmarks.stages screenshots/ --baseline stages.json
+    DISPLAY=:99 python -m benchmarks.stages --stage capture --stage actions
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from benchmarks.stats import summarize
+from operate.config import Config
+from operate.models.detector import detectors
+from operate.models.prompts import get_system_prompt
+from operate.models.providers import get_provider
+from operate.models.providers.stages import parse_operations
+from operate.utils.event_loop import background_loop
+from operate.utils.frame import Frame
+from operate.utils.label import add_labels
+from operate.utils.ocr import OCRResult, get_text_element
+from operate.utils.ocr_engine import ocr_engines
+
+config = Config()
+
+SYNTHETIC_SIZES = {"1080p": (1920, 1080), "4k": (3840, 2160)}
+WORDS = [
+    "File", "Edit", "View", "History", "Bookmarks", "Tools", "Help", "Submit",
+    "Cancel", "Settings", "Search", "Sign in", "Profile", "Save", "Open",
+    "Close", "New tab", "Window", "Display", "Network", "Account",
+]
+SAMPLE_REPLY = """```json
+[
+    {"thought": "Open the search bar", "operation": "press", "keys": ["ctrl", "l"]},
+    {"thought": "Type the address", "operation": "write", "content": "github.com"},
+    {"thought": "Sign in", "operation": "click", "text": "Sign in"}
+]
+```"""
+
+FRAME_STAGES = (
+    "resize",
+    "encode_png",
+    "encode_jpeg",
+    "base64",
+    "ocr",
+    "text_lookup",
+    "add_labels",
+    "prompt",
+    "json_parse",
+)
+DISPLAY_STAGES = ("capture", "actions")
+# Stages that load a model and take seconds per frame on a CPU
+SLOW_STAGES = ("ocr", "add_labels")
+
+
+def synthetic_frame(width, height, seed=0):
+    """
+    Draws a screen full of UI words.
+
+    :return: The image and the drawn words as EasyOCR (bounding_box, text, confidence) tuples.
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(10, height // 54))
+    elements = []
+    row_height = height // 27
+    for y in range(row_height, height - row_height, row_height * 2):
+        x = rng.randint(0, row_height)
+        while x < width - row_height * 6:
+            text = rng.choice(WORDS)
+            left, top, right, bottom = draw.textbbox((x, y), text, font=font)
+            draw.text((x, y), text, fill="black", font=font)
+            elements.append(([[left, top], [right, top], [right, bottom], [left, bottom]], text, 0.99))
+            x = right + rng.randint(row_height, row_height * 4)
+    return image, elements
+
+
+def load_frames(paths):
+    """
+    Returns (name, image, OCR elements or None) for the given screenshots, or synthetic frames without paths.
+    """
+    if not paths:
+        return [(name, *synthetic_frame(*size)) for name, size in SYNTHETIC_SIZES.items()]
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.png"))))
+        else:
+            files.append(path)
+    return [(os.path.basename(path), Image.open(path).convert("RGB"), None) for path in files]
+
+
+def time_calls(run, iterations, setup=None):
+    """
+    Times `run` once per iteration after an untimed warmup call.
+
+    :param setup: Called before each call, untimed, to build its argument, e.g. a frame without cached encodings.
+    :return: The durations in seconds.
+    """
+    run(setup() if setup else None)
+    timings = []
+    for _ in range(iterations):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        run(argument)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+class StageBenchmark:
+    """
+    Times the stages of a step on one frame after another.
+
+    The OCR result of a frame is reused by its text lookup, synthetic frames
+    bring the words they were drawn with so the lookup also runs without
+    EasyOCR.
+    """
+
+    def __init__(self, model, iterations, slow_iterations, resize_width, gpu=False):
+        self.model = model
+        self.iterations = iterations
+        self.slow_iterations = slow_iterations
+        self.resize_width = resize_width
+        self.gpu = gpu
+        # id(image) -> the EasyOCR result of the frame
+        self._ocr_elements = {}
+
+    def run(self, stage, image, elements):
+        iterations = self.slow_iterations if stage in SLOW_STAGES else self.iterations
+        return getattr(self, f"stage_{stage}")(image, elements, iterations)
+
+    def stage_resize(self, image, elements, iterations):
+        return time_calls(lambda frame: frame.resized(self.resize_width), iterations, lambda: Frame(image))
+
+    def stage_encode_png(self, image, elements, iterations):
+        return time_calls(lambda frame: frame.encode("PNG"), iterations, lambda: Frame(image))
+
+    def stage_encode_jpeg(self, image, elements, iterations):
+        return time_calls(lambda frame: frame.encode("JPEG", quality=85), iterations, lambda: Frame(image))
+
+    def stage_base64(self, image, elements, iterations):
+        encoded = Frame(image).encode("PNG")
+        return time_calls(lambda _: base64.b64encode(encoded).decode("utf-8"), iterations)
+
+    def stage_ocr(self, image, elements, iterations):
+        reader = ocr_engines.get_reader(["en"], gpu=self.gpu)
+        frame = Frame(image)
+
+        def read(_):
+            self._ocr_elements[id(image)] = reader.readtext(frame.array)
+
+        return time_calls(read, iterations)
+
+    def stage_text_lookup(self, image, elements, iterations):
+        frame = Frame(image)
+        if elements is None:
+            elements = self._ocr_elements.get(id(image))
+        if elements is None:
+            reader = ocr_engines.get_reader(["en"], gpu=self.gpu)
+            elements = reader.readtext(frame.array)
+        if not elements:
+            raise ValueError("no text on the frame")
+        query = elements[len(elements) // 2][1]
+
+        def lookup(_):
+            # A fresh result per step, so its text index is built again like on every new frame
+            get_text_element(OCRResult.from_easyocr(elements, frame.size), query, frame)
+
+        return time_calls(lookup, iterations)
+
+    def stage_add_labels(self, image, elements, iterations):
+        detector = detectors.get_detector()
+        return time_calls(lambda frame: add_labels(frame, detector), iterations, lambda: Frame(image))
+
+    def stage_prompt(self, image, elements, iterations):
+        provider = get_provider(self.model)
+        frame = Frame(image)
+        objective = "Benchmark the prompt"
+
+        def prepare(_):
+            messages = [{"role": "system", "content": get_system_prompt(self.model, objective)}]
+            background_loop.run(provider.prepare(self.model, messages, objective, frame))
+
+        # The frame's encoding is cached by the warmup call, only the assembly is timed
+        return time_calls(prepare, iterations)
+
+    def stage_json_parse(self, image, elements, iterations):
+        return time_calls(lambda _: parse_operations(SAMPLE_REPLY), iterations)
+
+    def stage_capture(self, iterations):
+        # Imported here, pyautogui needs a display
+        from operate.utils.screenshot import capture_screen_with_cursor
+
+        return time_calls(lambda _: capture_screen_with_cursor(), iterations)
+
+    def stage_actions(self, iterations):
+        from operate.utils.operating_system import OperatingSystem
+
+        operating_system = OperatingSystem()
+        positions = iter([{"x": "0.4", "y": "0.4"}, {"x": "0.6", "y": "0.6"}] * (iterations + 1))
+        return {
+            "action_move": time_calls(lambda _: operating_system.mouse(next(positions), click=False), iterations),
+            "action_write": time_calls(lambda _: operating_system.write("abc"), iterations),
+            "action_press": time_calls(lambda _: operating_system.press(["shift"]), iterations),
+        }
+
+
+def benchmark(stages, frames, bench):
+    """
+    Runs the stages on every frame.
+
+    :return: A list of results, one per stage and frame, with latency statistics or an error.
+    """
+    results = []
+
+    def add(stage, frame_name, size, timings):
+        results.append({"stage": stage, "frame": frame_name, "size": size, **summarize(timings)})
+
+    for stage in stages:
+        if stage in DISPLAY_STAGES:
+            try:
+                timings = getattr(bench, f"stage_{stage}")(bench.iterations)
+            except Exception as e:
+                results.append({"stage": stage, "frame": "display", "error": str(e)})
+                continue
+            if isinstance(timings, dict):
+                for name, action_timings in timings.items():
+                    add(name, "display", None, action_timings)
+            else:
+                add(stage, "display", None, timings)
+            continue
+
+        for frame_name, image, elements in frames:
+            try:
+                add(stage, frame_name, list(image.size), bench.run(stage, image, elements))
+            except Exception as e:
+                results.append({"stage": stage, "frame": frame_name, "error": str(e)})
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds the stages whose p50 grew by more than `tolerance` since the baseline run.
+
+    :return: A list of (stage, frame, baseline p50, p50) tuples.
+    """
+    previous = {
+        (result["stage"], result["frame"]): result["p50_ms"]
+        for result in baseline["results"]
+        if "error" not in result
+    }
+    regressions = []
+    for result in results:
+        key = (result["stage"], result["frame"])
+        if "error" in result or key not in previous:
+            continue
+        if result["p50_ms"] > previous[key] * (1 + tolerance):
+            regressions.append((*key, previous[key], result["p50_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of an agent step.")
+    parser.add_argument("screenshots", nargs="*", help="Screenshot files or directories, synthetic 1080p and 4K frames by default")
+    parser.add_argument(
+        "--stage",
+        action="append",
+        choices=FRAME_STAGES + DISPLAY_STAGES,
+        help="Stage to benchmark, can be repeated. Defaults to all stages that need no display.",
+    )
+    parser.add_argument("--model", default="gpt-4-with-ocr", help="Model whose prompt is assembled")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--slow-iterations", type=int, default=3, help="Iterations of OCR and labeling")
+    parser.add_argument("--resize-width", type=int, default=1280)
+    parser.add_argument("--gpu", action="store_true", help="Run EasyOCR on the GPU")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare p50 latencies with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 growth over the baseline")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    frames = load_frames(args.screenshots)
+    bench = StageBenchmark(args.model, args.iterations, args.slow_iterations, args.resize_width, args.gpu)
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "time": time.time(),
+        },
+        "iterations": args.iterations,
+        "slow_iterations": args.slow_iterations,
+        "frames": [{"frame": name, "size": list(image.size)} for name, image, _ in frames],
+        "results": benchmark(args.stage or FRAME_STAGES, frames, bench),
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report["results"], json.load(file), args.tolerance)
+        report["regressions"] = [
+            {"stage": stage, "frame": frame, "baseline_p50_ms": before, "p50_ms": after}
+            for stage, frame, before, after in regressions
+        ]
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        for result in report["results"]:
+            name = f"{result['stage']} [{result['frame']}]"
+            if "error" in result:
+                print(f"{name:>28}: unavailable ({result['error']})")
+            else:
+                print(
+                    f"{name:>28}: p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms "
+                    f"p99 {result['p99_ms']:.2f}ms max {result['max_ms']:.2f}ms"
+                )
+        for stage, frame, before, after in regressions:
+            print(f"regression: {stage} [{frame}] p50 {before:.2f}ms -> {after:.2f}ms")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
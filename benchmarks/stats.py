@@ -0,0 +1,30 @@
+"""
+Latency statistics shared by the benchmarks.
+"""
+import math
+import statistics
+
+
+def percentile(sorted_timings, fraction):
+    """
+    Returns the nearest-rank percentile of timings sorted in ascending order.
+    """
+    rank = max(1, math.ceil(fraction * len(sorted_timings)))
+    return sorted_timings[min(rank, len(sorted_timings)) - 1]
+
+
+def summarize(timings):
+    """
+    Summarizes durations given in seconds.
+
+    :return: The count and the mean, p50, p95, p99 and max latency in milliseconds.
+    """
+    timings = sorted(timing * 1000 for timing in timings)
+    return {
+        "count": len(timings),
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": percentile(timings, 0.50),
+        "p95_ms": percentile(timings, 0.95),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": timings[-1],
+    }
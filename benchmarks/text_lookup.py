@@ -0,0 +1,127 @@
+"""
+Text lookup benchmark.
+
+Compares the original linear substring scan with the indexed fuzzy lookup
+over synthetic OCR results:
+
+    python -m benchmarks.text_lookup --boxes 5000 --queries 200
+"""
+import argparse
+import json
+import random
+import statistics
+import string
+import time
+
+from operate.utils.text_index import TextIndex
+
+WORDS = [
+    "file", "edit", "view", "history", "bookmarks", "tools", "help", "submit",
+    "cancel", "settings", "search", "sign", "in", "out", "profile", "save",
+    "open", "close", "new", "tab", "window", "display", "network", "account",
+]
+
+
+def _misread(text, rng):
+    # Swap one character, like a typical OCR confusion
+    if len(text) < 3:
+        return text
+    position = rng.randrange(len(text))
+    return text[:position] + rng.choice(string.ascii_lowercase) + text[position + 1 :]
+
+
+def make_result(boxes, rng):
+    result = []
+    for index in range(boxes):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+        text = f"{text} {index}"
+        x, y = rng.randint(0, 3800), rng.randint(0, 2100)
+        box = [[x, y], [x + 80, y], [x + 80, y + 20], [x, y + 20]]
+        result.append((box, text, rng.random()))
+    return result
+
+
+def linear_lookup(result, search_text):
+    found_index = None
+    for index, element in enumerate(result):
+        if search_text in element[1]:
+            found_index = index
+    return found_index
+
+
+def _summary(timings):
+    timings = sorted(timings)
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def benchmark(boxes=5000, queries=200, seed=0):
+    """
+    Times lookups of exact, re-cased and misread element texts.
+
+    :return: A dictionary of timings in milliseconds and the number of lookups that found the intended element.
+    """
+    rng = random.Random(seed)
+    result = make_result(boxes, rng)
+    target_indexes = [rng.randrange(boxes) for _ in range(queries)]
+    targets = [result[index][1] for index in target_indexes]
+    variants = {
+        "exact": targets,
+        "case": [target.upper() for target in targets],
+        "misread": [_misread(target, rng) for target in targets],
+    }
+
+    start = time.perf_counter()
+    index = TextIndex(result)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    report = {"boxes": boxes, "queries": queries, "index_build_ms": build_ms}
+    for name, texts in variants.items():
+        linear_timings, indexed_timings = [], []
+        linear_hits = indexed_hits = 0
+        for text, target_index in zip(texts, target_indexes):
+            start = time.perf_counter()
+            found_index = linear_lookup(result, text)
+            linear_timings.append((time.perf_counter() - start) * 1000)
+            linear_hits += found_index == target_index
+
+            start = time.perf_counter()
+            match = index.best(text)
+            indexed_timings.append((time.perf_counter() - start) * 1000)
+            indexed_hits += match is not None and match.index == target_index
+
+        report[name] = {
+            "linear": {**_summary(linear_timings), "hits": linear_hits},
+            "indexed": {**_summary(indexed_timings), "hits": indexed_hits},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OCR text lookup.")
+    parser.add_argument("--boxes", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    report = benchmark(args.boxes, args.queries, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+
+    print(f"{report['boxes']} boxes, index built in {report['index_build_ms']:.1f}ms")
+    for name in ("exact", "case", "misread"):
+        for method in ("linear", "indexed"):
+            result = report[name][method]
+            print(
+                f"{name:>8} {method:>8}: mean {result['mean_ms']:.3f}ms "
+                f"p95 {result['p95_ms']:.3f}ms hits {result['hits']}/{report['queries']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -120,7 +120,7 @@ def run_test_case(objective, guideline, model):
     """Returns True if the result of the test with the given prompt meets the given guideline for the given model."""
     # Run `operate` with the model to evaluate and the test case prompt
     subprocess.run(
-        ["operate", "-m", model, "--prompt", f'"{objective}"'],
+        ["operate", "-m", model, "--save-screenshots", "--prompt", f'"{objective}"'],
         stdout=subprocess.DEVNULL,
     )
 
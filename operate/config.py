@@ -3,11 +3,13 @@ import sys
 
 import google.generativeai as genai
 from dotenv import load_dotenv
-from ollama import Client
-from openai import OpenAI
+from ollama import AsyncClient, Client
+from openai import AsyncOpenAI, OpenAI
 import anthropic
 from prompt_toolkit.shortcuts import input_dialog
 
+from operate.models.clients import api_clients, fingerprint
+
 
 class Config:
     """
@@ -15,6 +17,31 @@ class Config:
 
     Attributes:
         verbose (bool): Flag indicating whether verbose mode is enabled.
+        save_screenshots (bool): Flag indicating whether captured frames are written to disk.
+        replay_threshold (float): The largest fraction of changed pixels at which a screen still matches the recording.
+        capture_backend (str): Screen capture backend, "auto", "xshm", "mss" or "default".
+        screen_change_policy (str): What to do when the screen did not change, "wait", "recapture" or "proceed".
+        screen_change_method (str): How screen changes are measured, "pixels" or "dhash".
+        click_animation_duration (float): Seconds spent circling the cursor before a click, 0 to disable.
+        ocr_pool_size (int): The maximum number of EasyOCR readers loaded per language and device.
+        detector_warmup (bool): Flag indicating whether the YOLO detector runs a warmup inference after loading.
+        detector_backend (str): How the YOLO detector runs, "ultralytics" or "onnx".
+        detector_input_size (int): The square input size of the ONNX detector.
+        detector_threads (int): The onnxruntime thread count, 0 to let onnxruntime decide.
+        detector_cache_dir (str): Where exported ONNX detectors are cached.
+        history_images (int): The number of screenshots sent per request, the current one included.
+        history_max_bytes (int): The byte budget of the message history, 0 for no budget.
+        stream (bool): Flag indicating whether model replies are streamed and executed operation by operation.
+        structured_output (bool): Flag indicating whether providers constrain replies to the action schema.
+        retry_attempts (int): The failed attempts after which a step is given up, fallbacks included.
+        step_timeout (float): The seconds a step may take, retries included, 0 for no limit.
+        session_timeout (float): The seconds a session may take, 0 for no limit.
+        rate_limit_rpm (float): The requests per minute allowed per model until the API reports its limit, 0 for no limit.
+        rate_limit_tpm (float): The tokens per minute allowed per model until the API reports its limit, 0 for no limit.
+        rate_limit_dir (str): Where rate limits are shared with other processes, None to share them within the process only.
+        http2 (bool): Flag indicating whether API clients use HTTP/2 when the `h2` package is installed.
+        http_max_connections (int): The maximum number of pooled connections per API client.
+        http_keepalive_expiry (float): Seconds an idle API connection is kept open.
         openai_api_key (str): API key for OpenAI.
         google_api_key (str): API key for Google.
         ollama_host (str): url to ollama running remotely.
@@ -31,6 +58,34 @@ class Config:
     def __init__(self):
         load_dotenv()
         self.verbose = False
+        self.save_screenshots = False
+        self.replay_threshold = float(os.getenv("OPERATE_REPLAY_THRESHOLD", "0.02"))
+        self.capture_backend = os.getenv("OPERATE_CAPTURE_BACKEND", "auto")
+        self.screen_change_policy = os.getenv("OPERATE_SCREEN_CHANGE_POLICY", "wait")
+        self.screen_change_method = os.getenv("OPERATE_SCREEN_CHANGE_METHOD", "pixels")
+        self.click_animation_duration = float(os.getenv("OPERATE_CLICK_ANIMATION", "0"))
+        self.ocr_pool_size = int(os.getenv("OPERATE_OCR_POOL_SIZE", "1"))
+        self.detector_warmup = os.getenv("OPERATE_DETECTOR_WARMUP", "1") != "0"
+        self.detector_backend = os.getenv("OPERATE_DETECTOR_BACKEND", "ultralytics")
+        self.detector_input_size = int(os.getenv("OPERATE_DETECTOR_INPUT_SIZE", "640"))
+        self.detector_threads = int(os.getenv("OPERATE_DETECTOR_THREADS", "0"))
+        self.detector_cache_dir = os.getenv(
+            "OPERATE_DETECTOR_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "self-operating-computer"),
+        )
+        self.history_images = int(os.getenv("OPERATE_HISTORY_IMAGES", "3"))
+        self.history_max_bytes = int(os.getenv("OPERATE_HISTORY_MAX_BYTES", "0"))
+        self.stream = os.getenv("OPERATE_STREAM", "0") != "0"
+        self.structured_output = os.getenv("OPERATE_STRUCTURED_OUTPUT", "1") != "0"
+        self.retry_attempts = int(os.getenv("OPERATE_RETRY_ATTEMPTS", "3"))
+        self.step_timeout = float(os.getenv("OPERATE_STEP_TIMEOUT", "120"))
+        self.session_timeout = float(os.getenv("OPERATE_SESSION_TIMEOUT", "1800"))
+        self.rate_limit_rpm = float(os.getenv("OPERATE_RATE_LIMIT_RPM", "0"))
+        self.rate_limit_tpm = float(os.getenv("OPERATE_RATE_LIMIT_TPM", "0"))
+        self.rate_limit_dir = os.getenv("OPERATE_RATE_LIMIT_DIR") or None
+        self.http2 = os.getenv("OPERATE_HTTP2", "1") != "0"
+        self.http_max_connections = int(os.getenv("OPERATE_HTTP_MAX_CONNECTIONS", "10"))
+        self.http_keepalive_expiry = float(os.getenv("OPERATE_HTTP_KEEPALIVE", "60"))
         self.openai_api_key = (
             None  # instance variables are backups in case saving to a `.env` fails
         )
@@ -47,7 +102,25 @@ class Config:
             None  # instance variables are backups in case saving to a `.env` fails
         )
 
-    def initialize_openai(self):
+    def _http_options(self, provider, asynchronous):
+        return api_clients.http_options(
+            provider,
+            asynchronous,
+            http2=self.http2,
+            max_connections=self.http_max_connections,
+            keepalive_expiry=self.http_keepalive_expiry,
+        )
+
+    def _http_client(self, provider, asynchronous):
+        return api_clients.http_client(
+            provider,
+            asynchronous,
+            http2=self.http2,
+            max_connections=self.http_max_connections,
+            keepalive_expiry=self.http_keepalive_expiry,
+        )
+
+    def initialize_openai(self, asynchronous=False):
         if self.verbose:
             print("[Config][initialize_openai]")
 
@@ -61,15 +134,23 @@ class Config:
                     "[Config][initialize_openai] no cached openai_api_key, try to get from env."
                 )
             api_key = os.getenv("OPENAI_API_KEY")
+        base_url = os.getenv("OPENAI_API_BASE_URL")
+
+        def create_client():
+            client_class = AsyncOpenAI if asynchronous else OpenAI
+            return client_class(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=self._http_client("openai", asynchronous),
+                # Retries are left to the session's retry budget
+                max_retries=0,
+            )
 
-        client = OpenAI(
-            api_key=api_key,
+        return api_clients.get(
+            "openai", (fingerprint(api_key), base_url), create_client, asynchronous
         )
-        client.api_key = api_key
-        client.base_url = os.getenv("OPENAI_API_BASE_URL", client.base_url)
-        return client
 
-    def initialize_qwen(self):
+    def initialize_qwen(self, asynchronous=False):
         if self.verbose:
             print("[Config][initialize_qwen]")
 
@@ -84,16 +165,18 @@ class Config:
                 )
             api_key = os.getenv("QWEN_API_KEY")
 
-        client = OpenAI(
-            api_key=api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-        )
-        client.api_key = api_key
-        client.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        return client
+        def create_client():
+            client_class = AsyncOpenAI if asynchronous else OpenAI
+            return client_class(
+                api_key=api_key,
+                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+                http_client=self._http_client("qwen", asynchronous),
+                max_retries=0,
+            )
+
+        return api_clients.get("qwen", fingerprint(api_key), create_client, asynchronous)
 
     def initialize_google(self, model_name="gemini-1.5-pro-latest"):
-        print("INITIALIZING GOOGLE")
         # Purpose: Initializes and configures the Google Generative AI client.
         #- model_name: The specific Gemini model to be used.
         # Comment: This function was updated to accept a `model_name` parameter,
@@ -108,12 +191,21 @@ class Config:
                     "[Config][initialize_google] no cached google_api_key, try to get from env."
                 )
             api_key = os.getenv("GOOGLE_API_KEY")
-        genai.configure(api_key=api_key, transport="rest")
-        model = genai.GenerativeModel(model_name)
 
-        return model
+        base_url = os.getenv("GOOGLE_API_BASE_URL")
 
-    def initialize_ollama(self):
+        def create_model():
+            print("INITIALIZING GOOGLE")
+            client_options = {"api_endpoint": base_url} if base_url else None
+            genai.configure(api_key=api_key, transport="rest", client_options=client_options)
+            return genai.GenerativeModel(model_name)
+
+        # The REST transport has no async client, requests are made from threads
+        return api_clients.get(
+            "google", (fingerprint(api_key), base_url, model_name), create_model
+        )
+
+    def initialize_ollama(self, asynchronous=False):
         if self.ollama_host:
             if self.verbose:
                 print("[Config][initialize_ollama] using cached ollama host")
@@ -123,15 +215,34 @@ class Config:
                     "[Config][initialize_ollama] no cached ollama host. Assuming ollama running locally."
                 )
             self.ollama_host = os.getenv("OLLAMA_HOST", None)
-        model = Client(host=self.ollama_host)
-        return model
 
-    def initialize_anthropic(self):
+        def create_client():
+            client_class = AsyncClient if asynchronous else Client
+            return client_class(
+                host=self.ollama_host, **self._http_options("ollama", asynchronous)
+            )
+
+        return api_clients.get("ollama", self.ollama_host, create_client, asynchronous)
+
+    def initialize_anthropic(self, asynchronous=False):
         if self.anthropic_api_key:
             api_key = self.anthropic_api_key
         else:
             api_key = os.getenv("ANTHROPIC_API_KEY")
-        return anthropic.Anthropic(api_key=api_key)
+        base_url = os.getenv("ANTHROPIC_API_BASE_URL")
+
+        def create_client():
+            client_class = anthropic.AsyncAnthropic if asynchronous else anthropic.Anthropic
+            return client_class(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=self._http_client("anthropic", asynchronous),
+                max_retries=0,
+            )
+
+        return api_clients.get(
+            "anthropic", (fingerprint(api_key), base_url), create_client, asynchronous
+        )
 
     def validation(self, model, voice_mode):
         """
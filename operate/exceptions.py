@@ -43,4 +43,17 @@ class OCRError(Exception):
 
     def __init__(self, message="OCR error"):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class RateLimitExceeded(APIError):
+    """Exception raised when the local rate limits would hold a request past its deadline."""
+
+    def __init__(self, message="Rate limit exceeded"):
+        super().__init__(message)
+
+class RetryBudgetExceeded(Exception):
+    """Exception raised when a step ran out of attempts or time."""
+
+    def __init__(self, message="Retry budget exceeded"):
+        self.message = message
+        super().__init__(self.message)
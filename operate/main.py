@@ -32,6 +32,29 @@ def main_entry():
         action="store_true",
     )
     
+    # Add a flag for writing each captured frame to screenshots/
+    parser.add_argument(
+        "--save-screenshots",
+        help="Save each captured screenshot to the screenshots directory",
+        action="store_true",
+    )
+
+    # Record the run so it can be replayed without the model
+    parser.add_argument(
+        "--record",
+        help="Record each step's screen, model reply and executed operations to this directory",
+        type=str,
+        required=False,
+    )
+
+    # Replay a recorded run, the model is only called where the screen diverges
+    parser.add_argument(
+        "--replay",
+        help="Replay the operations recorded in this directory while the screen matches the recording",
+        type=str,
+        required=False,
+    )
+
     # Allow for direct input of prompt
     parser.add_argument(
         "--prompt",
@@ -46,7 +69,10 @@ def main_entry():
             args.model,
             terminal_prompt=args.prompt,
             voice_mode=args.voice,
-            verbose_mode=args.verbose
+            verbose_mode=args.verbose,
+            save_screenshots=args.save_screenshots,
+            record_path=args.record,
+            replay_path=args.replay,
         )
     except KeyboardInterrupt:
         print(f"\n{ANSI_BRIGHT_MAGENTA}Exiting...")
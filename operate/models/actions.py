@@ -0,0 +1,166 @@
+"""
+The action schema every model reply is checked against.
+
+Providers ask their API for replies that follow `ACTION_SCHEMA`: OpenAI as
+a strict JSON schema, Claude as the input of a forced tool call and Gemini
+as a response schema, so a reply that does not parse is never generated
+in the first place. Whatever the reply came from, `validate_operations`
+checks it before anything is executed and returns the operations in one
+normalized form.
+
+A schema-constrained reply is an object, `{"operations": [...]}`, with
+every field present and the unused ones null. Free-form replies are a list
+of operations, or a single one, with only the fields that are used. Both
+are accepted.
+"""
+import copy
+
+from operate.exceptions import ModelResponseError
+
+# The operations offered to the model
+OPERATIONS = ("click", "write", "press", "scroll", "done", "solve_quiz")
+
+# The fields each operation needs. hotkey, write_in and read_text_from are not
+# offered, but the executor still runs them when a free-form reply asks for them.
+REQUIRED_FIELDS = {
+    "click": (),
+    "write": ("content",),
+    "press": ("keys",),
+    "hotkey": ("keys",),
+    "scroll": ("direction",),
+    "done": (),
+    "solve_quiz": ("question", "choices"),
+    "write_in": ("label", "content"),
+    "read_text_from": ("anchor",),
+}
+SCROLL_DIRECTIONS = ("up", "down")
+
+
+def _nullable(schema, description):
+    return {**schema, "type": [schema["type"], "null"], "description": description}
+
+
+OPERATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "thought": {"type": "string", "description": "Why this is the next best action"},
+        "operation": {"type": "string", "enum": list(OPERATIONS)},
+        "text": _nullable({"type": "string"}, "click: the exact text on the screen to click"),
+        "label": _nullable({"type": "string"}, "click: the label of the element to click, e.g. ~12"),
+        "x": _nullable({"type": "string"}, "click: the x position as a fraction of the screen width, e.g. 0.10"),
+        "y": _nullable({"type": "string"}, "click: the y position as a fraction of the screen height, e.g. 0.13"),
+        "content": _nullable({"type": "string"}, "write: the text to write"),
+        "keys": _nullable({"type": "array", "items": {"type": "string"}}, "press: the keys to press together"),
+        "direction": _nullable({"type": "string"}, "scroll: up or down"),
+        "summary": _nullable({"type": "string"}, "done: a summary of what was completed"),
+        "question": _nullable({"type": "string"}, "solve_quiz: the quiz question on the screen"),
+        "choices": _nullable(
+            {"type": "array", "items": {"type": "string"}}, "solve_quiz: the multiple choice options"
+        ),
+    },
+    "additionalProperties": False,
+}
+# Strict schemas require every field, the unused ones are null
+OPERATION_SCHEMA["required"] = list(OPERATION_SCHEMA["properties"])
+
+ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "operations": {
+            "type": "array",
+            "items": OPERATION_SCHEMA,
+            "description": "The next operations, executed in order",
+        }
+    },
+    "required": ["operations"],
+    "additionalProperties": False,
+}
+
+
+def openapi_schema(schema):
+    """
+    Converts a JSON schema to the OpenAPI subset Gemini accepts: nullable types and no `additionalProperties`.
+    """
+    schema = copy.deepcopy(schema)
+    schema.pop("additionalProperties", None)
+    if isinstance(schema.get("type"), list):
+        types = [type_ for type_ in schema["type"] if type_ != "null"]
+        schema["type"] = types[0]
+        schema["nullable"] = True
+    if "enum" in schema:
+        schema["format"] = "enum"
+    if "items" in schema:
+        schema["items"] = openapi_schema(schema["items"])
+    if "properties" in schema:
+        schema["properties"] = {
+            name: openapi_schema(value) for name, value in schema["properties"].items()
+        }
+    return schema
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def validate_operation(operation):
+    """
+    Checks one operation and returns it normalized, without null fields.
+
+    :raises ModelResponseError: If the operation is unknown or misses a field it needs.
+    """
+    if not isinstance(operation, dict):
+        raise ModelResponseError(f"Expected an operation object, got: {operation!r}")
+    operation = {field: value for field, value in operation.items() if value is not None}
+
+    kind = operation.get("operation")
+    if not isinstance(kind, str):
+        raise ModelResponseError(f"Operation without an 'operation' field: {operation}")
+    kind = kind.lower()
+    if kind not in REQUIRED_FIELDS:
+        raise ModelResponseError(f"Unknown operation: {kind}")
+    operation["operation"] = kind
+
+    for field in REQUIRED_FIELDS[kind]:
+        if operation.get(field) in (None, "", []):
+            raise ModelResponseError(f"The {kind} operation needs '{field}': {operation}")
+
+    if kind in ("press", "hotkey"):
+        keys = operation["keys"]
+        if isinstance(keys, str):
+            keys = [keys]
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            raise ModelResponseError(f"'keys' must be a list of key names: {operation}")
+        operation["keys"] = keys
+    elif kind == "scroll":
+        if str(operation["direction"]).lower() not in SCROLL_DIRECTIONS:
+            raise ModelResponseError(f"Unknown scroll direction: {operation['direction']}")
+        operation["direction"] = str(operation["direction"]).lower()
+    elif kind == "click":
+        located = operation.get("text") or operation.get("label")
+        if not located and not (_is_number(operation.get("x")) and _is_number(operation.get("y"))):
+            raise ModelResponseError(f"The click operation needs 'text', 'label' or 'x' and 'y': {operation}")
+    elif kind in ("write", "write_in") and not isinstance(operation["content"], str):
+        operation["content"] = str(operation["content"])
+    return operation
+
+
+def validate_operations(value):
+    """
+    Checks a parsed reply and returns its operations.
+
+    :param value: A list of operations, a single operation or an `{"operations": [...]}` object.
+    :raises ModelResponseError: If the reply has no operations or one of them is invalid.
+    """
+    if isinstance(value, dict) and "operations" in value:
+        value = value["operations"]
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        raise ModelResponseError(f"Expected a list of operations, got: {value!r}")
+    if not value:
+        raise ModelResponseError("The reply has no operations")
+    return [validate_operation(operation) for operation in value]
@@ -0,0 +1,179 @@
+"""
+Long-lived API clients.
+
+Building an SDK client per request also builds a new HTTP connection pool,
+so every step used to pay for a TCP and TLS handshake. `ClientPool` keeps
+one client per provider and credentials and gives them keep-alive (and,
+when `h2` is installed, HTTP/2) connection pools that are counted so
+connection reuse shows up in the session log.
+"""
+import asyncio
+import hashlib
+import importlib.util
+import threading
+
+import httpx
+
+from operate.models.rate_limit import observe_response
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def fingerprint(secret):
+    """
+    Returns a short digest of `secret`, so cache keys don't hold API keys in the clear.
+    """
+    if not secret:
+        return None
+    return hashlib.blake2b(secret.encode(), digest_size=8).hexdigest()
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class ConnectionStats:
+    """
+    Counts the requests of one provider and the connections opened to serve them.
+    """
+
+    def __init__(self):
+        self.clients = 0
+        self.cache_hits = 0
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count(self, attribute):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def _trace(self, event_name, info):
+        # httpcore reports every new TCP connection, requests on a kept-alive connection don't connect
+        if event_name == "connection.connect_tcp.complete":
+            self.count("connections")
+
+    def sync_hooks(self):
+        def trace(event_name, info):
+            self._trace(event_name, info)
+
+        def on_request(request):
+            self.count("requests")
+            request.extensions["trace"] = trace
+
+        def on_response(response):
+            # The rate limit headers keep the limiter of the request's model up to date
+            observe_response(response.status_code, response.headers)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def async_hooks(self):
+        async def trace(event_name, info):
+            self._trace(event_name, info)
+
+        async def on_request(request):
+            self.count("requests")
+            request.extensions["trace"] = trace
+
+        async def on_response(response):
+            observe_response(response.status_code, response.headers)
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def as_dict(self):
+        return {
+            "clients": self.clients,
+            "cache_hits": self.cache_hits,
+            "requests": self.requests,
+            "connections": self.connections,
+            "reused_connections": max(0, self.requests - self.connections),
+        }
+
+
+class ClientPool:
+    """
+    A process-wide cache of API clients.
+
+    Clients are keyed by provider and credentials. Async clients are also
+    keyed by the event loop they are created on, because their connections
+    belong to that loop; run requests on `operate.utils.event_loop.background_loop`
+    to share them across steps and threads. Clients of closed loops are dropped.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._stats = {}
+        # Re-entrant, factories build their HTTP clients through the pool
+        self._lock = threading.RLock()
+
+    def stats_for(self, provider):
+        with self._lock:
+            return self._stats.setdefault(provider, ConnectionStats())
+
+    def http_options(self, provider, asynchronous, http2=True, max_connections=10, keepalive_expiry=60.0):
+        """
+        Returns the httpx client options for a pooled, counted connection pool whose responses update the rate limiters.
+        """
+        stats = self.stats_for(provider)
+        return {
+            "http2": http2 and HTTP2_AVAILABLE,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            "event_hooks": stats.async_hooks() if asynchronous else stats.sync_hooks(),
+        }
+
+    def http_client(self, provider, asynchronous, **options):
+        """
+        Returns a new httpx client with the pool's options, for SDKs that take an `http_client`.
+        """
+        client_class = httpx.AsyncClient if asynchronous else httpx.Client
+        return client_class(**self.http_options(provider, asynchronous, **options))
+
+    def get(self, provider, key, factory, asynchronous=False):
+        """
+        Returns the cached client for `provider` and `key`, calling `factory` to create it the first time.
+
+        :param provider: The provider name, used for the metrics.
+        :param key: A hashable identifying the credentials and endpoint.
+        :param factory: Creates the client.
+        :param asynchronous: Whether the client is bound to the running event loop.
+        """
+        loop = _running_loop() if asynchronous else None
+        cache_key = (provider, key, asynchronous, id(loop))
+        stats = self.stats_for(provider)
+        with self._lock:
+            self._drop_closed_loops()
+            cached = self._clients.get(cache_key)
+            if cached is not None:
+                stats.cache_hits += 1
+                return cached[0]
+            client = factory()
+            self._clients[cache_key] = (client, loop)
+            stats.clients += 1
+            return client
+
+    def _drop_closed_loops(self):
+        closed = [
+            cache_key
+            for cache_key, (_, loop) in self._clients.items()
+            if loop is not None and loop.is_closed()
+        ]
+        for cache_key in closed:
+            del self._clients[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        with self._lock:
+            return {provider: stats.as_dict() for provider, stats in self._stats.items()}
+
+
+api_clients = ClientPool()
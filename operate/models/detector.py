@@ -0,0 +1,320 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from importlib import resources
+
+import numpy as np
+import psutil
+from PIL import Image
+
+from operate.config import Config
+from operate.utils.geometry import BoxArray
+from operate.utils.style import ANSI_GREEN, ANSI_RESET
+
+# Load configuration
+config = Config()
+
+# The set-of-marks detector shipped with the package
+DEFAULT_WEIGHTS = "best.pt"
+
+
+class Detector:
+    """
+    A loaded YOLO detector shared by every labeled step in the process.
+
+    Inference records how long it took, so the log can show load, warmup
+    and per-step inference cost. This backend runs the weights through ultralytics.
+
+    Attributes:
+        weights (str): The path of the model weights.
+        load_time (float): Seconds spent loading the weights.
+        warmup_time (float): Seconds spent on the warmup inference, 0 if skipped.
+        memory_mb (float): Resident memory added by loading the model.
+    """
+
+    name = "ultralytics"
+
+    def __init__(self, weights, warmup=True):
+        self.weights = str(weights)
+        self.warmup_time = 0.0
+        self.inference_times = []
+        # Inference is not thread-safe, and there is only one screen to label anyway
+        self._lock = threading.Lock()
+
+        process = psutil.Process(os.getpid())
+        rss_before = process.memory_info().rss
+        start = time.time()
+        self.model = self._load()
+        self.load_time = time.time() - start
+        self.memory_mb = (process.memory_info().rss - rss_before) / (1024 * 1024)
+        print(
+            f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_RESET}[Detector] Loaded {os.path.basename(self.weights)} "
+            f"({self.name}) in {self.load_time:.2f}s, +{self.memory_mb:.0f}MB"
+        )
+
+        if warmup:
+            self.warmup()
+
+    def _load(self):
+        from ultralytics import YOLO
+
+        return YOLO(self.weights)
+
+    def _predict(self, image):
+        results = self.model(image, verbose=config.verbose)
+        boxes = [
+            result.boxes.xyxy.cpu().numpy()
+            for result in results
+            if getattr(result, "boxes", None) is not None
+        ]
+        return np.concatenate(boxes) if boxes else np.empty((0, 4))
+
+    def warmup(self, size=(640, 640)):
+        """
+        Runs one inference on a blank image so the first real step doesn't pay for graph setup.
+        """
+        start = time.time()
+        with self._lock:
+            self._predict(Image.new("RGB", size))
+        self.warmup_time = time.time() - start
+        if config.verbose:
+            print(f"[Detector][warmup] {self.warmup_time:.2f}s")
+
+    def detect(self, image):
+        """
+        Runs inference and returns the detected boxes.
+
+        :param image: A PIL image.
+        :return: A `BoxArray` of the detections in pixels.
+        """
+        start = time.time()
+        with self._lock:
+            xyxy = self._predict(image)
+        elapsed = time.time() - start
+        self.inference_times.append(elapsed)
+        if config.verbose:
+            print(f"[Detector] {self.name} inference took {elapsed:.3f}s, {len(xyxy)} boxes")
+        return BoxArray(xyxy, image.size)
+
+    def stats(self):
+        times = list(self.inference_times)
+        return {
+            "weights": os.path.basename(self.weights),
+            "backend": self.name,
+            "load_time": self.load_time,
+            "warmup_time": self.warmup_time,
+            "memory_mb": self.memory_mb,
+            "inferences": len(times),
+            "inference_time": sum(times),
+            "mean_inference_time": sum(times) / len(times) if times else None,
+        }
+
+
+class OnnxDetector(Detector):
+    """
+    Runs the detector with onnxruntime on the CPU.
+
+    The weights are exported to ONNX once and the file is cached in
+    `config.detector_cache_dir`, keyed by the weights content and input size.
+    Pre- and post-processing (letterboxing, confidence filtering and NMS)
+    follow the ultralytics defaults so both backends find the same boxes.
+    The OpenVINO execution provider is used when onnxruntime-openvino is installed.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        weights,
+        warmup=True,
+        input_size=None,
+        threads=None,
+        conf_threshold=0.25,
+        iou_threshold=0.7,
+        max_detections=300,
+    ):
+        self.input_size = input_size or config.detector_input_size
+        self.threads = config.detector_threads if threads is None else threads
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+        super().__init__(weights, warmup=warmup)
+
+    def export_path(self):
+        """
+        Returns the cached ONNX file for these weights, exporting it on first use.
+        """
+        with open(self.weights, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        stem = os.path.splitext(os.path.basename(self.weights))[0]
+        cache_dir = config.detector_cache_dir
+        onnx_path = os.path.join(cache_dir, f"{stem}-{digest}-{self.input_size}.onnx")
+        if os.path.exists(onnx_path):
+            return onnx_path
+
+        from ultralytics import YOLO
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Export from a copy so the package directory doesn't need to be writable
+        weights_copy = os.path.join(cache_dir, f"{stem}-{digest}.pt")
+        shutil.copyfile(self.weights, weights_copy)
+        start = time.time()
+        exported = YOLO(weights_copy).export(format="onnx", imgsz=self.input_size)
+        os.replace(exported, onnx_path)
+        os.remove(weights_copy)
+        print(
+            f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_RESET}[Detector] Exported {stem} to ONNX "
+            f"in {time.time() - start:.2f}s: {onnx_path}"
+        )
+        return onnx_path
+
+    def _load(self):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        providers = ["CPUExecutionProvider"]
+        if "OpenVINOExecutionProvider" in onnxruntime.get_available_providers():
+            providers.insert(0, "OpenVINOExecutionProvider")
+        session = onnxruntime.InferenceSession(
+            self.export_path(), sess_options=options, providers=providers
+        )
+        self._input_name = session.get_inputs()[0].name
+        return session
+
+    def _letterbox(self, image):
+        # Resize keeping the aspect ratio and pad to a square with gray, like ultralytics
+        size = self.input_size
+        gain = min(size / image.width, size / image.height)
+        width, height = round(image.width * gain), round(image.height * gain)
+        pad_x, pad_y = (size - width) / 2, (size - height) / 2
+        canvas = Image.new("RGB", (size, size), (114, 114, 114))
+        canvas.paste(
+            image.convert("RGB").resize((width, height), Image.Resampling.BILINEAR),
+            (int(round(pad_x - 0.1)), int(round(pad_y - 0.1))),
+        )
+        pixels = np.asarray(canvas, dtype=np.float32) / 255.0
+        return pixels.transpose(2, 0, 1)[np.newaxis], gain, (pad_x, pad_y)
+
+    def _predict(self, image):
+        tensor, gain, (pad_x, pad_y) = self._letterbox(image)
+        output = self.model.run(None, {self._input_name: tensor})[0][0]
+        # YOLOv8 output is (4 + classes, candidates) with boxes as center x, center y, width, height
+        predictions = output.T
+        scores = predictions[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences > self.conf_threshold
+        predictions, classes, confidences = predictions[keep], classes[keep], confidences[keep]
+
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        keep = _nms(xyxy, confidences, classes, self.iou_threshold)[: self.max_detections]
+        xyxy = xyxy[keep]
+
+        # Undo the letterbox
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad_x) / gain
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad_y) / gain
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, image.width)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, image.height)
+        return xyxy.astype(np.float64)
+
+    def warmup(self, size=None):
+        super().warmup(size or (self.input_size, self.input_size))
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"input_size": self.input_size, "threads": self.threads})
+        return stats
+
+
+def box_iou(box, boxes):
+    """
+    Computes the intersection over union of one (x1, y1, x2, y2) box with an (n, 4) array of boxes.
+    """
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(area + areas - intersection, 1e-9)
+
+
+def _nms(xyxy, confidences, classes, iou_threshold):
+    # Offset boxes by class so boxes of different classes never suppress each other
+    offset = xyxy + (classes * 7680.0)[:, np.newaxis]
+    order = confidences.argsort()[::-1]
+    keep = []
+    while len(order):
+        best = order[0]
+        keep.append(best)
+        order = order[1:][box_iou(offset[best], offset[order[1:]]) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+DETECTOR_BACKENDS = {backend.name: backend for backend in (Detector, OnnxDetector)}
+
+
+class DetectorRegistry:
+    """
+    Loads each detector once per process and keeps it warm between steps.
+    """
+
+    def __init__(self):
+        self._detectors = {}
+        self._lock = threading.Lock()
+
+    def get_detector(self, weights=None, warmup=None, backend=None, load=True):
+        """
+        Returns the shared detector for `weights`, loading it on first use.
+
+        :param weights: The path of the model weights, defaults to the bundled set-of-marks model.
+        :param warmup: Whether to run a warmup inference after loading, defaults to `config.detector_warmup`.
+        :param backend: A key of `DETECTOR_BACKENDS`, defaults to `config.detector_backend`.
+        :param load: Whether to load the detector if it isn't loaded yet.
+        :return: A `Detector`, None if it isn't loaded and `load` is False.
+        """
+        if weights is None:
+            weights = resources.files("operate.models.weights") / DEFAULT_WEIGHTS
+        backend = backend or config.detector_backend
+        if backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown detector backend: {backend}")
+        key = (str(weights), backend)
+        with self._lock:
+            if key not in self._detectors:
+                if not load:
+                    return None
+                if warmup is None:
+                    warmup = config.detector_warmup
+                self._detectors[key] = DETECTOR_BACKENDS[backend](weights, warmup=warmup)
+            return self._detectors[key]
+
+    def stats(self):
+        with self._lock:
+            detectors = list(self._detectors.values())
+        return [detector.stats() for detector in detectors]
+
+
+detectors = DetectorRegistry()
+
+
+def detect_frame(frame, detector=None, load=True):
+    """
+    Returns the object detections of a frame, running the detector only if set-of-marks labeling didn't already.
+
+    :param frame: The `Frame` to detect elements on.
+    :param detector: The `Detector` to use, defaults to the shared set-of-marks detector.
+    :param load: Whether to load the shared detector if no model loaded it yet.
+    :return: A `BoxArray` of the detections in pixels, None if there are none and no detector is loaded.
+    """
+    if frame.detections is None:
+        detector = detector or detectors.get_detector(load=load)
+        if detector is None:
+            return None
+        frame.detections = detector.detect(frame.image)
+    return frame.detections
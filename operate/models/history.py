@@ -0,0 +1,194 @@
+"""
+Screenshot history compaction.
+
+Every step adds a user message with a base64 screenshot to the
+conversation. Left alone, each request re-uploads every earlier
+screenshot and the process keeps all of them in memory. `MessageHistory`
+keeps the most recent screenshots and replaces older ones with a short
+text: the actions taken on that screen and the text OCR found on it.
+"""
+import json
+
+from operate.utils.ocr import ocr_cache
+
+
+def _image_parts(message):
+    content = message.get("content")
+    if not isinstance(content, list):
+        return []
+    return [
+        part
+        for part in content
+        if isinstance(part, dict) and part.get("type") in ("image_url", "image")
+    ]
+
+
+def has_image(message):
+    return message.get("role") == "user" and (
+        bool(_image_parts(message)) or bool(message.get("images"))
+    )
+
+
+def message_bytes(message):
+    """
+    Estimates the bytes `message` adds to a request, images included.
+    """
+    size = 0
+    content = message.get("content")
+    if isinstance(content, str):
+        size += len(content.encode("utf-8"))
+    elif isinstance(content, list):
+        for part in content:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "text":
+                size += len(part["text"].encode("utf-8"))
+            elif part.get("type") == "image_url":
+                size += len(part["image_url"]["url"])
+            elif part.get("type") == "image":
+                size += len(part["source"]["data"])
+    for image in message.get("images") or ():
+        size += len(image)
+    return size
+
+
+def payload_bytes(messages):
+    return sum(message_bytes(message) for message in messages)
+
+
+def describe_operations(content):
+    """
+    Summarizes the operations of an assistant reply in one line.
+    """
+    try:
+        operations = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(operations, dict):
+        operations = operations.get("operations", [operations])
+    if not isinstance(operations, list):
+        return None
+
+    descriptions = []
+    for operation in operations:
+        if not isinstance(operation, dict):
+            continue
+        kind = operation.get("operation", "unknown")
+        for field in ("text", "label", "keys", "content", "direction", "summary"):
+            if operation.get(field) is not None:
+                descriptions.append(f"{kind} {json.dumps(operation[field])}")
+                break
+        else:
+            descriptions.append(kind)
+    return "; ".join(descriptions)
+
+
+def ocr_digest(result, max_chars=500, min_confidence=0.3):
+    """
+    Returns the confidently recognized text of a frame in reading order, without duplicates.
+    """
+    texts = []
+    seen = set()
+    for _, text, confidence in result:
+        text = text.strip()
+        if confidence < min_confidence or not text or text in seen:
+            continue
+        seen.add(text)
+        texts.append(text)
+    digest = " | ".join(texts)
+    if len(digest) > max_chars:
+        digest = digest[: max_chars - 3] + "..."
+    return digest
+
+
+class MessageHistory:
+    """
+    Bounds the screenshots carried by one conversation.
+
+    `compact` runs before each request and replaces all but the last
+    `max_images - 1` screenshots with text, so a request carries at most
+    `max_images` including the current one. If the history is still over
+    `max_bytes`, the oldest remaining screenshots are replaced too. `track`
+    runs after each request, remembers which frame the new screenshot came
+    from so its OCR result can be summarized later, and returns the size of
+    the request.
+
+    Attributes:
+        max_images (int): The number of screenshots sent per request, the current one included.
+        max_bytes (int): The byte budget of the history, 0 for no budget.
+        compacted (int): The number of screenshots replaced so far.
+    """
+
+    def __init__(self, max_images=3, max_bytes=0):
+        self.max_images = max(1, max_images)
+        self.max_bytes = max_bytes
+        self.compacted = 0
+        # id(message) -> (message, OCR cache key of its frame)
+        self._sources = {}
+
+    def track(self, messages, frame=None, reader=None):
+        """
+        Remembers the frame behind each new screenshot message.
+
+        :param reader: The OCR reader used for the frame, None if the model does not use OCR.
+        :return: The payload size of the request and the number of screenshots it carried.
+        """
+        ocr_key = (frame.content_hash, id(reader)) if frame is not None and reader is not None else None
+        images = 0
+        request = messages
+        # The request ended with the last user message, later replies were not sent
+        for index in reversed(range(len(messages))):
+            if messages[index].get("role") == "user":
+                request = messages[: index + 1]
+                break
+        for message in request:
+            if not has_image(message):
+                continue
+            images += 1
+            if id(message) not in self._sources:
+                self._sources[id(message)] = (message, ocr_key)
+        return {"payload_bytes": payload_bytes(request), "history_images": images}
+
+    def compact(self, messages):
+        """
+        Replaces old screenshots in `messages` with text, in place.
+
+        :return: The number of screenshots replaced.
+        """
+        indices = [index for index, message in enumerate(messages) if has_image(message)]
+        # The current screenshot is added after compaction
+        kept = self.max_images - 1
+        stale = indices[: len(indices) - kept] if kept else indices
+        for index in stale:
+            self._compact_message(messages, index)
+
+        remaining = indices[len(stale) :]
+        if self.max_bytes:
+            size = payload_bytes(messages)
+            while remaining and size > self.max_bytes:
+                index = remaining.pop(0)
+                size -= message_bytes(messages[index])
+                self._compact_message(messages, index)
+                size += message_bytes(messages[index])
+        return len(indices) - len(remaining)
+
+    def _compact_message(self, messages, index):
+        message = messages[index]
+        _, ocr_key = self._sources.pop(id(message), (None, None))
+
+        notes = ["[An earlier screenshot was removed from the history to save space.]"]
+        reply = messages[index + 1] if index + 1 < len(messages) else None
+        if reply is not None and reply.get("role") == "assistant":
+            actions = describe_operations(reply.get("content"))
+            if actions:
+                notes.append(f"Actions taken on it: {actions}.")
+        if ocr_key is not None:
+            result = ocr_cache.peek(ocr_key)
+            if result is not None and len(result):
+                notes.append(f"Text on that screen: {ocr_digest(result)}")
+
+        compacted = {"role": "user", "content": " ".join(notes)}
+        if "images" in message:
+            compacted["images"] = None
+        messages[index] = compacted
+        self.compacted += 1
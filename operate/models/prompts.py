@@ -1,3 +1,4 @@
+import functools
 import platform
 from operate.config import Config
 
@@ -338,7 +339,19 @@ def get_system_prompt(model, objective):
     """
     Format the vision prompt more efficiently and print the name of the prompt used
     """
+    prompt = _format_system_prompt(model, objective)
 
+    # Optional verbose output
+    if config.verbose:
+        print("[get_system_prompt] model:", model)
+    # print("[get_system_prompt] prompt:", prompt)
+
+    return prompt
+
+
+@functools.lru_cache(maxsize=32)
+def _format_system_prompt(model, objective):
+    # Formatted once per model and objective, every step sends the identical string so providers can cache it
     if platform.system() == "Darwin":
         cmd_string = "\"command\""
         os_search_str = "[\"command\", \"space\"]"
@@ -390,11 +403,6 @@ def get_system_prompt(model, objective):
             operating_system=operating_system,
         )
 
-    # Optional verbose output
-    if config.verbose:
-        print("[get_system_prompt] model:", model)
-    # print("[get_system_prompt] prompt:", prompt)
-
     return prompt
 
 
@@ -0,0 +1,51 @@
+"""
+Model providers.
+
+Every supported model is served by one provider instance. `get_provider`
+replaces the chain of model checks that used to pick a `call_*` function.
+"""
+from operate.exceptions import ModelNotRecognizedException
+from operate.models.providers.anthropic_provider import AnthropicProvider
+from operate.models.providers.base import Provider
+from operate.models.providers.gemini_provider import GeminiProvider
+from operate.models.providers.ollama_provider import OllamaProvider
+from operate.models.providers.openai_provider import OpenAIProvider, QwenProvider
+
+# Model name -> provider instance
+PROVIDERS = {}
+
+
+def register_provider(provider):
+    """
+    Registers `provider` for each of the models it serves.
+    """
+    for model in provider.models:
+        PROVIDERS[model] = provider
+    return provider
+
+
+def get_provider(model):
+    """
+    Returns the provider serving `model`.
+
+    :raises ModelNotRecognizedException: If no provider serves `model`.
+    """
+    try:
+        return PROVIDERS[model]
+    except KeyError:
+        raise ModelNotRecognizedException(model)
+
+
+for _provider in (
+    OpenAIProvider(),
+    QwenProvider(),
+    GeminiProvider(),
+    AnthropicProvider(),
+    OllamaProvider(),
+):
+    register_provider(_provider)
+
+# Models that locate click targets by running OCR on the screenshot
+OCR_MODELS = {
+    model for provider in set(PROVIDERS.values()) for model in provider.ocr_models
+}
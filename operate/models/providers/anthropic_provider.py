@@ -0,0 +1,173 @@
+import json
+
+from operate.config import Config
+from operate.models.actions import ACTION_SCHEMA
+from operate.models.history import has_image
+from operate.models.providers.base import Provider
+from operate.models.providers.stages import encode_frame
+from operate.models.usage import anthropic_usage, record_usage
+
+# Load configuration
+config = Config()
+
+# Cache the prompt prefix up to the block carrying it
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Claude is made to answer with a call to this tool, so its input always follows the action schema
+OPERATIONS_TOOL = {
+    "name": "operate",
+    "description": "Executes the next operations on the computer, in order.",
+    "input_schema": ACTION_SCHEMA,
+}
+
+
+def to_openai_messages(messages):
+    """
+    Converts a Claude conversation to the OpenAI format so the fallback model can continue it.
+    """
+    openai_messages = [messages[0]]  # Include the system message
+    for message in messages[1:]:
+        if message["role"] == "user":
+            if isinstance(message["content"], str):
+                # Compacted and replayed messages carry plain text
+                openai_messages.append({"role": "user", "content": message["content"]})
+                continue
+            # Update the image type format from "source" to "url"
+            updated_content = []
+            for item in message["content"]:
+                if isinstance(item, dict) and item.get("type") == "image":
+                    source = item["source"]
+                    updated_content.append(
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{source['media_type']};base64,{source['data']}"
+                            },
+                        }
+                    )
+                elif isinstance(item, dict) and "type" in item:
+                    updated_content.append(item)
+            openai_messages.append({"role": "user", "content": updated_content})
+        elif message["role"] == "assistant":
+            openai_messages.append({"role": "assistant", "content": message["content"]})
+    return openai_messages
+
+
+class AnthropicProvider(Provider):
+    """
+    Claude through the Anthropic messages API.
+    """
+
+    name = "anthropic"
+    models = ("claude-3",)
+    ocr_models = ("claude-3",)
+    api_models = {"claude-3": "claude-3-opus-20240229"}
+    max_tokens = 3000
+
+    def client(self):
+        return config.initialize_anthropic(asynchronous=True)
+
+    async def build_message(self, model, user_prompt, frame):
+        # downsize screenshot due to 5MB size limit
+        img_data = await encode_frame(frame, "JPEG", width=2560, quality=85)
+        return {
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/jpeg",
+                        "data": img_data,
+                    },
+                },
+                {
+                    "type": "text",
+                    "text": user_prompt
+                    + "**REMEMBER** Only output json format, do not append any other text.",
+                },
+            ],
+        }
+
+    def cached_request(self, messages):
+        """
+        Returns the system prompt and messages with prompt cache breakpoints.
+
+        One breakpoint caches the system prompt. The other sits on the last
+        message before the oldest screenshot: history compaction rewrites the
+        screenshot messages, but never the text messages before them, so the
+        next step reads that part of the conversation back. The stored
+        messages are not modified.
+        """
+        # anthropic api expect system prompt as an separate argument
+        system = [
+            {"type": "text", "text": messages[0]["content"], "cache_control": CACHE_CONTROL}
+        ]
+        request = list(messages[1:])
+        first_image = next(
+            (index for index, message in enumerate(request) if has_image(message)), len(request)
+        )
+        if first_image > 0:
+            index = first_image - 1
+            message = request[index]
+            content = message["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            content = list(content)
+            content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
+            request[index] = {**message, "content": content}
+        return system, request
+
+    def options(self):
+        if not config.structured_output:
+            return {}
+        return {
+            "tools": [OPERATIONS_TOOL],
+            "tool_choice": {"type": "tool", "name": OPERATIONS_TOOL["name"]},
+        }
+
+    async def complete(self, model, messages):
+        system, request = self.cached_request(messages)
+        response = await self.client().messages.create(
+            model=self.api_models[model],
+            max_tokens=self.max_tokens,
+            system=system,
+            messages=request,
+            **self.options(),
+        )
+        record_usage(**anthropic_usage(getattr(response, "usage", None)))
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input)
+        return response.content[0].text
+
+    async def stream(self, model, messages):
+        system, request = self.cached_request(messages)
+        response = await self.client().messages.create(
+            model=self.api_models[model],
+            max_tokens=self.max_tokens,
+            system=system,
+            messages=request,
+            stream=True,
+            **self.options(),
+        )
+        usage = {}
+        async for event in response:
+            if event.type == "message_start":
+                usage = anthropic_usage(event.message.usage)
+            elif event.type == "message_delta" and getattr(event, "usage", None):
+                usage["output_tokens"] = event.usage.output_tokens
+            elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                yield event.delta.text
+            elif event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                # The tool input arrives as JSON text, operation by operation
+                yield event.delta.partial_json
+        record_usage(**usage)
+
+    async def on_error(self, error, model, messages, objective, reader, frame):
+        if config.verbose:
+            print("message before convertion ", messages)
+        # The fallback model gets a copy in its own format, the Claude history stays as it is
+        return await super().on_error(
+            error, model, to_openai_messages(messages), objective, reader, frame
+        )
@@ -0,0 +1,236 @@
+import traceback
+
+from operate.config import Config
+from operate.exceptions import ModelResponseError, RateLimitExceeded
+from operate.models.actions import validate_operation
+from operate.models.prompts import get_system_prompt
+from operate.models.rate_limit import rate_limiters
+from operate.models.retry import current_budget
+from operate.models.providers.stages import (
+    confirm_system_prompt,
+    parse_operations,
+    resolve_operations,
+    user_prompt_for,
+)
+from operate.utils.json_stream import JSONArrayStream
+from operate.utils.style import ANSI_BRIGHT_MAGENTA, ANSI_GREEN, ANSI_RESET
+
+# Load configuration
+config = Config()
+
+# The model every other model falls back to when its own request fails
+FALLBACK_MODEL = "gpt-4"
+
+
+class Provider:
+    """
+    Base class for model providers.
+
+    A provider turns the current frame and message history into a list of
+    operations. The base class runs the shared pipeline: append the user
+    message, request a completion, parse it, resolve text and label
+    references and record the reply. Subclasses implement `build_message`
+    and `complete` with their provider's async client, so network I/O never
+    blocks the event loop, and `stream` to support `stream_operations`.
+    Every request first waits its turn under the model's rate limits.
+
+    Attributes:
+        name (str): The provider name.
+        models (tuple): The model names served by the provider.
+        ocr_models (tuple): The models whose clicks reference on-screen text.
+    """
+
+    name = None
+    models = ()
+    ocr_models = ()
+
+    def uses_ocr(self, model):
+        return model in self.ocr_models
+
+    async def get_next_action(self, model, messages, objective, reader, frame, tracker=None):
+        """
+        Asks `model` for the next operations.
+
+        :param tracker: The session's `ElementTracker`, which keeps set-of-marks labels stable across steps.
+
+        :return: A list of operation dictionaries with screen coordinates resolved.
+        """
+        if config.verbose:
+            print(f"[{self.name}][get_next_action] model", model)
+        try:
+            return await self.request_operations(model, messages, objective, reader, frame, tracker)
+        except RateLimitExceeded:
+            # Another provider's quota is no way around our own limits
+            raise
+        except Exception as e:
+            return await self.on_error(e, model, messages, objective, reader, frame)
+
+    async def request_operations(self, model, messages, objective, reader, frame, tracker=None):
+        request, label_coordinates = await self.prepare(model, messages, objective, frame, tracker)
+        await self.throttle(model)
+        # The request may only take what is left of the step's time
+        content = await current_budget().within(self.complete(model, request))
+        content_str, operations = await self.parse(model, content)
+        if config.verbose:
+            print(f"[{self.name}][request_operations] content", content_str)
+
+        operations = await resolve_operations(operations, reader, frame, label_coordinates)
+
+        # wait to append the assistant message so that if resolving fails we don't append a message and mess up message history
+        await self.record(model, messages, content_str)
+        return operations
+
+    async def stream_operations(self, model, messages, objective, reader, frame, tracker=None):
+        """
+        Asks `model` for the next operations and yields each one as soon as its JSON object is complete.
+
+        Operations are resolved one by one, so the caller can execute the first
+        while the rest of the reply is still streaming. Once the reply is
+        complete it is parsed as a whole, which catches anything the
+        incremental parser could not emit. A failure before the first
+        operation is handled by `on_error`; after it, the operations already
+        executed can't be taken back, so it is raised as a `ModelResponseError`.
+        """
+        if config.verbose:
+            print(f"[{self.name}][stream_operations] model", model)
+        emitted = 0
+        try:
+            request, label_coordinates = await self.prepare(model, messages, objective, frame, tracker)
+            await self.throttle(model)
+            parser = JSONArrayStream()
+            streamed = []
+            async for chunk in self.stream(model, request):
+                for operation in parser.feed(chunk):
+                    operation = validate_operation(operation)
+                    streamed.append(operation)
+                    for resolved in await resolve_operations(
+                        [dict(operation)], reader, frame, label_coordinates
+                    ):
+                        emitted += 1
+                        yield resolved
+
+            content_str, operations = await self.parse(model, parser.text)
+            if config.verbose:
+                print(f"[{self.name}][stream_operations] content", content_str)
+            if operations[: len(streamed)] != streamed:
+                raise ModelResponseError("The streamed operations do not match the complete reply")
+            for resolved in await resolve_operations(
+                operations[len(streamed) :], reader, frame, label_coordinates
+            ):
+                emitted += 1
+                yield resolved
+            await self.record(model, messages, content_str)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            if emitted:
+                raise ModelResponseError(
+                    f"{model} failed after {emitted} operations were executed: {e}"
+                )
+            for operation in await self.on_error(e, model, messages, objective, reader, frame):
+                yield operation
+
+    async def prepare(self, model, messages, objective, frame, tracker=None):
+        """
+        Adds the user message for this step to `messages`.
+
+        :return: The request to send, the whole conversation by default, and the set-of-marks label map if any.
+        """
+        # A previous failure may have left the fallback model's system prompt in place
+        confirm_system_prompt(messages, objective, model)
+        user_prompt = user_prompt_for(messages)
+        if config.verbose:
+            print(f"[{self.name}][prepare] user_prompt", user_prompt)
+
+        image_frame, label_coordinates = await self.annotate(model, frame, tracker)
+        messages.append(await self.build_message(model, user_prompt, image_frame))
+        return messages, label_coordinates
+
+    async def throttle(self, model):
+        """
+        Waits until the rate limits of `model` allow one more request, queued behind earlier requests.
+        """
+        limiter = rate_limiters.get(
+            self.name,
+            model,
+            requests_per_minute=config.rate_limit_rpm,
+            tokens_per_minute=config.rate_limit_tpm,
+            directory=config.rate_limit_dir,
+        )
+        budget = current_budget()
+        budget.queued(await limiter.acquire(max_wait=budget.remaining()))
+
+    async def annotate(self, model, frame, tracker=None):
+        """
+        Returns the frame to show the model and, for set-of-marks models, the map of its labels.
+        """
+        return frame, None
+
+    async def build_message(self, model, user_prompt, frame):
+        """
+        Returns the user message carrying the prompt and the frame in the provider's format.
+        """
+        raise NotImplementedError
+
+    async def complete(self, model, request):
+        """
+        Sends the request to the model and returns the text of its reply.
+        """
+        raise NotImplementedError
+
+    async def stream(self, model, request):
+        """
+        Sends the request to the model and yields the text of its reply as it arrives.
+
+        Providers without a streaming API yield the complete reply at once.
+        """
+        yield await self.complete(model, request)
+
+    async def parse(self, model, content):
+        """
+        Parses the reply into operations.
+
+        :return: The cleaned JSON string and the list of operations.
+        """
+        return parse_operations(content)
+
+    async def record(self, model, messages, content_str):
+        """
+        Adds the model's reply to the message history.
+        """
+        messages.append({"role": "assistant", "content": content_str})
+
+    async def on_error(self, error, model, messages, objective, reader, frame):
+        """
+        Handles a failed request, by default by asking the fallback model instead.
+
+        The fallback is an attempt of the step's retry budget; when the
+        budget is used up the error is raised instead.
+        """
+        if model == FALLBACK_MODEL:
+            # Left to the operation loop, which counts the failure and backs off
+            raise ModelResponseError(f"{model} did not return usable operations: {error}") from error
+        current_budget().retry_delay(error, fallback=True)
+
+        print(
+            f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_BRIGHT_MAGENTA}[{model}] That did not work. Trying another method {ANSI_RESET}"
+        )
+        if config.verbose:
+            print("[Self-Operating Computer][Operate] error", error)
+            traceback.print_exc()
+        return await fallback(messages, objective, reader, frame)
+
+
+async def fallback(messages, objective, reader, frame):
+    """
+    Asks the fallback model with its own system prompt.
+    """
+    from operate.models.providers import get_provider
+
+    if config.verbose:
+        print("[fallback]")
+    messages[0] = {"role": "system", "content": get_system_prompt("gpt-4o", objective)}
+    if config.verbose:
+        print("[fallback][updated] len(messages)", len(messages))
+    provider = get_provider(FALLBACK_MODEL)
+    return await provider.get_next_action(FALLBACK_MODEL, messages, objective, reader, frame)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+from google.generativeai import protos
+
+from operate.config import Config
+from operate.exceptions import ModelResponseError, OCRError
+from operate.models.actions import ACTION_SCHEMA, openapi_schema
+from operate.models.prompts import get_system_prompt
+from operate.models.providers.base import Provider
+from operate.models.retry import current_budget
+from operate.models.usage import gemini_usage, record_usage
+from operate.utils.style import ANSI_BRIGHT_MAGENTA, ANSI_GREEN, ANSI_RESET
+
+# Load configuration
+config = Config()
+
+GEMINI_ACTION_SCHEMA = openapi_schema(ACTION_SCHEMA)
+
+solve_quiz_tool = protos.Tool(
+    function_declarations=[
+        protos.FunctionDeclaration(
+            name="solve_quiz",
+            description="Use this tool when you see a quiz on the screen. This tool can solve multiple-choice questions by querying a database of questions and answers.",
+            parameters=protos.Schema(
+                type=protos.Type.OBJECT,
+                properties={
+                    "question": protos.Schema(type=protos.Type.STRING, description="The question to be answered"),
+                    "choices": protos.Schema(type=protos.Type.ARRAY, items=protos.Schema(type=protos.Type.STRING), description="The multiple choice options"),
+                },
+                required=["question", "choices"],
+            ),
+        )
+    ]
+)
+
+
+async def _iterate_in_thread(iterator):
+    """
+    Yields the items of a blocking iterator, waiting for each one in a thread.
+    """
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class GeminiProvider(Provider):
+    """
+    Gemini models through the Google Generative AI API.
+
+    Gemini gets the system prompt and the current screenshot on every step
+    instead of the whole conversation. Replies follow the action schema,
+    which includes the `solve_quiz` operation; with structured output turned
+    off the OCR models call it as a tool instead. The OCR models ask again
+    instead of falling back, for as long as the step's retry budget lasts.
+    When streaming, their failures are left to the operation loop.
+    """
+
+    name = "gemini"
+    models = ("gemini-pro-vision", "gemini-1.5-pro", "gemini-2.5-flash", "gemini-2.5-pro")
+    ocr_models = ("gemini-2.5-flash", "gemini-2.5-pro")
+
+    async def get_next_action(self, model, messages, objective, reader, frame, tracker=None):
+        if not self.uses_ocr(model):
+            return await super().get_next_action(model, messages, objective, reader, frame, tracker)
+
+        budget = current_budget()
+        while True:
+            try:
+                return await self.request_operations(model, messages, objective, reader, frame, tracker)
+            except OCRError as e:
+                raise ModelResponseError(f"OCR error: {e}")
+            except Exception as e:
+                if config.verbose:
+                    print(f"[{self.name}][get_next_action] error on attempt {budget.failures + 1}: {e}")
+                # Asks again after backing off, until the step's retry budget is used up
+                delay = budget.retry_delay(e)
+                print(
+                    f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_BRIGHT_MAGENTA}[{model}] That did not work. Retrying ({budget.failures}/{budget.max_attempts})... {ANSI_RESET}"
+                )
+                await budget.async_sleep(delay)
+
+    async def prepare(self, model, messages, objective, frame, tracker=None):
+        # The prompt is the same on every step and goes first, so Gemini's implicit cache can reuse it
+        prompt = get_system_prompt(model, objective)
+        if self.uses_ocr(model):
+            # A reasonable width for model processing
+            image = await asyncio.to_thread(frame.resized, 1024)
+        else:
+            image = frame.image
+        return [prompt, image], None
+
+    def options(self, model):
+        if config.structured_output:
+            # Gemini can't combine a response schema with function calling, the quiz is an operation of the schema
+            return {
+                "generation_config": {
+                    "response_mime_type": "application/json",
+                    "response_schema": GEMINI_ACTION_SCHEMA,
+                }
+            }
+        if not self.uses_ocr(model):
+            return {}
+        tool_config = protos.ToolConfig(
+            function_calling_config=protos.FunctionCallingConfig(
+                mode=protos.FunctionCallingConfig.Mode.AUTO
+            )
+        )
+        return {"tools": [solve_quiz_tool], "tool_config": tool_config}
+
+    def response_text(self, response):
+        """
+        Returns the text of a response or streamed chunk, a `solve_quiz` call becomes its operation.
+
+        Chunks without content, such as a final or safety chunk, have no text.
+        """
+        if not response.candidates or not response.candidates[0].content.parts:
+            return ""
+        function_call = response.candidates[0].content.parts[0].function_call
+        if function_call.name == "solve_quiz":
+            operation = {
+                "operation": "solve_quiz",
+                "question": function_call.args["question"],
+                "choices": list(function_call.args["choices"]),
+            }
+            return json.dumps([operation])
+        return response.text
+
+    async def complete(self, model, request):
+        google_model = config.initialize_google(model)
+        if config.verbose:
+            print(f"[{self.name}][complete] model", google_model)
+        # The async client needs the gRPC transport, the REST client's blocking call runs in a thread instead
+        response = await asyncio.to_thread(
+            google_model.generate_content, request, **self.options(model)
+        )
+        if config.verbose:
+            print(f"[{self.name}][complete] response", response)
+        record_usage(**gemini_usage(getattr(response, "usage_metadata", None)))
+        return self.response_text(response)
+
+    async def stream(self, model, request):
+        google_model = config.initialize_google(model)
+        response = await asyncio.to_thread(
+            google_model.generate_content, request, stream=True, **self.options(model)
+        )
+        usage_metadata = None
+        async for chunk in _iterate_in_thread(iter(response)):
+            # Every chunk carries the usage so far
+            usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+            yield self.response_text(chunk)
+        record_usage(**gemini_usage(usage_metadata))
+
+    async def record(self, model, messages, content_str):
+        # Gemini is not sent the history, only the OCR models keep their replies in it
+        if self.uses_ocr(model):
+            messages.append({"role": "assistant", "content": content_str})
+
+    async def on_error(self, error, model, messages, objective, reader, frame):
+        if not self.uses_ocr(model):
+            return await super().on_error(error, model, messages, objective, reader, frame)
+        if isinstance(error, OCRError):
+            raise ModelResponseError(f"OCR error: {error}")
+        raise ModelResponseError(f"{model} did not return usable operations: {error}")
@@ -0,0 +1,74 @@
+import asyncio
+import traceback
+
+import ollama
+
+from operate.config import Config
+from operate.exceptions import APIError, ModelResponseError
+from operate.models.providers.base import Provider
+from operate.models.usage import record_usage
+from operate.utils.style import ANSI_BRIGHT_MAGENTA, ANSI_GREEN, ANSI_RED, ANSI_RESET
+
+# Load configuration
+config = Config()
+
+# JSON mode only allows an object, so the plan is asked for in the same wrapper the action schema uses
+JSON_MODE_INSTRUCTION = (
+    '\nAnswer with a JSON object of the form {"operations": [...]} '
+    "that lists every operation of your plan in order."
+)
+
+
+class OllamaProvider(Provider):
+    """
+    LLaVA served by a local or remote Ollama.
+    """
+
+    name = "ollama"
+    models = ("llava",)
+
+    async def build_message(self, model, user_prompt, frame):
+        if config.structured_output:
+            user_prompt += JSON_MODE_INSTRUCTION
+        return {
+            "role": "user",
+            "content": user_prompt,
+            "images": [await asyncio.to_thread(frame.encode, "PNG")],
+        }
+
+    async def complete(self, model, messages):
+        client = config.initialize_ollama(asynchronous=True)
+        response = await client.chat(
+            model=model,
+            messages=messages,
+            # JSON mode, the client has no schema support, so the prompt asks for the schema's wrapper
+            format="json" if config.structured_output else "",
+        )
+
+        # Important: Remove the image from the message history.
+        # Ollama will attempt to load each image reference and will
+        # eventually timeout.
+        messages[-1]["images"] = None
+
+        record_usage(
+            input_tokens=response.get("prompt_eval_count"),
+            output_tokens=response.get("eval_count"),
+        )
+        return response["message"]["content"].strip()
+
+    async def on_error(self, error, model, messages, objective, reader, frame):
+        if isinstance(error, ollama.ResponseError):
+            print(
+                f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_RED}[Operate] Couldn't connect to Ollama. With Ollama installed, run `ollama pull llava` then `ollama serve`{ANSI_RESET}",
+                error,
+            )
+            raise APIError(f"Ollama request failed: {error}")
+
+        print(
+            f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_BRIGHT_MAGENTA}[llava] That did not work. Trying again {ANSI_RESET}",
+            error,
+        )
+        if config.verbose:
+            traceback.print_exc()
+        # There is no other local model to fall back to, let the operation loop retry
+        raise ModelResponseError(f"llava did not return usable operations: {error}")
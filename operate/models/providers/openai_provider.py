@@ -0,0 +1,121 @@
+import asyncio
+
+from operate.config import Config
+from operate.models.actions import ACTION_SCHEMA
+from operate.models.detector import detectors
+from operate.models.providers.base import Provider
+from operate.models.providers.stages import encode_frame
+from operate.models.usage import openai_usage, record_usage
+from operate.utils.label import add_labels
+
+# Load configuration
+config = Config()
+
+
+class OpenAIProvider(Provider):
+    """
+    GPT models through the OpenAI chat completions API.
+    """
+
+    name = "openai"
+    models = ("gpt-4", "gpt-4-with-som", "gpt-4-with-ocr", "gpt-4.1-with-ocr", "o1-with-ocr")
+    ocr_models = ("gpt-4-with-ocr", "gpt-4.1-with-ocr", "o1-with-ocr")
+
+    # The API model behind each mode
+    api_models = {
+        "gpt-4": "gpt-4o",
+        "gpt-4-with-som": "gpt-4o",
+        "gpt-4-with-ocr": "gpt-4o",
+        "gpt-4.1-with-ocr": "gpt-4.1",
+        "o1-with-ocr": "o1",
+    }
+    # The coordinate modes discourage repeating the previous action
+    penalized_models = ("gpt-4", "gpt-4-with-som")
+
+    image_format = "PNG"
+    image_media_type = "image/png"
+    image_quality = 85
+    prompt_suffix = ""
+    # Strict structured output, the reply can only be a valid `{"operations": [...]}` object
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {"name": "operations", "strict": True, "schema": ACTION_SCHEMA},
+    }
+
+    def client(self):
+        return config.initialize_openai(asynchronous=True)
+
+    async def annotate(self, model, frame, tracker=None):
+        if model != "gpt-4-with-som":
+            return frame, None
+        # Loaded on the first labeled step and reused afterwards
+        yolo_model = detectors.get_detector()
+        return await asyncio.to_thread(add_labels, frame, yolo_model, tracker)
+
+    async def build_message(self, model, user_prompt, frame):
+        img_base64 = await encode_frame(frame, self.image_format, quality=self.image_quality)
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": user_prompt + self.prompt_suffix},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:{self.image_media_type};base64,{img_base64}"},
+                },
+            ],
+        }
+
+    def options(self, model):
+        options = {}
+        if model in self.penalized_models:
+            options.update(presence_penalty=1, frequency_penalty=1)
+        if config.structured_output and self.response_format:
+            options["response_format"] = self.response_format
+        return options
+
+    # The API caches prompt prefixes on its own, `messages` only has to keep them byte-stable
+    async def complete(self, model, messages):
+        response = await self.client().chat.completions.create(
+            model=self.api_models[model],
+            messages=messages,
+            **self.options(model),
+        )
+        record_usage(**openai_usage(getattr(response, "usage", None)))
+        return response.choices[0].message.content
+
+    async def stream(self, model, messages):
+        response = await self.client().chat.completions.create(
+            model=self.api_models[model],
+            messages=messages,
+            stream=True,
+            # The usage, cached tokens included, comes in a last chunk without choices
+            extra_body={"stream_options": {"include_usage": True}},
+            **self.options(model),
+        )
+        async for chunk in response:
+            if getattr(chunk, "usage", None):
+                record_usage(**openai_usage(chunk.usage))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class QwenProvider(OpenAIProvider):
+    """
+    Qwen-VL through DashScope's OpenAI compatible API.
+    """
+
+    name = "qwen"
+    models = ("qwen-vl",)
+    ocr_models = ("qwen-vl",)
+    api_models = {"qwen-vl": "qwen2.5-vl-72b-instruct"}
+    penalized_models = ()
+
+    # Compress screenshot image to make size be smaller
+    image_format = "JPEG"
+    image_media_type = "image/jpeg"
+    prompt_suffix = "**REMEMBER** Only output json format, do not append any other text."
+    # DashScope's compatible mode has no JSON schema support for Qwen-VL, replies are only validated
+    response_format = None
+
+    def client(self):
+        return config.initialize_qwen(asynchronous=True)
@@ -0,0 +1,201 @@
+"""
+Pipeline stages shared by every provider.
+
+Each step runs the same stages: pick the user prompt, encode the frame,
+parse the JSON reply and turn text, label and field references into
+screen coordinates. Keeping them here means an optimization to one stage
+applies to every model.
+"""
+import asyncio
+import json
+
+from operate.config import Config
+from operate.exceptions import ModelResponseError
+from operate.models.actions import validate_operations
+from operate.models.detector import detect_frame
+from operate.models.prompts import (
+    get_system_prompt,
+    get_user_first_message_prompt,
+    get_user_prompt,
+)
+from operate.utils.label import get_click_position_in_percent, get_label_coordinates
+from operate.utils.ocr import (
+    get_input_coordinates,
+    get_text_coordinates,
+    get_text_element,
+    read_frame_text,
+)
+
+# Load configuration
+config = Config()
+
+
+def user_prompt_for(messages):
+    """
+    Returns the user prompt for the next step, the first message gets the longer introduction.
+    """
+    if len(messages) == 1:
+        return get_user_first_message_prompt()
+    return get_user_prompt()
+
+
+async def encode_frame(frame, format="PNG", width=None, quality=85):
+    """
+    Encodes the frame as base64 off the event loop. The encoding is cached on the frame.
+    """
+    return await asyncio.to_thread(frame.base64, format, width, quality)
+
+
+def confirm_system_prompt(messages, objective, model):
+    """
+    On `Exception` we default to `gpt-4` so we have this function to reassign system prompt in case of a previous failure
+    """
+    if config.verbose:
+        print("[confirm_system_prompt] model", model)
+
+    system_prompt = get_system_prompt(model, objective)
+    # Only replace the first message after a fallback changed it, so the cached prompt prefix stays the same
+    if messages[0]["content"] != system_prompt:
+        messages[0] = {"role": "system", "content": system_prompt}
+
+    if config.verbose:
+        print("[confirm_system_prompt]")
+        print("[confirm_system_prompt] len(messages)", len(messages))
+        for m in messages:
+            if m["role"] != "user":
+                print("--------------------[message]--------------------")
+                print("[confirm_system_prompt][message] role", m["role"])
+                print("[confirm_system_prompt][message] content", m["content"])
+                print("------------------[end message]------------------")
+
+
+def clean_json(content):
+    if config.verbose:
+        print("\n\n[clean_json] content before cleaning", content)
+    if content.startswith("```json"):
+        content = content[
+            len("```json") :
+        ].strip()  # Remove starting ```json and trim whitespace
+    elif content.startswith("```"):
+        content = content[
+            len("```") :
+        ].strip()  # Remove starting ``` and trim whitespace
+    if content.endswith("```"):
+        content = content[
+            : -len("```")
+        ].strip()  # Remove ending ``` and trim whitespace
+
+    # Normalize line breaks and remove any unwanted characters
+    content = "\n".join(line.strip() for line in content.splitlines())
+
+    if config.verbose:
+        print("\n\n[clean_json] content after cleaning", content)
+
+    return content
+
+
+def parse_operations(content):
+    """
+    Parses a model reply into a list of validated operations.
+
+    A reply with prose around its JSON is repaired locally by decoding the
+    first JSON value in it, rather than asking the model again.
+
+    :return: The cleaned JSON string, kept for the message history, and the operations.
+    :raises ModelResponseError: If the reply has no valid operations.
+    """
+    content_str = clean_json(content)
+    try:
+        value = json.loads(content_str)
+    except json.JSONDecodeError as e:
+        starts = [index for index in (content_str.find("["), content_str.find("{")) if index != -1]
+        if not starts:
+            raise ModelResponseError(f"The reply is not JSON: {e}")
+        try:
+            value, end = json.JSONDecoder().raw_decode(content_str, min(starts))
+        except json.JSONDecodeError:
+            raise ModelResponseError(f"The reply is not JSON: {e}")
+        content_str = content_str[min(starts) : end]
+    return content_str, validate_operations(value)
+
+
+async def resolve_operations(operations, reader, frame, label_coordinates=None):
+    """
+    Turns the references in model operations into screen coordinates.
+
+    - click with "text": located with OCR.
+    - click with "label": located in the set-of-marks label map.
+    - write_in: a click on the detected field next to the label followed by a write.
+    - read_text_from: the text next to the anchor is printed, nothing is executed.
+
+    Everything else, including clicks that already carry x and y, is kept as is.
+    OCR runs in a worker thread so it never blocks the event loop.
+
+    :raises OCRError: If a referenced text is not on the screen.
+    :raises ModelResponseError: If a referenced label does not exist.
+    """
+    resolved = []
+    for operation in operations:
+        kind = operation.get("operation")
+
+        if kind == "click" and operation.get("text"):
+            text_to_click = operation["text"]
+            if config.verbose:
+                print("[resolve_operations][click] text_to_click", text_to_click)
+            result = await asyncio.to_thread(read_frame_text, reader, frame)
+            text_element_index = get_text_element(result, text_to_click, frame)
+            coordinates = get_text_coordinates(result, text_element_index, frame)
+            operation["x"] = coordinates["x"]
+            operation["y"] = coordinates["y"]
+            if config.verbose:
+                print("[resolve_operations][click] text_element_index", text_element_index)
+                print("[resolve_operations][click] final operation", operation)
+            resolved.append(operation)
+
+        elif kind == "click" and label_coordinates is not None and operation.get("label"):
+            label = operation["label"]
+            coordinates = get_label_coordinates(label, label_coordinates)
+            click_position_percent = get_click_position_in_percent(coordinates, frame.size)
+            if config.verbose:
+                print("[resolve_operations][click] label", label, "coordinates", coordinates)
+            if not click_position_percent:
+                raise ModelResponseError(f"Label {label} is not on the screen")
+            operation["x"] = f"{click_position_percent[0]:.2f}"
+            operation["y"] = f"{click_position_percent[1]:.2f}"
+            resolved.append(operation)
+
+        elif kind == "write_in":
+            label = operation.get("label")
+            content_to_write = operation.get("content")
+            if config.verbose:
+                print(f"[resolve_operations][write_in] label: {label}, content: {content_to_write}")
+            result = await asyncio.to_thread(read_frame_text, reader, frame)
+            text_element_index = get_text_element(result, label, frame)
+            # Click the field next to the label rather than the label itself, found among the detected
+            # elements. Models that never loaded the detector don't load it just for this.
+            detections = await asyncio.to_thread(detect_frame, frame, load=False)
+            coordinates = get_input_coordinates(result, text_element_index, frame, detections)
+            resolved.append({"operation": "click", "x": coordinates["x"], "y": coordinates["y"]})
+            resolved.append({"operation": "write", "content": content_to_write})
+
+        elif kind == "read_text_from":
+            anchor = operation.get("anchor")
+            if config.verbose:
+                print(f"[resolve_operations][read_text_from] anchor: {anchor}")
+            result = await asyncio.to_thread(read_frame_text, reader, frame)
+            anchor_element_index = get_text_element(result, anchor, frame)
+            anchor_coordinates = get_text_coordinates(result, anchor_element_index, frame)
+
+            # Define a region around the anchor to read text from
+            x, y = anchor_coordinates["x"], anchor_coordinates["y"]
+            width, height = 0.2, 0.1  # Define a search area, can be adjusted
+            read_text = "".join(
+                text + " " for text in result.texts_in_region(x, y, width, height)
+            )
+            # The read text is only printed for now, it is an information gathering step
+            print(f"[resolve_operations][read_text_from] Read text: {read_text}")
+
+        else:
+            resolved.append(operation)
+
+    return resolved
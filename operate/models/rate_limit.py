@@ -0,0 +1,317 @@
+"""
+Client-side rate limits of model requests.
+
+Concurrent sessions used to send their requests independently, run into
+the provider's rate limits together and all back off blindly. A
+`RateLimiter` per provider and model keeps token buckets of the requests
+and tokens per minute instead, and queues requests that would go over
+them. Capacity is reserved in arrival order, so queued requests go out
+first come, first served.
+
+Limits are configured with `OPERATE_RATE_LIMIT_RPM` and
+`OPERATE_RATE_LIMIT_TPM` and learned from the rate limit headers of
+OpenAI and Anthropic responses, which the pooled HTTP clients pass to
+`observe_response`. A 429 response holds back every queued request for
+as long as the server asked. With `OPERATE_RATE_LIMIT_DIR` set, the
+buckets are kept in files under that directory, so sessions in other
+processes share them.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+
+from operate.exceptions import RateLimitExceeded
+from operate.models.retry import header_delay
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_current_limiter = contextvars.ContextVar("operate_rate_limiter", default=None)
+
+# The limit and remaining headers of requests and tokens per minute
+RATE_LIMIT_HEADERS = (
+    ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens"),
+    (
+        "anthropic-ratelimit-requests-limit",
+        "anthropic-ratelimit-requests-remaining",
+        "anthropic-ratelimit-tokens-limit",
+        "anthropic-ratelimit-tokens-remaining",
+    ),
+)
+
+
+def _number(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _FileLock:
+    """
+    An exclusive lock on a file, held by one process at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+
+
+class RateLimiter:
+    """
+    Token buckets of the requests and tokens per minute of one provider and model.
+
+    The buckets may go negative: every request reserves its share right
+    away and waits until the buckets have refilled enough to cover it,
+    so later requests wait behind earlier ones.
+
+    Attributes:
+        key (str): The provider and model.
+        requests_per_minute (float): The request limit, 0 for no limit until one is learned.
+        tokens_per_minute (float): The token limit, 0 for no limit until one is learned.
+        path (str): The file the buckets are shared through, None to keep them in memory.
+        requests (int): The requests let through.
+        queued (int): The requests that had to wait.
+        wait_time (float): The seconds requests spent waiting.
+        throttled (int): The 429 responses received.
+    """
+
+    def __init__(self, key, requests_per_minute=0, tokens_per_minute=0, path=None):
+        self.key = key
+        self.path = path
+        self.requests = 0
+        self.queued = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+        # Tokens of a request before its usage is known, the average of the ones seen so far
+        self.token_estimate = 0.0
+        self._lock = threading.Lock()
+        self._state = {
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+            "requests": requests_per_minute,
+            "tokens": tokens_per_minute,
+            "updated": time.time(),
+            "blocked_until": 0.0,
+        }
+
+    def _update(self, change):
+        """
+        Refills the buckets and applies `change` to them, across processes when they are shared.
+
+        :return: Whatever `change` returns.
+        """
+        with self._lock:
+            if self.path is None:
+                return self._apply(self._state, change)
+            with _FileLock(self.path + ".lock"):
+                try:
+                    with open(self.path) as file:
+                        self._state = json.load(file)
+                except (OSError, ValueError):
+                    pass
+                result = self._apply(self._state, change)
+                with open(self.path, "w") as file:
+                    json.dump(self._state, file)
+                return result
+
+    @staticmethod
+    def _apply(state, change):
+        now = time.time()
+        elapsed = max(0.0, now - state["updated"])
+        for bucket, limit in (("requests", "requests_per_minute"), ("tokens", "tokens_per_minute")):
+            if state[limit]:
+                state[bucket] = min(state[limit], state[bucket] + state[limit] * elapsed / 60)
+        state["updated"] = now
+        return change(state, now)
+
+    def reserve(self, tokens):
+        """
+        Reserves one request of `tokens` tokens.
+
+        :return: The seconds to wait until the request is within the limits.
+        """
+
+        def change(state, now):
+            wait = max(0.0, state["blocked_until"] - now)
+            for bucket, limit, cost in (
+                ("requests", "requests_per_minute", 1),
+                ("tokens", "tokens_per_minute", tokens),
+            ):
+                if not state[limit]:
+                    continue
+                state[bucket] -= cost
+                if state[bucket] < 0:
+                    wait = max(wait, -state[bucket] * 60 / state[limit])
+            return wait
+
+        return self._update(change)
+
+    def release(self, tokens):
+        """
+        Gives back a reservation that was not used.
+        """
+
+        def change(state, now):
+            if state["requests_per_minute"]:
+                state["requests"] += 1
+            if state["tokens_per_minute"]:
+                state["tokens"] += tokens
+
+        self._update(change)
+
+    async def acquire(self, max_wait=None):
+        """
+        Waits until one more request is within the limits.
+
+        :param max_wait: The longest wait in seconds, None for no limit.
+        :return: The seconds waited.
+        :raises RateLimitExceeded: If the wait would be longer than `max_wait`.
+        """
+        tokens = self.token_estimate
+        wait = self.reserve(tokens)
+        if max_wait is not None and wait > max_wait:
+            self.release(tokens)
+            raise RateLimitExceeded(f"The {self.key} rate limit would hold the request for {wait:.1f}s")
+        _current_limiter.set((self, tokens))
+        self.requests += 1
+        if wait > 0:
+            self.queued += 1
+            self.wait_time += wait
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, estimate, tokens):
+        """
+        Charges the difference between the tokens a request was estimated at and the ones it used.
+        """
+        self.token_estimate += (tokens - self.token_estimate) / min(self.requests, 10)
+
+        def change(state, now):
+            if state["tokens_per_minute"]:
+                state["tokens"] -= tokens - estimate
+
+        self._update(change)
+
+    def observe(self, status_code, headers):
+        """
+        Updates the limits from the rate limit headers of a response.
+        """
+
+        def change(state, now):
+            for limit_requests, remaining_requests, limit_tokens, remaining_tokens in RATE_LIMIT_HEADERS:
+                for bucket, limit, limit_header, remaining_header in (
+                    ("requests", "requests_per_minute", limit_requests, remaining_requests),
+                    ("tokens", "tokens_per_minute", limit_tokens, remaining_tokens),
+                ):
+                    limit_value = _number(headers, limit_header)
+                    if limit_value:
+                        if not state[limit]:
+                            state[bucket] = limit_value
+                        state[limit] = limit_value
+                    remaining = _number(headers, remaining_header)
+                    if remaining is not None and state[limit]:
+                        # The server also counts requests of other clients with the same key
+                        state[bucket] = min(state[bucket], remaining)
+            if status_code == 429:
+                state["blocked_until"] = max(state["blocked_until"], now + (header_delay(headers) or 1.0))
+
+        if status_code == 429:
+            self.throttled += 1
+        self._update(change)
+
+    def stats(self):
+        with self._lock:
+            state = dict(self._state)
+        return {
+            "requests": self.requests,
+            "queued": self.queued,
+            "wait_time": self.wait_time,
+            "throttled": self.throttled,
+            "requests_per_minute": state["requests_per_minute"],
+            "tokens_per_minute": state["tokens_per_minute"],
+        }
+
+
+class RateLimiters:
+    """
+    The process-wide rate limiters, one per provider and model.
+    """
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model, requests_per_minute=0, tokens_per_minute=0, directory=None):
+        """
+        Returns the limiter of `provider` and `model`, creating it with the given limits the first time.
+
+        :param directory: Where to share the buckets with other processes, None to keep them in memory.
+        """
+        key = f"{provider}/{model}"
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                path = None
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, re.sub(r"[^\w.-]", "_", key) + ".json")
+                limiter = RateLimiter(key, requests_per_minute, tokens_per_minute, path)
+                self._limiters[key] = limiter
+            return limiter
+
+    def clear(self):
+        with self._lock:
+            self._limiters.clear()
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.key: limiter.stats() for limiter in limiters}
+
+
+rate_limiters = RateLimiters()
+
+
+def observe_response(status_code, headers):
+    """
+    Passes a response to the limiter of the request that is in flight in the current task, if any.
+    """
+    current = _current_limiter.get()
+    if current is not None:
+        current[0].observe(status_code, headers)
+
+
+def settle_tokens(tokens):
+    """
+    Charges the tokens a request actually used to the limiter it went through, if any.
+    """
+    current = _current_limiter.get()
+    if current is not None:
+        limiter, estimate = current
+        limiter.settle(estimate, tokens)
+        _current_limiter.set(None)
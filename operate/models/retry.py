@@ -0,0 +1,286 @@
+"""
+The retry budget of model requests.
+
+Retries used to be stacked: the SDKs retried each request, providers
+retried or fell back to another model, and the operation loop retried the
+whole step on top, so one bad step could take minutes. A `RetryBudget` is
+shared by all of them instead. It limits the attempts and the time spent
+on a step, and the time spent on the whole session, and decides how long
+to back off based on what went wrong.
+
+The operation loop starts a step with `start_step` and hands the budget to
+the providers with `track_budget`, the same way token usage is tracked.
+Every failure, wherever it is caught, goes through `retry_delay`, which
+either says how long to back off or raises `RetryBudgetExceeded`.
+"""
+import asyncio
+import contextvars
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from operate.exceptions import (
+    ModelNotRecognizedException,
+    ModelResponseError,
+    OCRError,
+    RetryBudgetExceeded,
+)
+
+_current_budget = contextvars.ContextVar("operate_retry_budget", default=None)
+
+# Error kinds
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+PARSE = "parse"
+OCR_MISS = "ocr_miss"
+FATAL = "fatal"
+
+# The first backoff of each kind in seconds, doubled on every further failure.
+# A reply that did not parse or a text that was not found is asked again right away.
+BASE_DELAYS = {RATE_LIMIT: 2.0, TRANSIENT: 1.0, PARSE: 0.0, OCR_MISS: 0.5}
+
+_RATE_LIMIT_ERRORS = ("RateLimitError", "RateLimitExceeded", "ResourceExhausted", "TooManyRequests")
+_TRANSIENT_ERRORS = (
+    "APIConnectionError",
+    "APITimeoutError",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "TransportError",
+    "TimeoutException",
+    "OverloadedError",
+)
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _chain(error):
+    """
+    Yields the error and the errors it was raised from, outermost first.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def classify(error):
+    """
+    Returns the kind of `error`: RATE_LIMIT, TRANSIENT, PARSE, OCR_MISS or FATAL.
+
+    The errors an error was raised from are looked at too, so a rate limit
+    that made the fallback model fail is still recognized as one.
+    """
+    for cause in _chain(error):
+        if isinstance(cause, (ModelNotRecognizedException, KeyboardInterrupt)):
+            return FATAL
+        names = {cls.__name__ for cls in type(cause).__mro__}
+        status = _status_code(cause)
+        if status == 429 or names.intersection(_RATE_LIMIT_ERRORS):
+            return RATE_LIMIT
+        if status is not None and (status >= 500 or status in (408, 409)):
+            return TRANSIENT
+        if status is not None and status >= 400:
+            # Bad requests, keys and permissions don't get better by asking again
+            return FATAL
+        if names.intersection(_TRANSIENT_ERRORS) or isinstance(
+            cause, (asyncio.TimeoutError, ConnectionError)
+        ):
+            return TRANSIENT
+    causes = list(_chain(error))
+    if any(isinstance(cause, OCRError) for cause in causes):
+        return OCR_MISS
+    if any(isinstance(cause, (ModelResponseError, json.JSONDecodeError)) for cause in causes):
+        return PARSE
+    return TRANSIENT
+
+
+def header_delay(headers):
+    """
+    Returns the seconds a `Retry-After` (or `retry-after-ms`) response header asks to wait, None without one.
+    """
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after(error):
+    """
+    Returns the seconds the server asked to wait before the next request, None if it did not say.
+    """
+    for cause in _chain(error):
+        response = getattr(cause, "response", None)
+        headers = getattr(response, "headers", None)
+        delay = header_delay(headers) if headers else None
+        if delay is not None:
+            return delay
+    return None
+
+
+class RetryBudget:
+    """
+    The attempts and time left for a step and the time left for the session.
+
+    Attributes:
+        max_attempts (int): The number of failed attempts after which a step is given up, fallbacks included.
+        step_timeout (float): The seconds a step may take, retries included, 0 for no limit.
+        session_timeout (float): The seconds the session may take, 0 for no limit.
+        max_delay (float): The longest backoff in seconds, unless the server asks for more.
+        failures (int): The failed attempts of the current step.
+        retries (dict): The failed attempts of the session by error kind.
+        waited (float): The seconds the session spent backing off.
+    """
+
+    def __init__(self, max_attempts=3, step_timeout=120.0, session_timeout=1800.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.step_timeout = step_timeout
+        self.session_timeout = session_timeout
+        self.max_delay = max_delay
+        self.session_start = time.time()
+        self.step_start = self.session_start
+        self.failures = 0
+        self.step_waited = 0.0
+        self.step_queued = 0.0
+        self.retries = {}
+        self.waited = 0.0
+
+    def start_step(self):
+        """
+        Gives a new step its attempts and deadline.
+        """
+        self.step_start = time.time()
+        self.failures = 0
+        self.step_waited = 0.0
+        self.step_queued = 0.0
+
+    def deadline(self):
+        """
+        Returns the time at which the current step has to be done, None for no deadline.
+        """
+        deadlines = []
+        if self.step_timeout:
+            deadlines.append(self.step_start + self.step_timeout)
+        if self.session_timeout:
+            deadlines.append(self.session_start + self.session_timeout)
+        return min(deadlines) if deadlines else None
+
+    def remaining(self):
+        """
+        Returns the seconds left for the current step, None for no limit.
+        """
+        deadline = self.deadline()
+        return None if deadline is None else max(0.0, deadline - time.time())
+
+    def retry_delay(self, error, fallback=False):
+        """
+        Counts a failed attempt and returns how many seconds to wait before the next one.
+
+        The backoff doubles with every failure of the step and is jittered;
+        a Retry-After header from the server is waited out in full.
+
+        :param fallback: Whether the next attempt goes to another model, which is tried right away even after a fatal error.
+        :raises RetryBudgetExceeded: When `error` is fatal or the attempts or time of the step are used up.
+        """
+        kind = classify(error)
+        self.failures += 1
+        self.retries[kind] = self.retries.get(kind, 0) + 1
+        if self.failures >= self.max_attempts:
+            self._give_up(f"{self.failures} failed attempts", error)
+        if kind == FATAL and not fallback:
+            self._give_up("an error that can't be retried", error)
+
+        if fallback:
+            delay = 0.0
+        else:
+            backoff = min(self.max_delay, BASE_DELAYS[kind] * 2 ** (self.failures - 1))
+            # Jittered, so sessions limited at the same time don't all retry at the same time either
+            delay = random.uniform(backoff / 2, backoff)
+            requested = retry_after(error)
+            if requested is not None:
+                delay = max(delay, requested)
+
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            self._give_up("the step's deadline", error)
+        return delay
+
+    def _give_up(self, reason, error):
+        raise RetryBudgetExceeded(f"Giving up on the step after {reason}: {error}") from error
+
+    def _waited(self, seconds):
+        self.step_waited += seconds
+        self.waited += seconds
+
+    def sleep(self, seconds):
+        self._waited(seconds)
+        time.sleep(seconds)
+
+    async def async_sleep(self, seconds):
+        self._waited(seconds)
+        await asyncio.sleep(seconds)
+
+    async def within(self, awaitable):
+        """
+        Awaits `awaitable`, raising `asyncio.TimeoutError` when the step's deadline passes first.
+        """
+        return await asyncio.wait_for(awaitable, self.remaining())
+
+    def queued(self, seconds):
+        """
+        Counts the seconds a request of the step waited for the rate limits.
+        """
+        self.step_queued += seconds
+
+    def step_metrics(self):
+        return {
+            "attempts": self.failures + 1,
+            "retry_wait": self.step_waited,
+            "rate_limit_wait": self.step_queued,
+        }
+
+    def as_dict(self):
+        return {
+            "retries": dict(self.retries),
+            "retry_wait": self.waited,
+            "elapsed": time.time() - self.session_start,
+        }
+
+
+def track_budget(budget):
+    """
+    Makes the requests of the current task and the tasks and threads it starts draw on `budget`.
+    """
+    return _current_budget.set(budget)
+
+
+def current_budget():
+    """
+    Returns the tracked `RetryBudget`, or a fresh one for requests made outside of a session.
+    """
+    budget = _current_budget.get()
+    if budget is None:
+        budget = RetryBudget()
+        _current_budget.set(budget)
+    return budget
@@ -0,0 +1,109 @@
+"""
+Token usage of model requests.
+
+Providers report the usage of every request with `record_usage`. The
+counts go to the `TokenUsage` of the step that made the request, set with
+`track_usage`, so concurrent sessions on the shared event loop don't mix
+their numbers.
+"""
+import contextvars
+
+from operate.models.rate_limit import settle_tokens
+
+_current_usage = contextvars.ContextVar("operate_token_usage", default=None)
+
+
+class TokenUsage:
+    """
+    The token counts of the model requests made for one step.
+
+    Attributes:
+        requests (int): The number of requests.
+        input_tokens (int): Prompt tokens, cached ones included.
+        output_tokens (int): Generated tokens.
+        cached_tokens (int): Prompt tokens read from the provider's prompt cache.
+        cache_write_tokens (int): Prompt tokens written to the prompt cache.
+    """
+
+    FIELDS = ("input_tokens", "output_tokens", "cached_tokens", "cache_write_tokens")
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+
+    def add(self, input_tokens=0, output_tokens=0, cached_tokens=0, cache_write_tokens=0):
+        self.requests += 1
+        self.input_tokens += input_tokens or 0
+        self.output_tokens += output_tokens or 0
+        self.cached_tokens += cached_tokens or 0
+        self.cache_write_tokens += cache_write_tokens or 0
+
+    def as_dict(self):
+        usage = {"requests": self.requests}
+        usage.update((field, getattr(self, field)) for field in self.FIELDS)
+        return usage
+
+
+def track_usage(usage):
+    """
+    Makes `usage` collect the requests of the current task and the tasks and threads it starts.
+    """
+    return _current_usage.set(usage)
+
+
+def record_usage(**counts):
+    """
+    Adds the counts of one request to the tracked `TokenUsage`, if any, and charges them to the rate limiter it went through.
+    """
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(**counts)
+    settle_tokens((counts.get("input_tokens") or 0) + (counts.get("output_tokens") or 0))
+
+
+def _field(obj, name):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def openai_usage(usage):
+    """
+    Returns the counts of an OpenAI compatible `usage` object.
+    """
+    details = _field(usage, "prompt_tokens_details")
+    return {
+        "input_tokens": _field(usage, "prompt_tokens"),
+        "output_tokens": _field(usage, "completion_tokens"),
+        "cached_tokens": _field(details, "cached_tokens"),
+    }
+
+
+def anthropic_usage(usage):
+    """
+    Returns the counts of an Anthropic `usage` object, whose input tokens exclude the cached ones.
+    """
+    cached = _field(usage, "cache_read_input_tokens") or 0
+    written = _field(usage, "cache_creation_input_tokens") or 0
+    return {
+        "input_tokens": (_field(usage, "input_tokens") or 0) + cached + written,
+        "output_tokens": _field(usage, "output_tokens"),
+        "cached_tokens": cached,
+        "cache_write_tokens": written,
+    }
+
+
+def gemini_usage(usage_metadata):
+    """
+    Returns the counts of a Gemini `usage_metadata`.
+    """
+    return {
+        "input_tokens": _field(usage_metadata, "prompt_token_count"),
+        "output_tokens": _field(usage_metadata, "candidates_token_count"),
+        "cached_tokens": _field(usage_metadata, "cached_content_token_count"),
+    }
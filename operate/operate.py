@@ -1,8 +1,6 @@
 import sys
 import os
 import time
-import asyncio
-import random
 import psutil
 from prompt_toolkit.shortcuts import message_dialog
 from prompt_toolkit import prompt
@@ -12,10 +10,15 @@ from operate.exceptions import (
     ModelResponseError,
     ExecutionError,
     OCRError,
+    RetryBudgetExceeded,
 )
 import platform
-import easyocr
-from operate.utils.ocr import get_text_coordinates, get_text_element
+from operate.utils.ocr import (
+    get_text_coordinates,
+    get_text_element,
+    prefetch_frame_text,
+    read_frame_text,
+)
 
 # from operate.models.prompts import USER_QUESTION, get_system_prompt
 from operate.models.prompts import (
@@ -33,74 +36,193 @@ from operate.utils.style import (
     style,
 )
 from operate.utils.operating_system import OperatingSystem
-from operate.models.apis import get_next_action
+from operate.utils.screenshot import capture_screen_with_cursor
+from operate.utils.screen_change import (
+    ChangeDetector,
+    PROCEED,
+    WAIT,
+    wait_for_change,
+    wait_until_stable,
+)
+from operate.models.history import MessageHistory
+from operate.models.retry import RetryBudget
+from operate.models.usage import TokenUsage
+from operate.models.apis import OCR_MODELS, get_next_action, stream_next_action
 from operate.tools import solve_quiz
+from operate.utils.event_loop import background_loop
 from operate.utils.logger import Logger
-#reader = easyocr.Reader(["en"], gpu=True)
+from operate.utils.ocr_engine import ocr_engines
+from operate.utils.tracker import ElementTracker
+from operate.utils.trajectory import TrajectoryRecorder, TrajectoryReplayer
 
 # Load configuration
 config = Config()
 operating_system = OperatingSystem()
 
 
-def _run_operation_loop(model, objective, messages, logger, use_gpu: bool):
+def _run_operation_loop(model, objective, messages, logger, use_gpu: bool, record_path=None, replay_path=None):
     """Core loop for the Self-Operating Computer, designed to be reusable."""
-    # Initialize EasyOCR Reader within the loop, with specified GPU usage
-    print(f"Initializing EasyOCR with use_gpu={use_gpu}...")
-    reader = easyocr.Reader(["en"], gpu=use_gpu)
-    print("EasyOCR initialized.")
+    # The EasyOCR reader is loaded once per process and shared by every session
+    reader = ocr_engines.get_reader(["en"], gpu=use_gpu)
+    # Label numbers only need to stay stable within one session, concurrent sessions each have their own
+    tracker = ElementTracker()
+
+    change_detector = ChangeDetector(
+        policy=config.screen_change_policy, method=config.screen_change_method
+    )
+    # Older screenshots are replaced with text so requests don't grow with every step
+    history = MessageHistory(
+        max_images=config.history_images, max_bytes=config.history_max_bytes
+    )
+    recorder = None
+    if record_path:
+        recorder = TrajectoryRecorder(record_path, objective, model, messages[0]["content"])
+    replayer = None
+    if replay_path:
+        replayer = TrajectoryReplayer(replay_path, threshold=config.replay_threshold)
+        if replayer.objective != objective:
+            print(f"{ANSI_YELLOW}[Self-Operating Computer][Warning] The recording was made for a different objective: {replayer.objective}{ANSI_RESET}")
 
     loop_count = 0
     session_id = None
     start_time = time.time()
-    MAX_RETRIES = 3
-    INITIAL_BACKOFF = 1
+    # Provider fallbacks and the retries below share the attempts and deadlines of each step
+    budget = RetryBudget(
+        max_attempts=config.retry_attempts,
+        step_timeout=config.step_timeout,
+        session_timeout=config.session_timeout,
+    )
 
     while True:
         if config.verbose:
             print("[Self Operating Computer] loop_count", loop_count)
 
-        retries = 0
-        backoff_time = INITIAL_BACKOFF
-        
-        while retries < MAX_RETRIES:
+        budget.start_step()
+        while True:
             try:
-                time.sleep(0.5)
-                operations, session_id = asyncio.run(
-                    get_next_action(model, messages, objective, session_id, reader)
-                )
-
-                summary = operate(operations, messages, model, start_time, logger, reader)
+                # Give the UI time to settle before capturing the next frame
+                settle_start_time = time.time()
+                wait_until_stable(timeout=1.5)
+                capture_start_time = time.time()
+                frame = capture_screen_with_cursor()
+                capture_end_time = time.time()
+
+                # Give the last action a little longer to show an effect before calling the model
+                if budget.failures == 0:
+                    decision = change_detector.decide(frame)
+                    while decision != PROCEED:
+                        if config.verbose:
+                            print(f"[Self Operating Computer] screen unchanged, capturing again ({decision})")
+                        recapture_start_time = time.time()
+                        if decision == WAIT:
+                            wait_for_change(change_detector.wait_interval)
+                        else:
+                            time.sleep(change_detector.recapture_interval)
+                        frame = capture_screen_with_cursor()
+                        logger.log_unchanged_screen(
+                            decision,
+                            change_detector.last_difference,
+                            recapture_start_time,
+                            time.time(),
+                        )
+                        decision = change_detector.decide(frame)
+
+                if config.save_screenshots:
+                    frame.save(os.path.join("screenshots", "screenshot.png"))
+
+                # Repeat the recorded operations while the screen still matches the recording
+                replay_step = replayer.match(frame) if replayer else None
+
+                # Run OCR while the model is thinking so clicks don't have to wait for it
+                ocr_prefetch = None
+                if model in OCR_MODELS and replay_step is None:
+                    ocr_prefetch = prefetch_frame_text(reader, frame)
+
+                history.compact(messages)
+                usage = TokenUsage()
+                stream = None
+                model_start_time = time.time()
+                model_end_time = None
+                try:
+                    # Requests share one event loop so the pooled API clients keep their connections
+                    if replay_step is not None:
+                        operations = replayer.replay(replay_step, messages)
+                    elif config.stream:
+                        # Operations run as soon as they are streamed, while the rest of the reply arrives
+                        stream = background_loop.iterate(
+                            stream_next_action(model, messages, objective, reader, frame, usage, budget, tracker)
+                        )
+                        operations = stream
+                    else:
+                        operations, session_id = background_loop.run(
+                            get_next_action(model, messages, objective, session_id, reader, frame, usage, budget, tracker)
+                        )
+                    model_end_time = time.time()
+
+                    if recorder:
+                        operations = recorder.watch(operations)
+                    summary = operate(operations, messages, model, start_time, logger, reader, frame)
+                finally:
+                    if stream:
+                        stream.close()
+                        model_end_time = stream.end_time or time.time()
+                    model_end_time = model_end_time or time.time()
+                    # Only the OCR that ran during the model call was hidden behind it
+                    call_metrics = (
+                        ocr_prefetch.finish(model_start_time, model_end_time) if ocr_prefetch else {}
+                    )
+                    call_metrics.update(
+                        history.track(messages, frame, reader if model in OCR_MODELS else None)
+                    )
+                    call_metrics.update(usage.as_dict())
+                    call_metrics.update(budget.step_metrics())
+                    call_metrics["settle_time"] = capture_start_time - settle_start_time
+                    call_metrics["capture_time"] = capture_end_time - capture_start_time
+
+                if stream:
+                    if stream.first_item_time:
+                        call_metrics["first_operation_time"] = stream.first_item_time - model_start_time
+                if replay_step is not None:
+                    logger.log_replay(replay_step.index, replay_step.difference, model_start_time, model_end_time)
+                else:
+                    logger.log_model_call(model, model_start_time, model_end_time, **call_metrics)
+                if recorder:
+                    recorder.record_step(
+                        frame,
+                        messages,
+                        reader=reader if model in OCR_MODELS else None,
+                        replayed_step=replay_step.index if replay_step else None,
+                        metrics=call_metrics,
+                    )
+                change_detector.accept(frame)
                 if summary:
                     total_time = time.time() - start_time
-                    logger.log_summary(total_time)
+                    logger.log_summary(total_time, budget.as_dict(), tracker)
                     return summary  # Return the summary string on success
 
                 break  # Break retry loop if operation is successful
 
             except (APIError, ModelResponseError, ExecutionError, OCRError) as e:
-                retries += 1
-                print(f"{ANSI_YELLOW}[Self-Operating Computer][Warning] An error occurred: {e}. Retrying ({retries}/{MAX_RETRIES})...{ANSI_RESET}")
-                sleep_time = backoff_time * (2 ** retries) + random.uniform(0, 1)
-                time.sleep(sleep_time)
+                # Raises RetryBudgetExceeded once the step is out of attempts or time
+                delay = budget.retry_delay(e)
+                print(f"{ANSI_YELLOW}[Self-Operating Computer][Warning] An error occurred: {e}. Retrying ({budget.failures}/{budget.max_attempts})...{ANSI_RESET}")
+                budget.sleep(delay)
             
-            except (ModelNotRecognizedException, KeyboardInterrupt) as e:
+            except (ModelNotRecognizedException, RetryBudgetExceeded, KeyboardInterrupt) as e:
                 raise e # Re-raise fatal exceptions
 
             except Exception as e:
                 print(f"{ANSI_RED}[Self-Operating Computer][Fatal Error] An unexpected error occurred: {e} {ANSI_RESET}")
                 raise e # Re-raise other fatal errors
 
-        if retries == MAX_RETRIES:
-            raise Exception(f"Maximum retries reached after {MAX_RETRIES} attempts. Aborting.")
-
         loop_count += 1
         if loop_count > 50:
             raise Exception("Reached maximum loop count of 50. Aborting.")
 
-def run_automated_test(model, objective, verbose_mode=False):
+def run_automated_test(model, objective, verbose_mode=False, save_screenshots=False, record_path=None, replay_path=None):
     """Automated entry point for running a test objective. Uses GPU by default for performance."""
     config.verbose = verbose_mode
+    config.save_screenshots = save_screenshots
     config.validation(model, voice_mode=False)
     logger = Logger()
     logger.log_task_info(objective, model)
@@ -110,12 +232,15 @@ def run_automated_test(model, objective, verbose_mode=False):
 
     # This will either return a summary or raise an exception
     # It explicitly sets use_gpu=True for the automated test
-    return _run_operation_loop(model, objective, messages, logger, use_gpu=True)
+    return _run_operation_loop(
+        model, objective, messages, logger, use_gpu=True, record_path=record_path, replay_path=replay_path
+    )
 
-def main(model, terminal_prompt, voice_mode=False, verbose_mode=False):
+def main(model, terminal_prompt, voice_mode=False, verbose_mode=False, save_screenshots=False, record_path=None, replay_path=None):
     """Main function for interactive use of the Self-Operating Computer. Uses GPU by default."""
     logger = Logger()
     config.verbose = verbose_mode
+    config.save_screenshots = save_screenshots
     config.validation(model, voice_mode)
 
     if voice_mode:
@@ -160,7 +285,9 @@ def main(model, terminal_prompt, voice_mode=False, verbose_mode=False):
 
     try:
         # It explicitly sets use_gpu=True for interactive mode
-        summary = _run_operation_loop(model, objective, messages, logger, use_gpu=True)
+        summary = _run_operation_loop(
+            model, objective, messages, logger, use_gpu=True, record_path=record_path, replay_path=replay_path
+        )
         if summary:
             print(f"{ANSI_GREEN}Objective completed successfully: {summary}{ANSI_RESET}")
     except Exception as e:
@@ -168,7 +295,7 @@ def main(model, terminal_prompt, voice_mode=False, verbose_mode=False):
 
 
 
-def operate(operations, messages, model, start_time, logger, reader):
+def operate(operations, messages, model, start_time, logger, reader, frame):
     if config.verbose:
         print("[Self Operating Computer][operate]", flush=True)
 
@@ -212,10 +339,9 @@ def operate(operations, messages, model, start_time, logger, reader):
                 correct_answer = correct_answer.replace("\"", "")
                 
                 # Find the coordinates of the correct answer on the screen
-                screenshot_filename = os.path.join("screenshots", "screenshot.png")
-                result = reader.readtext(screenshot_filename)
-                text_element_index = get_text_element(result, correct_answer, screenshot_filename)
-                coordinates = get_text_coordinates(result, text_element_index, screenshot_filename)
+                result = read_frame_text(reader, frame)
+                text_element_index = get_text_element(result, correct_answer, frame)
+                coordinates = get_text_coordinates(result, text_element_index, frame)
                 
                 # Click on the correct answer
                 operating_system.mouse(coordinates, click=True)
@@ -228,7 +354,7 @@ def operate(operations, messages, model, start_time, logger, reader):
                 click_op = {"operation": "click", "x": coordinates["x"], "y": coordinates["y"]}
                 logger.log_step(click_op, step_start_time, step_end_time)
 
-                time.sleep(2)
+                wait_until_stable(timeout=2)
                 
                 summary = f"I have solved the quiz. The correct answer for '{question}' is '{correct_answer}'. I have clicked on the answer. Moving into the next question."
                 messages.append({"role": "assistant", "content": summary})
@@ -236,19 +362,6 @@ def operate(operations, messages, model, start_time, logger, reader):
                 print(f"{operate_thought}", flush=True)
                 print(f"{ANSI_BLUE}Action: {ANSI_RESET}{summary}\n", flush=True)
                 continue # Proceed to the next loop to get the click action
-            elif operate_type == "write_in":
-                label = op.get("label")
-                content = op.get("content")
-                operate_detail = f'label: {label}, content: {content}'
-                # The `write_in` operation is a combination of `click` and `write`
-                # as handled in the `call_gemini_api_with_ocr` function.
-                # We just need to handle the `click` and `write` here.
-                x = op.get("x")
-                y = op.get("y")
-                click_detail = {"x": x, "y": y}
-                operating_system.mouse(click_detail)
-                operating_system.write(content)
-
             elif operate_type == "done":
                 summary = op.get("summary")
                 end_time = time.time()
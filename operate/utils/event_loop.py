@@ -0,0 +1,110 @@
+import asyncio
+import queue
+import threading
+import time
+
+
+class BackgroundLoop:
+    """
+    An event loop that runs for the life of the process in a daemon thread.
+
+    `asyncio.run` creates and closes a loop per call, which throws away the
+    keep-alive connections of async API clients. Coroutines submitted with
+    `run` from any thread share this one loop, and with it the pooled clients
+    in `operate.models.clients`.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="operate-event-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def run(self, coroutine):
+        """
+        Runs `coroutine` on the background loop and waits for its result.
+        """
+        loop = self.loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("BackgroundLoop.run() cannot be called from the loop itself")
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        try:
+            return future.result()
+        except BaseException:
+            # e.g. KeyboardInterrupt in the calling thread, don't leave the request running
+            future.cancel()
+            raise
+
+    def iterate(self, async_iterable):
+        """
+        Consumes `async_iterable` on the background loop and returns a blocking iterator over its items.
+        """
+        return LoopIterator(self.loop(), async_iterable)
+
+
+class LoopIterator:
+    """
+    A blocking iterator over an async iterable consumed on another thread's event loop.
+
+    The loop keeps consuming while the caller works on the items it already
+    got, e.g. a model reply keeps streaming while its first operations run.
+    `close` cancels the consumption.
+
+    Attributes:
+        first_item_time (float): When the first item was returned, None before.
+        end_time (float): When the iterable was exhausted, None before.
+    """
+
+    _END = object()
+
+    def __init__(self, loop, async_iterable):
+        self.first_item_time = None
+        self.end_time = None
+        self._items = queue.Queue()
+        self._finished = False
+        self._future = asyncio.run_coroutine_threadsafe(self._consume(async_iterable), loop)
+
+    async def _consume(self, async_iterable):
+        try:
+            async for item in async_iterable:
+                self._items.put((item, None))
+        except Exception as e:
+            self._items.put((self._END, e))
+        else:
+            self._items.put((self._END, None))
+        finally:
+            if hasattr(async_iterable, "aclose"):
+                await async_iterable.aclose()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        item, error = self._items.get()
+        if item is self._END:
+            self._finished = True
+            self.end_time = time.time()
+            if error is not None:
+                raise error
+            raise StopIteration
+        if self.first_item_time is None:
+            self.first_item_time = time.time()
+        return item
+
+    def close(self):
+        self._finished = True
+        self._future.cancel()
+
+
+background_loop = BackgroundLoop()
@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Single background thread so debug writes never block the agent loop
+_debug_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-writer")
+
+
+class Frame:
+    """
+    An in-memory screen capture shared by every stage of a step.
+
+    Attributes:
+        image (PIL.Image.Image): The captured pixels in RGB mode.
+        size (tuple): The frame dimensions (width, height) in pixels.
+        timestamp (float): The time the frame was captured.
+        detections (BoxArray): The object detections of the frame, None until the detector ran on it.
+    """
+
+    def __init__(self, image, timestamp=None):
+        self.image = _to_rgb(image)
+        self.size = self.image.size
+        self.width, self.height = self.size
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.detections = None
+        self._array = None
+        self._content_hash = None
+        self._resized = {}
+        self._thumbnails = {}
+        self._encodings = {}
+
+    @property
+    def array(self):
+        """
+        The pixels as a read-only (height, width, 3) uint8 NumPy array.
+        """
+        if self._array is None:
+            self._array = np.asarray(self.image)
+        return self._array
+
+    @property
+    def content_hash(self):
+        """
+        A digest of the pixels, so identical screens share derived results such as OCR.
+        """
+        if self._content_hash is None:
+            digest = hashlib.blake2b(self.image.tobytes(), digest_size=16)
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def thumbnail(self, width=160):
+        """
+        Returns a small grayscale copy of the frame for cheap comparisons.
+
+        :param width: The thumbnail width in pixels.
+        :return: A (height, width) uint8 NumPy array.
+        """
+        if width not in self._thumbnails:
+            height = max(1, int(width / (self.width / self.height)))
+            small = self.image.resize((width, height), Image.Resampling.BOX)
+            self._thumbnails[width] = np.asarray(small.convert("L"))
+        return self._thumbnails[width]
+
+    def resized(self, width=None):
+        """
+        Returns the frame image scaled to `width` while keeping the aspect ratio.
+
+        :param width: The target width in pixels, or None for the original size.
+        :return: A PIL image.
+        """
+        if width is None or width == self.width:
+            return self.image
+        if width not in self._resized:
+            height = int(width / (self.width / self.height))
+            self._resized[width] = self.image.resize(
+                (width, height), Image.Resampling.LANCZOS
+            )
+        return self._resized[width]
+
+    def encode(self, format="PNG", width=None, quality=85):
+        """
+        Encodes the frame once per (format, width, quality) and caches the bytes.
+
+        :param format: The PIL image format, e.g. "PNG" or "JPEG".
+        :param width: Optional width to resize to before encoding.
+        :param quality: The JPEG quality, ignored for lossless formats.
+        :return: The encoded image bytes.
+        """
+        key = (format.upper(), width, quality)
+        if key not in self._encodings:
+            buffer = io.BytesIO()
+            image = self.resized(width)
+            if key[0] == "JPEG":
+                image.save(buffer, format="JPEG", quality=quality)
+            else:
+                image.save(buffer, format=key[0])
+            self._encodings[key] = buffer.getvalue()
+        return self._encodings[key]
+
+    def base64(self, format="PNG", width=None, quality=85):
+        """
+        Returns the cached encoding of the frame as a base64 string.
+        """
+        return base64.b64encode(self.encode(format, width, quality)).decode("utf-8")
+
+    def save(self, file_path):
+        """
+        Writes the frame to `file_path` without blocking the caller.
+
+        The image is written to a temporary file first so that readers never
+        see a partially written screenshot.
+
+        :return: A `concurrent.futures.Future` for the write.
+        """
+        return _debug_writer.submit(_write_image, self.image, file_path)
+
+
+def _to_rgb(image):
+    if image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    ):
+        # Flatten transparency onto a white background
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        return background
+    if image.mode != "RGB":
+        return image.convert("RGB")
+    return image
+
+
+def _write_image(image, file_path):
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    root, extension = os.path.splitext(file_path)
+    temp_path = f"{root}.tmp{extension}"
+    image.save(temp_path)
+    os.replace(temp_path, file_path)
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class BoxArray:
+    """
+    Axis-aligned bounding boxes stored as one NumPy array, with the size of the frame they were found in.
+
+    Centers, percentage conversion and region queries run over every box at
+    once, and carrying the frame size means nothing has to reopen the image.
+
+    Attributes:
+        xyxy (numpy.ndarray): An (n, 4) float array of x1, y1, x2, y2 pixel coordinates.
+        frame_size (tuple): The frame dimensions (width, height) in pixels.
+    """
+
+    def __init__(self, xyxy, frame_size):
+        self.xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+        self.frame_size = tuple(frame_size)
+        self._centers = None
+
+    @classmethod
+    def from_polygons(cls, polygons, frame_size):
+        """
+        Builds boxes enclosing polygons such as the four corner points EasyOCR returns.
+        """
+        if len(polygons) == 0:
+            return cls(np.empty((0, 4)), frame_size)
+        points = np.asarray(polygons, dtype=np.float64)
+        minimum = points.min(axis=1)
+        maximum = points.max(axis=1)
+        return cls(np.hstack([minimum, maximum]), frame_size)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    @property
+    def centers(self):
+        """
+        The (n, 2) array of box centers in pixels.
+        """
+        if self._centers is None:
+            self._centers = (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+        return self._centers
+
+    def percent_centers(self):
+        """
+        Returns the box centers as fractions of the frame width and height.
+
+        :return: An (n, 2) float array.
+        """
+        return self.centers / np.asarray(self.frame_size, dtype=np.float64)
+
+    def in_region(self, x, y, width, height):
+        """
+        Selects the boxes whose center lies strictly inside a region given in fractions of the frame.
+
+        :param x: The left edge of the region.
+        :param y: The top edge of the region.
+        :param width: The region width.
+        :param height: The region height.
+        :return: A boolean mask over the boxes.
+        """
+        centers = self.percent_centers()
+        return (
+            (centers[:, 0] > x)
+            & (centers[:, 0] < x + width)
+            & (centers[:, 1] > y)
+            & (centers[:, 1] < y + height)
+        )
+
+    def overlapping(self, box):
+        """
+        Selects the boxes that touch or overlap `box`, given as (x1, y1, x2, y2) pixels.
+
+        :return: A boolean mask over the boxes.
+        """
+        x1, y1, x2, y2 = box
+        return ~(
+            (self.xyxy[:, 0] > x2)
+            | (self.xyxy[:, 2] < x1)
+            | (self.xyxy[:, 1] > y2)
+            | (self.xyxy[:, 3] < y1)
+        )
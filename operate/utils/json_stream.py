@@ -0,0 +1,116 @@
+import json
+import re
+
+# The start of a schema-constrained reply, whose array is parsed like a bare one
+_WRAPPER = re.compile(r'\{\s*"operations"\s*:\s*\[')
+_WRAPPER_PREFIX = '{"operations":['
+
+
+class JSONArrayStream:
+    """
+    An incremental parser for a streamed JSON array of operations.
+
+    `feed` takes the next chunk of the reply and returns the objects that were
+    completed by it, so each operation can be executed as soon as its closing
+    brace arrives instead of after the whole reply. A leading ```json fence, an
+    `{"operations": [...]}` object and a single top-level object are accepted.
+    If the reply starts with anything else, nothing is emitted and the caller
+    parses `text` once it is complete.
+
+    Attributes:
+        text (str): Everything fed so far.
+        disabled (bool): Whether the reply could not be parsed incrementally.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.disabled = False
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._array = False
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    def feed(self, chunk):
+        """
+        Adds `chunk` to the reply.
+
+        :return: The list of top-level objects completed by this chunk.
+        """
+        self.text += chunk
+        if self.disabled:
+            return []
+        if not self._started and not self._find_start():
+            return []
+
+        objects = []
+        text = self.text
+        # The depth at which the operation objects live
+        object_depth = 1 if self._array else 0
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c == "[" or c == "{":
+                if c == "[" and self._depth == 0:
+                    self._array = True
+                    object_depth = 1
+                elif c == "{" and self._depth == object_depth:
+                    self._object_start = i
+                self._depth += 1
+            elif c == "]" or c == "}":
+                self._depth -= 1
+                if c == "}" and self._depth == object_depth and self._object_start is not None:
+                    try:
+                        obj = json.loads(text[self._object_start : i + 1])
+                    except json.JSONDecodeError:
+                        self.disabled = True
+                        return objects
+                    self._object_start = None
+                    if isinstance(obj, dict):
+                        objects.append(obj)
+        self._pos = len(text)
+        return objects
+
+    def _find_start(self):
+        """
+        Skips whitespace and a markdown fence, and decides whether the reply is JSON.
+        """
+        text = self.text
+        stripped = text.lstrip()
+        if not stripped:
+            return False
+        if stripped.startswith("`"):
+            newline = stripped.find("\n")
+            if newline == -1:
+                # Wait for the rest of the fence line
+                return False
+            rest = stripped[newline + 1 :].lstrip()
+            if not rest:
+                return False
+        else:
+            rest = stripped
+        if rest[0] not in "[{":
+            self.disabled = True
+            return False
+        start = len(text) - len(rest)
+        if rest[0] == "{":
+            match = _WRAPPER.match(rest)
+            if match:
+                # Continue at the array, the closing brace of the object is ignored
+                start += match.end() - 1
+            elif _WRAPPER_PREFIX.startswith(re.sub(r"\s", "", rest)):
+                # Wait until it is clear whether this is the wrapper
+                return False
+        self._started = True
+        self._pos = start
+        return True
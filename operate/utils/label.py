@@ -1,10 +1,16 @@
-import io
-import base64
-import json
 import os
 import time
-import asyncio
-from PIL import Image, ImageDraw
+from collections import defaultdict
+from PIL import ImageDraw, ImageFont
+
+from operate.config import Config
+from operate.utils.frame import Frame
+
+# Load configuration
+config = Config()
+
+# Label fonts by size, loaded once
+_fonts = {}
 
 
 def validate_and_extract_image_data(data):
@@ -52,90 +58,109 @@ def is_overlapping(box1, box2):
     return True
 
 
-def add_labels(base64_data, yolo_model):
-    image_bytes = base64.b64decode(base64_data)
-    image_labeled = Image.open(io.BytesIO(image_bytes))  # Corrected this line
-    image_debug = image_labeled.copy()  # Create a copy for the debug image
-    image_original = (
-        image_labeled.copy()
-    )  # Copy of the original image for base64 return
+class _OverlapGrid:
+    """
+    A spatial hash of the boxes drawn so far, so each new box is only
+    compared with the boxes in the grid cells it touches.
+    """
+
+    def __init__(self, cell_size=128):
+        self.cell_size = cell_size
+        self._cells = defaultdict(list)
+
+    def _cells_for(self, box):
+        x1, y1, x2, y2 = box
+        size = self.cell_size
+        for column in range(int(x1 // size), int(x2 // size) + 1):
+            for row in range(int(y1 // size), int(y2 // size) + 1):
+                yield column, row
+
+    def overlaps(self, box):
+        return any(
+            is_overlapping(box, drawn)
+            for cell in self._cells_for(box)
+            for drawn in self._cells.get(cell, ())
+        )
+
+    def add(self, box):
+        for cell in self._cells_for(box):
+            self._cells[cell].append(box)
+
 
-    results = yolo_model(image_labeled)
+def _label_font(font_size):
+    if font_size not in _fonts:
+        _fonts[font_size] = ImageFont.load_default(size=font_size)
+    return _fonts[font_size]
 
+
+def add_labels(frame, yolo_model, tracker=None):
+    """
+    Draws set-of-marks labels on the non-overlapping detections of a frame.
+
+    The label map is kept in memory. The labeled, debug and original images
+    are only written to labeled_images/ when screenshots are being saved,
+    and then in the background.
+
+    :param frame: The `Frame` to label.
+    :param yolo_model: The shared `Detector`.
+    :param tracker: An optional `ElementTracker` that keeps labels stable across frames
+        and only re-detects the regions that changed.
+    :return: The labeled `Frame`, which caches its encodings, and a dictionary of labels and their coordinates.
+    """
+    image_original = frame.image
+    image_labeled = image_original.copy()
     draw = ImageDraw.Draw(image_labeled)
-    debug_draw = ImageDraw.Draw(
-        image_debug
-    )  # Create a separate draw object for the debug image
-    font_size = 45
 
-    labeled_images_dir = "labeled_images"
-    label_coordinates = {}  # Dictionary to store coordinates
+    save_debug = config.save_screenshots
+    if save_debug:
+        image_debug = image_original.copy()  # Create a copy for the debug image
+        debug_draw = ImageDraw.Draw(image_debug)
+
+    if tracker is not None:
+        element_ids, detections = tracker.update(frame, yolo_model)
+    else:
+        detections = yolo_model.detect(image_original)
+        element_ids = None
+    # Kept with the frame, so write_in operations find input fields without detecting again
+    frame.detections = detections
 
-    if not os.path.exists(labeled_images_dir):
-        os.makedirs(labeled_images_dir)
+    font_size = 45
+    font = _label_font(font_size)
+    label_coordinates = {}  # Dictionary to store coordinates
+    drawn_boxes = _OverlapGrid()
 
     counter = 0
-    drawn_boxes = []  # List to keep track of boxes already drawn
-    for result in results:
-        if hasattr(result, "boxes"):
-            for det in result.boxes:
-                bbox = det.xyxy[0]
-                x1, y1, x2, y2 = bbox.tolist()
-
-                debug_label = "D_" + str(counter)
-                debug_index_position = (x1, y1 - font_size)
-                debug_draw.rectangle([(x1, y1), (x2, y2)], outline="blue", width=1)
-                debug_draw.text(
-                    debug_index_position,
-                    debug_label,
-                    fill="blue",
-                    font_size=font_size,
-                )
-
-                overlap = any(
-                    is_overlapping((x1, y1, x2, y2), box) for box in drawn_boxes
-                )
-
-                if not overlap:
-                    draw.rectangle([(x1, y1), (x2, y2)], outline="red", width=1)
-                    label = "~" + str(counter)
-                    index_position = (x1, y1 - font_size)
-                    draw.text(
-                        index_position,
-                        label,
-                        fill="red",
-                        font_size=font_size,
-                    )
-
-                    # Add the non-overlapping box to the drawn_boxes list
-                    drawn_boxes.append((x1, y1, x2, y2))
-                    label_coordinates[label] = (x1, y1, x2, y2)
-
-                    counter += 1
-
-    # Save the image
-    timestamp = time.strftime("%Y%m%d-%H%M%S")
-
-    output_path = os.path.join(labeled_images_dir, f"img_{timestamp}_labeled.png")
-    output_path_debug = os.path.join(labeled_images_dir, f"img_{timestamp}_debug.png")
-    output_path_original = os.path.join(
-        labeled_images_dir, f"img_{timestamp}_original.png"
-    )
-
-    image_labeled.save(output_path)
-    image_debug.save(output_path_debug)
-    image_original.save(output_path_original)
-
-    buffered_original = io.BytesIO()
-    image_original.save(buffered_original, format="PNG")  # I guess this is needed
-    img_base64_original = base64.b64encode(buffered_original.getvalue()).decode("utf-8")
-
-    # Convert image to base64 for return
-    buffered_labeled = io.BytesIO()
-    image_labeled.save(buffered_labeled, format="PNG")  # I guess this is needed
-    img_base64_labeled = base64.b64encode(buffered_labeled.getvalue()).decode("utf-8")
-
-    return img_base64_labeled, label_coordinates
+    for debug_counter, box in enumerate(detections.xyxy.tolist()):
+        x1, y1, x2, y2 = box
+
+        if save_debug:
+            debug_draw.rectangle([(x1, y1), (x2, y2)], outline="blue", width=1)
+            debug_draw.text(
+                (x1, y1 - font_size), "D_" + str(debug_counter), fill="blue", font=font
+            )
+
+        if drawn_boxes.overlaps(box):
+            continue
+
+        draw.rectangle([(x1, y1), (x2, y2)], outline="red", width=1)
+        # Tracked elements keep their number from one step to the next
+        label = "~" + str(counter if element_ids is None else int(element_ids[debug_counter]))
+        draw.text((x1, y1 - font_size), label, fill="red", font=font)
+
+        # Add the non-overlapping box to the drawn boxes
+        drawn_boxes.add(box)
+        label_coordinates[label] = (x1, y1, x2, y2)
+        counter += 1
+
+    labeled_frame = Frame(image_labeled)
+    if save_debug:
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        prefix = os.path.join("labeled_images", f"img_{timestamp}")
+        labeled_frame.save(f"{prefix}_labeled.png")
+        Frame(image_debug).save(f"{prefix}_debug.png")
+        frame.save(f"{prefix}_original.png")
+
+    return labeled_frame, label_coordinates
 
 
 def get_click_position_in_percent(coordinates, image_size):
@@ -3,6 +3,13 @@ import os
 import time
 import psutil
 
+from operate.utils.ocr import ocr_cache
+from operate.utils.ocr_engine import ocr_engines
+from operate.models.clients import api_clients
+from operate.models.rate_limit import rate_limiters
+from operate.models.detector import detectors
+from operate.models.usage import TokenUsage
+
 class Logger:
     def __init__(self, log_dir="logs"):
         self.log_dir = log_dir
@@ -15,6 +22,12 @@ class Logger:
             "steps": [],
             "summary": {},
         }
+        self.unchanged_captures = 0
+        self.replayed_steps = 0
+        self.hidden_ocr_time = 0.0
+        self.tokens = dict.fromkeys(TokenUsage.FIELDS, 0)
+        # The OCR cache is shared by the whole process, so report this session's share
+        self.ocr_cache_start = ocr_cache.stats()
 
     def log_task_info(self, objective, model):
         self.log_data["task_info"] = {
@@ -33,9 +46,40 @@ class Logger:
         }
         self.log_data["steps"].append(step_data)
 
-    def log_summary(self, total_time):
+    def log_unchanged_screen(self, decision, difference, start_time, end_time):
+        """Records a capture that was taken again because the screen had not changed since the last actions."""
+        self.unchanged_captures += 1
+        recapture = {"operation": "unchanged_screen", "decision": decision, "difference": difference}
+        self.log_step(recapture, start_time, end_time)
+
+    def log_replay(self, step_index, difference, start_time, end_time):
+        """Records a step whose operations were replayed from a recording instead of asking the model."""
+        self.replayed_steps += 1
+        replay = {"operation": "replay", "recorded_step": step_index, "difference": difference}
+        self.log_step(replay, start_time, end_time)
+
+    def log_model_call(self, model, start_time, end_time, **metrics):
+        """Records the model request of a step, along with OCR time hidden behind it and token usage."""
+        self.hidden_ocr_time += metrics.get("hidden_ocr_time", 0.0)
+        for field in self.tokens:
+            self.tokens[field] += metrics.get(field, 0)
+        model_call = {"operation": "model_call", "model": model, **metrics}
+        self.log_step(model_call, start_time, end_time)
+
+    def log_summary(self, total_time, retries=None, tracker=None):
         self.log_data["summary"] = {
             "total_time": total_time,
+            "retries": retries or {},
+            "unchanged_captures": self.unchanged_captures,
+            "replayed_steps": self.replayed_steps,
+            "hidden_ocr_time": self.hidden_ocr_time,
+            "tokens": self.tokens,
+            "ocr_cache": self.get_ocr_cache_usage(),
+            "ocr_engines": ocr_engines.stats(),
+            "detectors": detectors.stats(),
+            "element_tracker": tracker.stats() if tracker else {},
+            "api_clients": api_clients.stats(),
+            "rate_limits": rate_limiters.stats(),
             "final_resource_usage": self.get_resource_usage(),
         }
         self.write_log()
@@ -46,6 +90,13 @@ class Logger:
             "memory_percent": psutil.virtual_memory().percent,
         }
 
+    def get_ocr_cache_usage(self):
+        stats = ocr_cache.stats()
+        return {
+            "hits": stats["hits"] - self.ocr_cache_start["hits"],
+            "misses": stats["misses"] - self.ocr_cache_start["misses"],
+        }
+
     def write_log(self):
         with open(self.log_file, 'w') as f:
             json.dump(self.log_data, f, indent=4)
@@ -1,57 +1,203 @@
 from operate.config import Config
-from PIL import Image, ImageDraw
+from PIL import ImageDraw
 import os
+import threading
+import numpy as np
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from operate.exceptions import OCRError
+from operate.utils.geometry import BoxArray
+from operate.utils.spatial_index import SpatialIndex
+from operate.utils.text_index import TextIndex
 
 # Load configuration
 config = Config()
 
 
-def get_text_element(result, search_text, image_path):
+class OCRResult(BoxArray):
+    """
+    EasyOCR output converted once into arrays, together with the frame size.
+
+    Indexing and iterating still yield (bounding_box, text, confidence)
+    tuples, so code written against the raw EasyOCR list keeps working.
+
+    Attributes:
+        polygons (list): The corner points of every element as returned by EasyOCR.
+        texts (numpy.ndarray): The recognized text of every element.
+        confidences (numpy.ndarray): The OCR confidence of every element.
+    """
+
+    def __init__(self, polygons, texts, confidences, frame_size):
+        boxes = BoxArray.from_polygons(polygons, frame_size)
+        super().__init__(boxes.xyxy, frame_size)
+        self.polygons = list(polygons)
+        self.texts = np.array(texts, dtype=object)
+        self.confidences = np.asarray(confidences, dtype=np.float64)
+        self._text_index = None
+        self._spatial_index = None
+        # The detections the combined index was built with and the index
+        self._combined_index = (None, None)
+
+    @classmethod
+    def from_easyocr(cls, result, frame_size):
+        """
+        Converts a list of EasyOCR (bounding_box, text, confidence) tuples.
+        """
+        if isinstance(result, cls):
+            return result
+        polygons = [element[0] for element in result]
+        texts = [element[1] for element in result]
+        confidences = [element[2] for element in result]
+        return cls(polygons, texts, confidences, frame_size)
+
+    def __getitem__(self, index):
+        return self.polygons[index], self.texts[index], self.confidences[index]
+
+    def __iter__(self):
+        return zip(self.polygons, self.texts, self.confidences)
+
+    @property
+    def text_index(self):
+        """
+        The `TextIndex` over these results, built on first use.
+        """
+        if self._text_index is None:
+            self._text_index = TextIndex(self)
+        return self._text_index
+
+    @property
+    def spatial_index(self):
+        """
+        A `SpatialIndex` over these results alone, built on first use.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex.build(self.frame_size, ocr_result=self)
+        return self._spatial_index
+
+    def spatial_index_with(self, detections):
+        """
+        Returns a `SpatialIndex` over these results and the detections of the same frame, built once per detections.
+        """
+        indexed, index = self._combined_index
+        if index is None or indexed is not detections:
+            index = SpatialIndex.build(self.frame_size, ocr_result=self, detections=detections)
+            self._combined_index = (detections, index)
+        return index
+
+    def texts_in_region(self, x, y, width, height):
+        """
+        Returns the text of the elements centered inside a region given in fractions of the frame, in reading order.
+        """
+        return [
+            self.texts[element.index]
+            for element in self.spatial_index.within(x, y, width, height)
+        ]
+
+
+class OCRCache:
+    """
+    A bounded LRU cache of OCR results keyed by frame content.
+
+    Every operation in a model response, and every step that sees an
+    identical screen, reuses the same recognition instead of running EasyOCR again.
+
+    Attributes:
+        max_size (int): The number of frames kept.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to run OCR.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """
+        Returns the cached result for `key` without running OCR or counting a lookup.
+        """
+        with self._lock:
+            return self._results.get(key)
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._results),
+                "max_size": self.max_size,
+            }
+
+
+ocr_cache = OCRCache()
+
+# OCR started ahead of time, keyed by (frame, reader) identity
+_prefetches = {}
+_prefetches_lock = threading.Lock()
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ocr-prefetch")
+
+
+def get_text_element(result, search_text, frame):
     """
     Searches for a text element in the OCR results and returns its index. Also draws bounding boxes on the image.
+
+    The lookup goes through the frame's `TextIndex`, so differences in case,
+    punctuation and small OCR misreads still find the element.
     Args:
-        result (list): The list of results returned by EasyOCR.
+        result (OCRResult): The OCR results, a raw EasyOCR list is converted.
         search_text (str): The text to search for in the OCR results.
-        image_path (str): Path to the original image.
+        frame (Frame): The frame the OCR results were read from.
 
     Returns:
-        int: The index of the element containing the search text.
+        int: The index of the best matching element.
 
     Raises:
         OCRError: If the text element is not found in the results.
     """
+    result = OCRResult.from_easyocr(result, frame.size)
+    matches = result.text_index.search(search_text)
+
     if config.verbose:
         print("[get_text_element]")
         print("[get_text_element] search_text", search_text)
+        print("[get_text_element] matches", matches)
         # Create /ocr directory if it doesn't exist
         ocr_dir = "ocr"
         if not os.path.exists(ocr_dir):
             os.makedirs(ocr_dir)
 
-        # Open the original image
-        image = Image.open(image_path)
+        # Draw on a copy so the frame itself stays untouched
+        image = frame.image.copy()
         draw = ImageDraw.Draw(image)
-
-    found_index = None
-    for index, element in enumerate(result):
-        text = element[1]
-        box = element[0]
-
-        if config.verbose:
+        for polygon in result.polygons:
             # Draw bounding box in blue
-            draw.polygon([tuple(point) for point in box], outline="blue")
+            draw.polygon([tuple(point) for point in polygon], outline="blue")
 
-        if search_text in text:
-            found_index = index
-            if config.verbose:
-                print("[get_text_element][loop] found search_text, index:", index)
-
-    if found_index is not None:
+    if matches:
+        found_index = matches[0].index
         if config.verbose:
             # Draw bounding box of the found text in red
-            box = result[found_index][0]
+            box = result.polygons[found_index]
             draw.polygon([tuple(point) for point in box], outline="red")
             # Save the image with bounding boxes
             datetime_str = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -64,38 +210,171 @@ def get_text_element(result, search_text, image_path):
     raise OCRError("The text element was not found in the image")
 
 
-def get_text_coordinates(result, index, image_path):
+def get_text_coordinates(result, index, frame):
     """
     Gets the coordinates of the text element at the specified index as a percentage of screen width and height.
     Args:
-        result (list): The list of results returned by EasyOCR.
+        result (OCRResult): The OCR results, a raw EasyOCR list is converted.
         index (int): The index of the text element in the results list.
-        image_path (str): Path to the screenshot image.
+        frame (Frame): The frame the OCR results were read from.
 
     Returns:
         dict: A dictionary containing the 'x' and 'y' coordinates as percentages of the screen width and height.
     """
+    result = OCRResult.from_easyocr(result, frame.size)
     if index >= len(result):
         raise Exception("Index out of range in OCR results")
 
-    # Get the bounding box of the text element
-    bounding_box = result[index][0]
+    # Center of the bounding box as a fraction of the frame size
+    percent_x, percent_y = result.percent_centers()[index]
+
+    return {"x": round(float(percent_x), 3), "y": round(float(percent_y), 3)}
 
-    # Calculate the center of the bounding box
-    min_x = min([coord[0] for coord in bounding_box])
-    max_x = max([coord[0] for coord in bounding_box])
-    min_y = min([coord[1] for coord in bounding_box])
-    max_y = max([coord[1] for coord in bounding_box])
 
-    center_x = (min_x + max_x) / 2
-    center_y = (min_y + max_y) / 2
+def get_input_coordinates(result, label_index, frame, detections=None, max_distance=0.1):
+    """
+    Finds where to click to type into the field belonging to a label.
+
+    Looks for the nearest detected element to the right of the label, then
+    below it, and falls back to a point just right of the label. Other text
+    is never taken for the field, it is as likely to be a neighbouring label.
+    Args:
+        result (OCRResult): The OCR results.
+        label_index (int): The index of the label element.
+        frame (Frame): The frame the OCR results were read from.
+        detections (BoxArray): The object detections of the same frame.
+        max_distance (float): The largest gap to the field as a fraction of the frame width or height.
+
+    Returns:
+        dict: A dictionary containing the 'x' and 'y' coordinates as percentages of the screen width and height.
+    """
+    result = OCRResult.from_easyocr(result, frame.size)
+    if detections is not None:
+        index = result.spatial_index_with(detections)
+        anchor = tuple(result.xyxy[label_index])
+        for direction in ("right", "below"):
+            element = index.nearest(anchor, direction, max_distance, kinds=("detection",))
+            if element is not None:
+                if config.verbose:
+                    print(f"[get_input_coordinates] field {direction} of label:", element)
+                x1, y1, x2, y2 = element.box
+                return {
+                    "x": round(float(x1 + x2) / 2 / frame.width, 3),
+                    "y": round(float(y1 + y2) / 2 / frame.height, 3),
+                }
+
+    # Assume the input field is just to the right of the label
+    coordinates = get_text_coordinates(result, label_index, frame)
+    return {"x": coordinates["x"] + 0.05, "y": coordinates["y"]}
+
 
-    # Get image dimensions
-    with Image.open(image_path) as img:
-        width, height = img.size
+def read_frame_text(reader, frame):
+    """
+    Runs EasyOCR on an in-memory frame, at most once per frame content.
+
+    If OCR for this frame was started with `prefetch_frame_text`, waits for that run instead.
+    Args:
+        reader (SharedReader): The shared EasyOCR reader to use.
+        frame (Frame): The frame to read text from.
 
-    # Convert to percentages
-    percent_x = round((center_x / width), 3)
-    percent_y = round((center_y / height), 3)
+    Returns:
+        OCRResult: The recognized text elements of the frame.
+    """
+    with _prefetches_lock:
+        prefetch = _prefetches.get((id(frame), id(reader)))
+    if prefetch is not None:
+        return prefetch.result()
+    return _read_frame_text(reader, frame)
 
-    return {"x": percent_x, "y": percent_y}
+
+def _read_frame_text(reader, frame):
+    key = (frame.content_hash, id(reader))
+    result = ocr_cache.get(key)
+    if result is not None:
+        if config.verbose:
+            print("[read_frame_text] cache hit", ocr_cache.stats())
+        return result
+
+    result = OCRResult.from_easyocr(reader.readtext(frame.array), frame.size)
+    ocr_cache.put(key, result)
+    if config.verbose:
+        print("[read_frame_text] cache miss", ocr_cache.stats())
+    return result
+
+
+class OCRPrefetch:
+    """
+    OCR running in the background on a freshly captured frame.
+
+    Started before the model request so that the results are usually ready
+    by the time a click needs them. `read_frame_text` on the same frame waits
+    for this run instead of starting another one.
+
+    Attributes:
+        start_time (float): When OCR was requested.
+        run_start_time (float): When OCR started running, or None while it is queued.
+        end_time (float): When OCR finished, or None while it is running.
+        wait_time (float): How long callers were blocked waiting for the results.
+        used (bool): Whether any caller needed the results.
+    """
+
+    def __init__(self, reader, frame):
+        self.start_time = time.time()
+        self.run_start_time = None
+        self.end_time = None
+        self.wait_time = 0.0
+        self.used = False
+        self._key = (id(frame), id(reader))
+        self._lock = threading.Lock()
+        with _prefetches_lock:
+            _prefetches[self._key] = self
+        self._future = _prefetch_executor.submit(self._run, reader, frame)
+
+    def _run(self, reader, frame):
+        self.run_start_time = time.time()
+        try:
+            return _read_frame_text(reader, frame)
+        finally:
+            self.end_time = time.time()
+
+    def result(self):
+        start = time.time()
+        result = self._future.result()
+        with self._lock:
+            self.used = True
+            self.wait_time += time.time() - start
+        return result
+
+    def finish(self, model_start_time, model_end_time):
+        """
+        Stops handing out this run and reports how much OCR time was hidden behind the model call.
+
+        Hidden time is the part of the OCR run that overlapped the model
+        call, and only counts when the step used the results. OCR that is
+        still running keeps going and lands in the cache.
+
+        :param model_start_time: When the model call started.
+        :param model_end_time: When the model call ended.
+        :return: A dictionary with `ocr_time`, `hidden_ocr_time`, `ocr_wait_time` and `ocr_used`.
+        """
+        with _prefetches_lock:
+            _prefetches.pop(self._key, None)
+        now = time.time()
+        run_start_time = self.run_start_time or now
+        end_time = self.end_time or now
+        overlap = min(end_time, model_end_time) - max(run_start_time, model_start_time)
+        return {
+            "ocr_time": end_time - run_start_time,
+            "hidden_ocr_time": max(0.0, overlap) if self.used else 0.0,
+            "ocr_wait_time": self.wait_time,
+            "ocr_used": self.used,
+        }
+
+
+def prefetch_frame_text(reader, frame):
+    """
+    Starts OCR on `frame` in a background thread.
+
+    :return: An `OCRPrefetch`; call `finish()` on it once the step is done.
+    """
+    return OCRPrefetch(reader, frame)
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+
+import psutil
+
+from operate.config import Config
+from operate.utils.style import ANSI_GREEN, ANSI_RESET
+
+# Load configuration
+config = Config()
+
+
+class SharedReader:
+    """
+    A pool of identical EasyOCR readers shared by every caller in the process.
+
+    `readtext` borrows a reader from the pool for the duration of the call,
+    so concurrent sessions never use the same reader at the same time. Readers
+    are loaded lazily, up to `pool_size`, only when every loaded reader is busy.
+
+    Attributes:
+        languages (tuple): The EasyOCR language codes.
+        gpu (bool): Whether GPU inference was requested.
+        pool_size (int): The maximum number of loaded readers.
+    """
+
+    def __init__(self, languages, gpu, pool_size=1):
+        self.languages = tuple(languages)
+        self.gpu = gpu
+        self.pool_size = max(1, pool_size)
+        self.load_times = []
+        self.memory_mb = []
+        self.calls = 0
+        self.wait_time = 0.0
+        self._idle = queue.Queue()
+        self._loaded = 1
+        self._lock = threading.Lock()
+        self._idle.put(self._load())
+
+    def _load(self):
+        import easyocr
+
+        process = psutil.Process(os.getpid())
+        rss_before = process.memory_info().rss
+        start = time.time()
+        reader = easyocr.Reader(list(self.languages), gpu=self.gpu)
+        load_time = time.time() - start
+        memory_mb = (process.memory_info().rss - rss_before) / (1024 * 1024)
+
+        with self._lock:
+            self.load_times.append(load_time)
+            self.memory_mb.append(memory_mb)
+        print(
+            f"{ANSI_GREEN}[Self-Operating Computer]{ANSI_RESET}[OCR] Loaded EasyOCR {list(self.languages)} "
+            f"(gpu={self.gpu}) in {load_time:.2f}s, +{memory_mb:.0f}MB"
+        )
+        return reader
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_grow = self._loaded < self.pool_size
+            if can_grow:
+                # Reserve the slot so the slow load can happen outside the lock
+                self._loaded += 1
+        if not can_grow:
+            return self._idle.get()
+        try:
+            return self._load()
+        except Exception:
+            with self._lock:
+                self._loaded -= 1
+            raise
+
+    def readtext(self, image, **kwargs):
+        start = time.time()
+        reader = self._acquire()
+        waited = time.time() - start
+        try:
+            return reader.readtext(image, **kwargs)
+        finally:
+            self._idle.put(reader)
+            with self._lock:
+                self.calls += 1
+                self.wait_time += waited
+
+    def stats(self):
+        with self._lock:
+            return {
+                "languages": list(self.languages),
+                "gpu": self.gpu,
+                "readers": self._loaded,
+                "pool_size": self.pool_size,
+                "load_time": sum(self.load_times),
+                "memory_mb": sum(self.memory_mb),
+                "calls": self.calls,
+                "wait_time": self.wait_time,
+            }
+
+
+class OCREngineManager:
+    """
+    Loads each EasyOCR language and device configuration once per process.
+
+    Model loading takes seconds and hundreds of MB, so sessions, API worker
+    threads and individual call sites all share the readers handed out here.
+    """
+
+    def __init__(self):
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def get_reader(self, languages=("en",), gpu=True, pool_size=None):
+        """
+        Returns the shared reader for a configuration, loading it on first use.
+
+        :param languages: The EasyOCR language codes.
+        :param gpu: Whether to run on the GPU.
+        :param pool_size: The maximum number of concurrent readers, defaults to `config.ocr_pool_size`.
+        :return: A `SharedReader`.
+        """
+        key = (tuple(languages), bool(gpu))
+        with self._lock:
+            if key not in self._readers:
+                self._readers[key] = SharedReader(
+                    languages, gpu, pool_size or config.ocr_pool_size
+                )
+            return self._readers[key]
+
+    def stats(self):
+        with self._lock:
+            readers = list(self._readers.values())
+        return [reader.stats() for reader in readers]
+
+
+ocr_engines = OCREngineManager()
@@ -4,8 +4,12 @@ import time
 import math
 import pygetwindow as gw
 
+from operate.config import Config
 from operate.utils.misc import convert_percent_to_decimal
 
+# Load configuration
+config = Config()
+
 
 class OperatingSystem:
     def write(self, content):
@@ -52,9 +56,12 @@ class OperatingSystem:
         y_percentage,
         duration=0.2,
         circle_radius=50,
-        circle_duration=0.5,
+        circle_duration=None,
         click=True,
     ):
+        if circle_duration is None:
+            circle_duration = config.click_animation_duration
+
         try:
             # Bring the window to the front
             try:
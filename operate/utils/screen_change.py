@@ -0,0 +1,195 @@
+import time
+
+import numpy as np
+from PIL import Image
+
+from operate.config import Config
+from operate.utils.screenshot import get_capture_backend
+
+# Load configuration
+config = Config()
+
+PROCEED = "proceed"
+WAIT = "wait"
+RECAPTURE = "recapture"
+
+
+def _changed_fraction(a, b, tolerance=8):
+    if a.shape != b.shape:
+        return 1.0
+    changed = np.abs(a.astype(np.int16) - b.astype(np.int16)) > tolerance
+    return float(changed.mean())
+
+
+def pixel_difference(previous, current, width=320, tolerance=8):
+    """
+    Measures how much of the screen changed between two frames.
+
+    Both frames are downsampled to small grayscale thumbnails and compared pixel by pixel.
+
+    :param previous: The earlier `Frame`.
+    :param current: The later `Frame`.
+    :param width: The thumbnail width used for the comparison.
+    :param tolerance: Per-pixel gray level change ignored as noise.
+    :return: The fraction of thumbnail pixels that changed, between 0 and 1.
+    """
+    return _changed_fraction(previous.thumbnail(width), current.thumbnail(width), tolerance)
+
+
+def dhash(frame, hash_size=16):
+    """
+    Computes a difference hash of the frame.
+
+    :return: A boolean NumPy array of hash_size * hash_size bits.
+    """
+    # Shrink the cached thumbnail rather than the full frame
+    small = Image.fromarray(frame.thumbnail()).resize(
+        (hash_size + 1, hash_size), Image.Resampling.BOX
+    )
+    pixels = np.asarray(small, dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).flatten()
+
+
+def hash_difference(previous, current, hash_size=16):
+    """
+    Measures how much of the screen changed as the normalized Hamming distance of the frames' dHashes.
+    """
+    differing_bits = np.count_nonzero(dhash(previous, hash_size) != dhash(current, hash_size))
+    return float(differing_bits) / (hash_size * hash_size)
+
+
+class ChangeDetector:
+    """
+    Decides whether a freshly captured frame is ready to be sent to the model.
+
+    The detector compares each capture against the last frame whose actions
+    were executed. If the screen has not changed the previous action had no
+    visible effect yet, for example because the UI is still loading, so the
+    loop gives it a little more time and captures again. This delays the
+    model call rather than saving it: once `max_recaptures` frames in a row
+    were unchanged, the model is called on the unchanged screen.
+
+    Attributes:
+        policy (str): What to do with an unchanged frame: "wait" waits for the
+            screen to change and captures again, "recapture" captures again
+            after `recapture_interval` and "proceed" calls the model right away.
+        method (str): "pixels" for a thumbnail pixel diff or "dhash" for a perceptual hash.
+        threshold (float): The difference at or below which a frame counts as unchanged.
+        wait_interval (float): The longest wait for a change with the "wait" policy.
+        recapture_interval (float): The pause before capturing again with the "recapture" policy.
+        max_recaptures (int): Consecutive unchanged frames after which the model is called anyway.
+        last_difference (float): The difference measured by the last call to `decide`.
+    """
+
+    def __init__(
+        self,
+        policy=WAIT,
+        method="pixels",
+        threshold=None,
+        wait_interval=0.5,
+        recapture_interval=0.1,
+        max_recaptures=3,
+    ):
+        if policy not in (PROCEED, WAIT, RECAPTURE):
+            raise ValueError(f"Unknown screen change policy: {policy}")
+        if method not in ("pixels", "dhash"):
+            raise ValueError(f"Unknown screen change method: {method}")
+        self.policy = policy
+        self.method = method
+        if threshold is None:
+            # Small UI changes such as a ticked checkbox only touch a few thumbnail pixels
+            threshold = 0.0001 if method == "pixels" else 0.0
+        self.threshold = threshold
+        self.wait_interval = wait_interval
+        self.recapture_interval = recapture_interval
+        self.max_recaptures = max_recaptures
+        self.last_difference = None
+        self._reference = None
+        self._recaptures = 0
+
+    def difference(self, frame):
+        if self._reference is None:
+            return 1.0
+        if self.method == "dhash":
+            return hash_difference(self._reference, frame)
+        return pixel_difference(self._reference, frame)
+
+    def decide(self, frame):
+        """
+        Compares `frame` with the reference frame.
+
+        :return: PROCEED, WAIT or RECAPTURE.
+        """
+        self.last_difference = self.difference(frame)
+        if config.verbose:
+            print("[ChangeDetector][decide] difference", self.last_difference)
+
+        if (
+            self.policy == PROCEED
+            or self.last_difference > self.threshold
+            or self._recaptures >= self.max_recaptures
+        ):
+            return PROCEED
+
+        self._recaptures += 1
+        return self.policy
+
+    def accept(self, frame):
+        """
+        Makes `frame` the reference for the next step once its actions were executed.
+        """
+        self._reference = frame
+        self._recaptures = 0
+
+
+def wait_until_stable(timeout, interval=0.03, stable_for=0.1, threshold=0.0001):
+    """
+    Waits until the screen stops changing, polling cheap low-resolution captures.
+
+    Replaces fixed sleeps: the call returns as soon as consecutive previews
+    have been identical for `stable_for` seconds, and never waits longer than `timeout`.
+
+    :param timeout: The maximum number of seconds to wait.
+    :param interval: Seconds between previews.
+    :param stable_for: How long the screen must stay unchanged to count as settled.
+    :param threshold: The changed pixel fraction tolerated between previews.
+    :return: The number of seconds waited.
+    """
+    backend = get_capture_backend()
+    start = time.time()
+    deadline = start + timeout
+    previous = backend.preview()
+    stable_since = time.time()
+
+    while time.time() < deadline:
+        time.sleep(min(interval, max(0.0, deadline - time.time())))
+        current = backend.preview()
+        now = time.time()
+        if _changed_fraction(previous, current) > threshold:
+            stable_since = now
+        elif now - stable_since >= stable_for:
+            break
+        previous = current
+
+    waited = time.time() - start
+    if config.verbose:
+        print(f"[wait_until_stable] settled after {waited:.3f}s (timeout {timeout}s)")
+    return waited
+
+
+def wait_for_change(timeout, interval=0.05, threshold=0.0001):
+    """
+    Waits until the screen changes, polling cheap low-resolution captures.
+
+    :param timeout: The maximum number of seconds to wait.
+    :return: True if the screen changed before the timeout.
+    """
+    backend = get_capture_backend()
+    deadline = time.time() + timeout
+    baseline = backend.preview()
+
+    while time.time() < deadline:
+        time.sleep(min(interval, max(0.0, deadline - time.time())))
+        if _changed_fraction(baseline, backend.preview()) > threshold:
+            return True
+    return False
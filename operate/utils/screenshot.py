@@ -1,42 +1,198 @@
 import os
 import platform
 import subprocess
+import tempfile
+import threading
+import numpy as np
 import pyautogui
-from PIL import Image, ImageDraw, ImageGrab
+from PIL import Image, ImageGrab
 import Xlib.display
 import Xlib.X
 import Xlib.Xutil  # not sure if Xutil is necessary
 
+from operate.config import Config
+from operate.utils.frame import Frame
 
-def capture_screen_with_cursor(file_path):
-    user_platform = platform.system()
-
-    if user_platform == "Windows":
-        screenshot = pyautogui.screenshot()
-        screenshot.save(file_path)
-    elif user_platform == "Linux":
-        # Use xlib to prevent scrot dependency for Linux
-        screen = Xlib.display.Display().screen()
-        size = screen.width_in_pixels, screen.height_in_pixels
-        screenshot = ImageGrab.grab(bbox=(0, 0, size[0], size[1]))
-        screenshot.save(file_path)
-    elif user_platform == "Darwin":  # (Mac OS)
-        # Use the screencapture utility to capture the screen with the cursor
-        subprocess.run(["screencapture", "-C", file_path])
-    else:
-        print(f"The platform you're using ({user_platform}) is not currently supported")
-
-
-def compress_screenshot(raw_screenshot_filename, screenshot_filename):
-    with Image.open(raw_screenshot_filename) as img:
-        # Check if the image has an alpha channel (transparency)
-        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-            # Create a white background image
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            # Paste the image onto the background, using the alpha channel as mask
-            background.paste(img, mask=img.split()[3])  # 3 is the alpha channel
-            # Save the result as JPEG
-            background.save(screenshot_filename, 'JPEG', quality=85)  # Adjust quality as needed
+# Load configuration
+config = Config()
+
+
+class CaptureBackend:
+    """
+    Base class for screen capture backends.
+
+    Backends are created once per process and reused for every capture, so
+    they can keep connections and buffers open between frames.
+    """
+
+    name = None
+
+    def grab(self):
+        """
+        Captures the screen and returns it as a PIL image.
+        """
+        raise NotImplementedError
+
+    def preview(self, width=320):
+        """
+        Captures a small grayscale version of the screen for polling.
+
+        :param width: The approximate preview width in pixels.
+        :return: A uint8 NumPy array.
+        """
+        image = self.grab()
+        height = max(1, int(width / (image.width / image.height)))
+        return np.asarray(image.resize((width, height), Image.Resampling.BOX).convert("L"))
+
+    def close(self):
+        pass
+
+
+class DefaultCaptureBackend(CaptureBackend):
+    """
+    Captures with the platform tools: pyautogui on Windows, PIL on Linux and screencapture on macOS.
+    """
+
+    name = "default"
+
+    def grab(self):
+        user_platform = platform.system()
+
+        if user_platform == "Windows":
+            return pyautogui.screenshot()
+        elif user_platform == "Linux":
+            # Use xlib to prevent scrot dependency for Linux
+            screen = Xlib.display.Display().screen()
+            size = screen.width_in_pixels, screen.height_in_pixels
+            return ImageGrab.grab(bbox=(0, 0, size[0], size[1]))
+        elif user_platform == "Darwin":  # (Mac OS)
+            # screencapture can only write to a file, so read it back right away
+            fd, file_path = tempfile.mkstemp(suffix=".png")
+            os.close(fd)
+            try:
+                # Use the screencapture utility to capture the screen with the cursor
+                subprocess.run(["screencapture", "-C", file_path])
+                with Image.open(file_path) as img:
+                    img.load()
+                    return img
+            finally:
+                os.remove(file_path)
         else:
-            # If no alpha channel, simply convert and save
-            img.convert('RGB').save(screenshot_filename, 'JPEG', quality=85)
+            print(f"The platform you're using ({user_platform}) is not currently supported")
+            return None
+
+
+class MssCaptureBackend(CaptureBackend):
+    """
+    Captures through one long-lived `mss` instance instead of reconnecting on every frame.
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss
+
+        self._sct = mss.mss()
+        # Monitor 0 is the union of all monitors, which matches the other backends
+        self._monitor = self._sct.monitors[0]
+        self._lock = threading.Lock()
+
+    def grab(self):
+        with self._lock:
+            shot = self._sct.grab(self._monitor)
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def preview(self, width=320):
+        with self._lock:
+            shot = self._sct.grab(self._monitor)
+        step = max(1, shot.width // width)
+        pixels = np.frombuffer(shot.bgra, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        # Sample the green channel instead of converting every pixel
+        return pixels[::step, ::step, 1].copy()
+
+    def close(self):
+        self._sct.close()
+
+
+class XShmCaptureBackend(CaptureBackend):
+    """
+    Captures the X11 root window through MIT-SHM into a reusable shared buffer.
+    """
+
+    name = "xshm"
+
+    def __init__(self):
+        from operate.utils.xshm import XShmGrabber
+
+        self._grabber = XShmGrabber()
+
+    def grab(self):
+        return self._grabber.grab()
+
+    def preview(self, width=320):
+        return self._grabber.grab_preview(max(1, self._grabber.width // width))
+
+    def close(self):
+        self._grabber.close()
+
+
+CAPTURE_BACKENDS = {
+    backend.name: backend
+    for backend in (XShmCaptureBackend, MssCaptureBackend, DefaultCaptureBackend)
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_capture_backend(name=None):
+    """
+    Returns the shared capture backend, creating it on first use.
+
+    With "auto" Linux tries MIT-SHM first and then mss, falling back to the
+    default backend if neither can be used. Other platforms use the default backend.
+
+    :param name: A key of `CAPTURE_BACKENDS` or "auto". Defaults to `config.capture_backend`.
+    :return: A `CaptureBackend` instance.
+    """
+    name = name or config.capture_backend
+    with _backends_lock:
+        if name in _backends:
+            return _backends[name]
+
+        if name == "auto":
+            if platform.system() == "Linux":
+                candidates = ["xshm", "mss", "default"]
+            else:
+                candidates = ["default"]
+        elif name in CAPTURE_BACKENDS:
+            candidates = [name]
+        else:
+            raise ValueError(f"Unknown capture backend: {name}")
+
+        for candidate in candidates:
+            try:
+                backend = CAPTURE_BACKENDS[candidate]()
+                break
+            except Exception as e:
+                if candidate == candidates[-1]:
+                    raise
+                if config.verbose:
+                    print(f"[get_capture_backend] {candidate} unavailable: {e}")
+
+        if config.verbose:
+            print("[get_capture_backend] using", backend.name)
+        _backends[name] = backend
+        return backend
+
+
+def capture_screen_with_cursor(backend=None):
+    """
+    Captures the screen and returns it as an in-memory `Frame`.
+
+    :param backend: Optional name of the capture backend to use.
+    """
+    screenshot = get_capture_backend(backend).grab()
+    if screenshot is None:
+        return None
+    return Frame(screenshot)
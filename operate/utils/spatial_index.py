@@ -0,0 +1,194 @@
+import math
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from operate.utils.geometry import BoxArray
+
+# An element found by a spatial query: its source ("text" or "detection"), its index in that source and its pixel box
+SpatialElement = namedtuple("SpatialElement", ["kind", "index", "box"])
+
+
+class SpatialIndex:
+    """
+    A uniform grid over the OCR boxes and object detections of one frame.
+
+    Every box is registered in the grid cells it covers, so region, point
+    and neighbour queries only look at the few cells around the query
+    instead of every element on the screen. Coordinates are fractions of
+    the frame width and height, like the ones the models return.
+
+    Attributes:
+        frame_size (tuple): The frame dimensions (width, height) in pixels.
+        cell_size (float): The grid cell size in pixels.
+        boxes (BoxArray): Every indexed box.
+        kinds (numpy.ndarray): The source of every box.
+        source_indices (numpy.ndarray): The index of every box in its source.
+    """
+
+    def __init__(self, frame_size, sources, cell_size=64):
+        self.frame_size = tuple(frame_size)
+        self.cell_size = float(cell_size)
+
+        boxes, kinds, source_indices = [], [], []
+        for kind, source in sources.items():
+            if source is None or len(source) == 0:
+                continue
+            boxes.append(source.xyxy)
+            kinds.extend([kind] * len(source))
+            source_indices.extend(range(len(source)))
+        xyxy = np.vstack(boxes) if boxes else np.empty((0, 4))
+        self.boxes = BoxArray(xyxy, self.frame_size)
+        self.kinds = np.array(kinds, dtype=object)
+        self.source_indices = np.array(source_indices, dtype=np.int64)
+
+        self._cells = defaultdict(list)
+        for element, (x1, y1, x2, y2) in enumerate(self.boxes.xyxy):
+            for column in range(self._cell(x1), self._cell(x2) + 1):
+                for row in range(self._cell(y1), self._cell(y2) + 1):
+                    self._cells[(column, row)].append(element)
+
+    @classmethod
+    def build(cls, frame_size, ocr_result=None, detections=None, cell_size=64):
+        """
+        Indexes the OCR results and detections of a frame.
+
+        :param frame_size: The frame dimensions (width, height) in pixels.
+        :param ocr_result: An optional `OCRResult`.
+        :param detections: An optional `BoxArray` of object detections.
+        """
+        return cls(
+            frame_size,
+            {"text": ocr_result, "detection": detections},
+            cell_size=cell_size,
+        )
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell(self, value):
+        return int(math.floor(value / self.cell_size))
+
+    def _to_pixels(self, x, y):
+        return x * self.frame_size[0], y * self.frame_size[1]
+
+    def _candidates(self, x1, y1, x2, y2):
+        found = set()
+        for column in range(self._cell(x1), self._cell(x2) + 1):
+            for row in range(self._cell(y1), self._cell(y2) + 1):
+                found.update(self._cells.get((column, row), ()))
+        return np.fromiter(found, dtype=np.int64, count=len(found))
+
+    def _elements(self, candidates, kinds):
+        elements = []
+        for element in candidates:
+            kind = self.kinds[element]
+            if kinds is None or kind in kinds:
+                elements.append(
+                    SpatialElement(
+                        kind,
+                        int(self.source_indices[element]),
+                        tuple(self.boxes.xyxy[element]),
+                    )
+                )
+        return elements
+
+    def within(self, x, y, width, height, kinds=None):
+        """
+        Finds the elements whose center lies strictly inside a region.
+
+        :param x: The left edge of the region.
+        :param y: The top edge of the region.
+        :param width: The region width.
+        :param height: The region height.
+        :param kinds: Optional sources to include, e.g. ("text",).
+        :return: A list of `SpatialElement` in reading order.
+        """
+        left, top = self._to_pixels(x, y)
+        right, bottom = self._to_pixels(x + width, y + height)
+        candidates = self._candidates(left, top, right, bottom)
+        centers = self.boxes.centers[candidates]
+        inside = candidates[
+            (centers[:, 0] > left)
+            & (centers[:, 0] < right)
+            & (centers[:, 1] > top)
+            & (centers[:, 1] < bottom)
+        ]
+        # Top to bottom, then left to right
+        order = np.lexsort((self.boxes.xyxy[inside, 0], self.boxes.xyxy[inside, 1]))
+        return self._elements(inside[order], kinds)
+
+    def at_point(self, x, y, kinds=None):
+        """
+        Finds the elements under a point, smallest first.
+
+        :param x: The point as a fraction of the frame width.
+        :param y: The point as a fraction of the frame height.
+        :return: A list of `SpatialElement`.
+        """
+        px, py = self._to_pixels(x, y)
+        candidates = self._candidates(px, py, px, py)
+        boxes = self.boxes.xyxy[candidates]
+        hits = candidates[
+            (boxes[:, 0] <= px) & (boxes[:, 2] >= px) & (boxes[:, 1] <= py) & (boxes[:, 3] >= py)
+        ]
+        areas = (self.boxes.xyxy[hits, 2] - self.boxes.xyxy[hits, 0]) * (
+            self.boxes.xyxy[hits, 3] - self.boxes.xyxy[hits, 1]
+        )
+        return self._elements(hits[np.argsort(areas, kind="stable")], kinds)
+
+    def nearest(self, anchor, direction="right", max_distance=0.25, kinds=None):
+        """
+        Finds the closest element to the right of or below an anchor box.
+
+        An element counts as being to the right if it starts after the anchor
+        ends and shares part of its rows, and below if it starts under the
+        anchor and shares part of its columns. Cells are searched outwards
+        from the anchor, so the search stops at the first band with a match.
+
+        :param anchor: The anchor box as (x1, y1, x2, y2) pixels.
+        :param direction: "right" or "below".
+        :param max_distance: The largest gap considered, as a fraction of the frame width or height.
+        :param kinds: Optional sources to include.
+        :return: A `SpatialElement`, or None.
+        """
+        if direction not in ("right", "below"):
+            raise ValueError(f"Unknown direction: {direction}")
+        x1, y1, x2, y2 = anchor
+        horizontal = direction == "right"
+        start = x2 if horizontal else y2
+        limit = start + max_distance * self.frame_size[0 if horizontal else 1]
+
+        seen = set()
+        best, best_gap = None, None
+        band_start = start
+        while band_start <= limit:
+            band_end = min(limit, (self._cell(band_start) + 1) * self.cell_size)
+            if horizontal:
+                candidates = self._candidates(band_start, y1, band_end, y2)
+            else:
+                candidates = self._candidates(x1, band_start, x2, band_end)
+            for element in candidates:
+                if element in seen:
+                    continue
+                seen.add(element)
+                if kinds is not None and self.kinds[element] not in kinds:
+                    continue
+                bx1, by1, bx2, by2 = self.boxes.xyxy[element]
+                if horizontal:
+                    gap = bx1 - x2
+                    aligned = by1 <= y2 and by2 >= y1
+                else:
+                    gap = by1 - y2
+                    aligned = bx1 <= x2 and bx2 >= x1
+                # Allow a couple of pixels of overlap between touching boxes
+                if aligned and -2 <= gap <= limit - start and (best is None or gap < best_gap):
+                    best, best_gap = element, gap
+            # Anything in a later band starts further away than this match
+            if best is not None and best_gap <= band_end - start:
+                break
+            band_start = band_end + 1e-6
+
+        if best is None:
+            return None
+        return self._elements([best], None)[0]
@@ -0,0 +1,177 @@
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Characters OCR tends to read as one another, folded to one of them
+_CONFUSABLE = (("rn", "m"), ("vv", "w"), ("0", "o"), ("1", "l"), ("i", "l"), ("5", "s"))
+
+# The similarity a text that doesn't contain the query needs, so "Sale" never matches "Save"
+MIN_FUZZY_RATIO = 0.9
+
+
+def normalize_text(text):
+    """
+    Normalizes text for matching: Unicode compatibility form, case folded,
+    punctuation replaced by spaces and whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _fold_confusable(text):
+    for confusable, replacement in _CONFUSABLE:
+        text = text.replace(confusable, replacement)
+    return text
+
+
+def _ngrams(text, n=3):
+    # Pad so that short words and word boundaries still produce n-grams
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+def _box_position(box):
+    # Top edge first, then left edge, the order text is read in
+    return (min(point[1] for point in box), min(point[0] for point in box))
+
+
+class TextMatch:
+    """
+    A ranked candidate for a text lookup.
+
+    Attributes:
+        index (int): The index of the element in the OCR results.
+        text (str): The recognized text of the element.
+        score (float): How well the element matches, between 0 and 1.
+        confidence (float): The OCR confidence of the element.
+    """
+
+    def __init__(self, index, text, score, confidence, position):
+        self.index = index
+        self.text = text
+        self.score = score
+        self.confidence = confidence
+        self.position = position
+
+    def __repr__(self):
+        return f"TextMatch(index={self.index}, text={self.text!r}, score={self.score:.3f})"
+
+
+class TextIndex:
+    """
+    An index over the text of one set of OCR results.
+
+    Built once per frame, the index answers lookups without scanning every
+    box. Queries and OCR text are normalized, so case, punctuation and
+    spacing differences still match, and candidates found through shared
+    character trigrams are ranked with a fuzzy similarity score. A text
+    that doesn't contain the query only matches when it is the query with
+    characters OCR confuses, like "Submlt", or nearly identical to it. Ties are
+    broken by OCR confidence and then by position, preferring the element
+    furthest down the screen like the original linear scan did.
+
+    Attributes:
+        texts (list): The normalized text of every element.
+    """
+
+    def __init__(self, result, ngram_size=3):
+        self.ngram_size = ngram_size
+        self.texts = []
+        self._raw_texts = []
+        self._confidences = []
+        self._positions = []
+        self._exact = defaultdict(list)
+        self._ngrams = defaultdict(set)
+
+        for index, (box, text, confidence) in enumerate(result):
+            normalized = normalize_text(text)
+            self.texts.append(normalized)
+            self._raw_texts.append(text)
+            self._confidences.append(float(confidence))
+            self._positions.append(_box_position(box))
+            self._exact[normalized].append(index)
+            for gram in _ngrams(normalized, ngram_size):
+                self._ngrams[gram].add(index)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _score(self, query, index):
+        text = self.texts[index]
+        if not text:
+            return 0.0
+        if text == query:
+            return 1.0
+        if query in text:
+            # The original substring match, weighted by how much of the element it covers
+            return 0.9 + 0.09 * len(query) / len(text)
+        # Below any substring match, so misreads only win when nothing contains the query.
+        # Other words often differ by a single letter too, only near-identical texts are misreads.
+        query, text = _fold_confusable(query), _fold_confusable(text)
+        if query == text:
+            return 0.85
+        ratio = SequenceMatcher(None, query, text, autojunk=False).ratio()
+        return 0.85 * ratio if ratio >= MIN_FUZZY_RATIO else 0.0
+
+    def _candidates(self, query, max_candidates):
+        counts = defaultdict(int)
+        for gram in _ngrams(query, self.ngram_size):
+            for index in self._ngrams.get(gram, ()):
+                counts[index] += 1
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        return ranked[:max_candidates]
+
+    def _match(self, index, score):
+        return TextMatch(
+            index,
+            self._raw_texts[index],
+            score,
+            self._confidences[index],
+            self._positions[index],
+        )
+
+    def search(self, search_text, limit=5, min_score=0.6, max_candidates=50):
+        """
+        Finds the elements that best match `search_text`.
+
+        :param search_text: The text to look for.
+        :param limit: The maximum number of matches returned.
+        :param min_score: The lowest score accepted as a match.
+        :param max_candidates: How many trigram candidates are scored.
+        :return: A list of `TextMatch`, best first.
+        """
+        query = normalize_text(search_text)
+        if not query:
+            return []
+
+        if query in self._exact:
+            scored = [(index, 1.0) for index in self._exact[query]]
+        else:
+            scored = [
+                (index, self._score(query, index))
+                for index in self._candidates(query, max_candidates)
+            ]
+
+        matches = [self._match(index, score) for index, score in scored if score >= min_score]
+        matches.sort(
+            key=lambda match: (
+                round(match.score, 6),
+                match.confidence,
+                match.position,
+            ),
+            reverse=True,
+        )
+        return matches[:limit]
+
+    def best(self, search_text, min_score=0.6):
+        """
+        Returns the best `TextMatch` for `search_text`, or None.
+        """
+        matches = self.search(search_text, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
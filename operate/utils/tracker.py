@@ -0,0 +1,259 @@
+import threading
+
+import numpy as np
+
+from operate.config import Config
+from operate.utils.geometry import BoxArray
+
+# Load configuration
+config = Config()
+
+
+def _iou_matrix(a, b):
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def changed_regions(previous, current, tile=32, tolerance=8, margin=16, downscale=4):
+    """
+    Finds the rectangles of the screen that changed between two frames.
+
+    The frames are compared on thumbnails a quarter of their width, any
+    change inside a tile marks the tile, and neighbouring changed tiles are
+    merged into one rectangle.
+
+    :param previous: The earlier `Frame`.
+    :param current: The later `Frame`, of the same size.
+    :param tile: The tile size in pixels.
+    :param tolerance: Per-pixel gray level change ignored as noise.
+    :param margin: Pixels added around every rectangle.
+    :param downscale: How much smaller than the frame the compared thumbnails are.
+    :return: A list of (x1, y1, x2, y2) pixel rectangles.
+    """
+    width, height = current.size
+    before = previous.thumbnail(max(1, width // downscale)).astype(np.int16)
+    after = current.thumbnail(max(1, width // downscale)).astype(np.int16)
+    different = np.abs(before - after) > tolerance
+
+    # Pad to whole tiles and mark every tile containing a changed pixel
+    step = max(1, tile // downscale)
+    rows, columns = -(-different.shape[0] // step), -(-different.shape[1] // step)
+    padded = np.zeros((rows * step, columns * step), dtype=bool)
+    padded[: different.shape[0], : different.shape[1]] = different
+    changed = padded.reshape(rows, step, columns, step).any(axis=(1, 3))
+    scale_x = width / different.shape[1] * step
+    scale_y = height / different.shape[0] * step
+
+    regions = []
+    seen = np.zeros_like(changed)
+    for row, column in zip(*np.nonzero(changed)):
+        if seen[row, column]:
+            continue
+        # Flood fill the changed tiles connected to this one
+        stack = [(row, column)]
+        seen[row, column] = True
+        top, bottom, left, right = row, row, column, column
+        while stack:
+            r, c = stack.pop()
+            top, bottom = min(top, r), max(bottom, r)
+            left, right = min(left, c), max(right, c)
+            for nr in range(r - 1, r + 2):
+                for nc in range(c - 1, c + 2):
+                    if (
+                        0 <= nr < changed.shape[0]
+                        and 0 <= nc < changed.shape[1]
+                        and changed[nr, nc]
+                        and not seen[nr, nc]
+                    ):
+                        seen[nr, nc] = True
+                        stack.append((nr, nc))
+        regions.append(
+            (
+                max(0, int(left * scale_x) - margin),
+                max(0, int(top * scale_y) - margin),
+                min(width, int((right + 1) * scale_x) + margin),
+                min(height, int((bottom + 1) * scale_y) + margin),
+            )
+        )
+    return regions
+
+
+def _merge_regions(regions):
+    # Merge overlapping rectangles so no area is detected twice
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                a, b = merged[i], merged[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+class ElementTracker:
+    """
+    Keeps detected elements and their label IDs stable across frames.
+
+    Instead of detecting every element on every step, the tracker compares
+    the new frame with the previous one, carries forward the boxes outside
+    the changed areas with their IDs and only runs the detector on the
+    changed areas. Redetected boxes that overlap a previous box keep its ID.
+
+    Attributes:
+        full_detections (int): Frames that were detected from scratch.
+        partial_detections (int): Frames where only changed regions were detected.
+        reused_frames (int): Frames that needed no detection at all.
+        carried_boxes (int): Boxes carried forward without detection.
+    """
+
+    def __init__(self, max_changed_fraction=0.5, min_region=320, match_iou=0.5):
+        self.max_changed_fraction = max_changed_fraction
+        self.min_region = min_region
+        self.match_iou = match_iou
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the previous frame and the IDs handed out so far.
+        """
+        with self._lock:
+            self._frame = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._boxes = np.empty((0, 4))
+            self._next_id = 0
+            self.full_detections = 0
+            self.partial_detections = 0
+            self.reused_frames = 0
+            self.carried_boxes = 0
+
+    def _new_ids(self, count):
+        ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        self._next_id += count
+        return ids
+
+    def _expand(self, region, size):
+        # Give the detector some context around small changes
+        x1, y1, x2, y2 = region
+        width, height = size
+        grow_x = max(0, self.min_region - (x2 - x1)) / 2
+        grow_y = max(0, self.min_region - (y2 - y1)) / 2
+        return (
+            int(max(0, x1 - grow_x)),
+            int(max(0, y1 - grow_y)),
+            int(min(width, x2 + grow_x)),
+            int(min(height, y2 + grow_y)),
+        )
+
+    def _detect_regions(self, frame, detector, regions):
+        boxes = []
+        for x1, y1, x2, y2 in regions:
+            detections = detector.detect(frame.image.crop((x1, y1, x2, y2)))
+            if len(detections):
+                boxes.append(detections.xyxy + np.array([x1, y1, x1, y1]))
+        return np.vstack(boxes) if boxes else np.empty((0, 4))
+
+    def update(self, frame, detector):
+        """
+        Detects the elements of `frame`, reusing what is known from the previous frame.
+
+        :param frame: The new `Frame`.
+        :param detector: The `Detector` used for the regions that changed.
+        :return: The element IDs as an int array and the boxes as a `BoxArray`, carried boxes first.
+        """
+        with self._lock:
+            previous = self._frame
+            self._frame = frame
+
+            if previous is None or previous.size != frame.size:
+                self.full_detections += 1
+                self._boxes = detector.detect(frame.image).xyxy
+                self._ids = self._new_ids(len(self._boxes))
+                return self._ids, BoxArray(self._boxes, frame.size)
+
+            regions = changed_regions(previous, frame)
+            if not regions:
+                self.reused_frames += 1
+                self.carried_boxes += len(self._boxes)
+                return self._ids, BoxArray(self._boxes, frame.size)
+
+            # Re-detect every old box touching a changed region as a whole
+            previous_boxes = BoxArray(self._boxes, frame.size)
+            stale = np.zeros(len(self._boxes), dtype=bool)
+            grown = []
+            for region in regions:
+                region = self._expand(region, frame.size)
+                overlaps = previous_boxes.overlapping(region)
+                stale |= overlaps
+                touched = self._boxes[overlaps]
+                if len(touched):
+                    region = (
+                        int(min(region[0], touched[:, 0].min())),
+                        int(min(region[1], touched[:, 1].min())),
+                        int(max(region[2], touched[:, 2].max())),
+                        int(max(region[3], touched[:, 3].max())),
+                    )
+                grown.append(region)
+            regions = _merge_regions(grown)
+            for region in regions:
+                stale |= previous_boxes.overlapping(region)
+
+            changed_area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+            if changed_area > self.max_changed_fraction * frame.width * frame.height:
+                # Most of the screen changed, one full pass is cheaper than many crops
+                self.full_detections += 1
+                boxes = detector.detect(frame.image).xyxy
+                old_ids, old_boxes = self._ids, self._boxes
+                kept_ids, kept_boxes = np.empty(0, dtype=np.int64), np.empty((0, 4))
+            else:
+                self.partial_detections += 1
+                boxes = self._detect_regions(frame, detector, regions)
+                old_ids, old_boxes = self._ids[stale], self._boxes[stale]
+                kept_ids, kept_boxes = self._ids[~stale], self._boxes[~stale]
+                self.carried_boxes += len(kept_boxes)
+
+            # Boxes that were only re-rendered keep the ID of the box they replace
+            ids = self._new_ids(0)
+            if len(boxes):
+                ids = np.full(len(boxes), -1, dtype=np.int64)
+                if len(old_boxes):
+                    ious = _iou_matrix(boxes, old_boxes)
+                    for index in np.argsort(-ious.max(axis=1)):
+                        best = int(ious[index].argmax())
+                        if ious[index, best] >= self.match_iou:
+                            ids[index] = old_ids[best]
+                            ious[:, best] = 0
+                unmatched = ids < 0
+                ids[unmatched] = self._new_ids(int(unmatched.sum()))
+
+            self._ids = np.concatenate([kept_ids, ids])
+            self._boxes = np.vstack([kept_boxes, boxes]) if len(boxes) else kept_boxes
+            if config.verbose:
+                print(
+                    f"[ElementTracker] {len(regions)} changed regions, "
+                    f"{len(kept_boxes)} boxes carried, {len(boxes)} detected"
+                )
+            return self._ids, BoxArray(self._boxes, frame.size)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "full_detections": self.full_detections,
+                "partial_detections": self.partial_detections,
+                "reused_frames": self.reused_frames,
+                "carried_boxes": self.carried_boxes,
+            }
+
@@ -0,0 +1,245 @@
+"""
+Record-and-replay of operation trajectories.
+
+A recording is a directory with a `trajectory.json` and one small grayscale
+thumbnail per step. Each step stores the frame hash, the OCR result, the
+request and reply of the model and the operations that were executed.
+Replaying executes the recorded operations again while the live screen
+still looks like the recording and asks the model only where it diverges.
+"""
+import copy
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from operate.config import Config
+from operate.utils.ocr import ocr_cache
+
+# Load configuration
+config = Config()
+
+TRAJECTORY_FILE = "trajectory.json"
+THUMBNAIL_WIDTH = 320
+
+
+def thumbnail_difference(a, b, tolerance=8):
+    """
+    Returns the fraction of pixels that differ between two grayscale thumbnails.
+    """
+    if a.shape != b.shape:
+        return 1.0
+    return float((np.abs(a.astype(np.int16) - b.astype(np.int16)) > tolerance).mean())
+
+
+def _text_parts(message):
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    texts = [
+        part["text"] if part.get("type") == "text" else f"<{part.get('type')}>"
+        for part in content or ()
+        if isinstance(part, dict)
+    ]
+    return "\n".join(texts)
+
+
+def _last_exchange(messages):
+    """
+    Returns the last user prompt, without images, and the reply that followed it.
+    """
+    prompt, reply = None, None
+    for message in reversed(messages):
+        if message.get("role") == "assistant" and reply is None and prompt is None:
+            reply = message.get("content")
+        elif message.get("role") == "user":
+            prompt = _text_parts(message)
+            break
+    return prompt, reply
+
+
+class TrajectoryRecorder:
+    """
+    Writes the steps of a run to a recording directory.
+
+    `watch` wraps the operations of a step so only the operations that were
+    handed to the executor are kept. `record_step` commits the step once
+    it succeeded, and the trajectory file is rewritten after every step so a
+    crashed run still leaves a usable recording.
+    """
+
+    def __init__(self, path, objective, model, system_prompt=None):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.trajectory = {
+            "version": 1,
+            "objective": objective,
+            "model": model,
+            "system_prompt": system_prompt,
+            "created": time.time(),
+            "steps": [],
+        }
+        self._executed = []
+
+    def watch(self, operations):
+        """
+        Yields `operations` and remembers each one as it is handed out.
+        """
+        self._executed = []
+        for operation in operations:
+            self._executed.append(copy.deepcopy(operation))
+            yield operation
+
+    def record_step(self, frame, messages, reader=None, replayed_step=None, metrics=None):
+        """
+        Adds a completed step.
+
+        :param reader: The OCR reader of the step, to store its cached result.
+        :param replayed_step: The index of the recorded step that was replayed, None for a model call.
+        """
+        index = len(self.trajectory["steps"])
+        thumbnail = f"step-{index:03d}.png"
+        Image.fromarray(frame.thumbnail(THUMBNAIL_WIDTH)).save(os.path.join(self.path, thumbnail))
+
+        ocr = None
+        if reader is not None:
+            result = ocr_cache.peek((frame.content_hash, id(reader)))
+            if result is not None:
+                ocr = [
+                    {"box": box.tolist(), "text": text, "confidence": float(confidence)}
+                    for box, text, confidence in zip(result.xyxy, result.texts, result.confidences)
+                ]
+
+        prompt, reply = _last_exchange(messages)
+        self.trajectory["steps"].append(
+            {
+                "frame_hash": frame.content_hash,
+                "frame_size": list(frame.size),
+                "thumbnail": thumbnail,
+                "ocr": ocr,
+                "request": {"messages": len(messages), "prompt": prompt},
+                "response": reply,
+                "operations": self._executed,
+                "replayed_step": replayed_step,
+                "metrics": metrics or {},
+            }
+        )
+        self._executed = []
+        self.save()
+
+    def save(self):
+        file_path = os.path.join(self.path, TRAJECTORY_FILE)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.trajectory, file, indent=2, default=str)
+        os.replace(temp_path, file_path)
+
+
+class ReplayStep:
+    """
+    A recorded step whose screen matches the live frame.
+
+    Attributes:
+        index (int): The step's position in the recording.
+        operations (list): The operations executed when it was recorded.
+        response (str): The model reply it was recorded with.
+        difference (float): How much the live frame differs from the recorded one.
+    """
+
+    def __init__(self, index, operations, response, difference):
+        self.index = index
+        self.operations = operations
+        self.response = response
+        self.difference = difference
+
+
+class TrajectoryReplayer:
+    """
+    Replays a recording against the live screen.
+
+    `match` compares each live frame with the next recorded steps. If one of
+    them differs by at most `threshold`, its operations are executed again
+    and the model is not called. Otherwise the step goes to the model, and
+    later frames can still realign with the recording, e.g. after the model
+    dismissed an unexpected dialog.
+
+    Attributes:
+        threshold (float): The largest fraction of changed thumbnail pixels that still counts as the same screen.
+        lookahead (int): How many recorded steps ahead of the current one a frame may match.
+        replayed (int): Steps replayed from the recording.
+        diverged (int): Steps that had to call the model before the recording ran out.
+        last_difference (float): The smallest difference measured by the last `match`.
+    """
+
+    def __init__(self, path, threshold=0.02, lookahead=2):
+        self.path = path
+        with open(os.path.join(path, TRAJECTORY_FILE)) as file:
+            self.trajectory = json.load(file)
+        self.steps = self.trajectory["steps"]
+        self.threshold = threshold
+        self.lookahead = lookahead
+        self.replayed = 0
+        self.diverged = 0
+        self.last_difference = None
+        self._cursor = 0
+        self._thumbnails = {}
+
+    @property
+    def objective(self):
+        return self.trajectory.get("objective")
+
+    def _thumbnail(self, index):
+        if index not in self._thumbnails:
+            file_path = os.path.join(self.path, self.steps[index]["thumbnail"])
+            self._thumbnails[index] = np.asarray(Image.open(file_path).convert("L"))
+        return self._thumbnails[index]
+
+    def match(self, frame):
+        """
+        Finds the recorded step that matches `frame`.
+
+        :return: A `ReplayStep`, or None if the screen diverged from the recording.
+        """
+        live = frame.thumbnail(THUMBNAIL_WIDTH)
+        self.last_difference = None
+        end = min(len(self.steps), self._cursor + self.lookahead + 1)
+        for index in range(self._cursor, end):
+            step = self.steps[index]
+            if not step["operations"]:
+                continue
+            difference = thumbnail_difference(self._thumbnail(index), live)
+            if self.last_difference is None or difference < self.last_difference:
+                self.last_difference = difference
+            if config.verbose:
+                print(f"[TrajectoryReplayer][match] step {index} difference {difference:.4f}")
+            if difference <= self.threshold:
+                self._cursor = index + 1
+                self.replayed += 1
+                return ReplayStep(
+                    index, copy.deepcopy(step["operations"]), step["response"], difference
+                )
+        if end > self._cursor:
+            self.diverged += 1
+        return None
+
+    def replay(self, step, messages):
+        """
+        Adds the replayed step to `messages` so the model knows about it if a later step needs it.
+
+        :return: The operations to execute.
+        """
+        messages.append(
+            {"role": "user", "content": "[This step was replayed from a recording, the screenshot is omitted.]"}
+        )
+        messages.append({"role": "assistant", "content": step.response or json.dumps(step.operations)})
+        return step.operations
+
+    def stats(self):
+        return {
+            "steps": len(self.steps),
+            "replayed": self.replayed,
+            "diverged": self.diverged,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,294 @@
+"""
+Minimal ctypes binding for grabbing the X11 root window through MIT-SHM.
+
+The X server copies the screen straight into a shared memory segment that is
+allocated once and reused for every grab, so there is no per-frame socket
+transfer and no per-frame display connection.
+"""
+import ctypes
+import ctypes.util
+import threading
+
+import numpy as np
+from PIL import Image
+
+Z_PIXMAP = 2
+ALL_PLANES = ctypes.c_ulong(~0).value
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+
+class XShmError(Exception):
+    """Exception raised when the MIT-SHM extension cannot be used."""
+
+    def __init__(self, message="MIT-SHM capture is not available"):
+        self.message = message
+        super().__init__(self.message)
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class XImage(ctypes.Structure):
+    # Only the leading fields are declared, the image is always allocated by Xlib
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+_ERROR_HANDLER = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent)
+)
+_x_errors = []
+
+
+@_ERROR_HANDLER
+def _record_x_error(display, event):
+    # The default Xlib handler exits the process, so record the error instead
+    _x_errors.append(event.contents.error_code)
+    return 0
+
+
+_libraries = {}
+_libraries_lock = threading.Lock()
+
+
+def _load_libraries():
+    with _libraries_lock:
+        if _libraries:
+            return _libraries
+        names = {"x11": "X11", "xext": "Xext", "c": "c"}
+        for key, name in names.items():
+            path = ctypes.util.find_library(name)
+            if path is None:
+                raise XShmError(f"Could not find lib{name}")
+            _libraries[key] = ctypes.CDLL(path, use_errno=True)
+
+        x11, xext, libc = _libraries["x11"], _libraries["xext"], _libraries["c"]
+
+        x11.XInitThreads.restype = ctypes.c_int
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XRootWindow.restype = ctypes.c_ulong
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(XImage)]
+        x11.XSetErrorHandler.argtypes = [_ERROR_HANDLER]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_uint,
+            ctypes.c_int,
+            ctypes.c_void_p,
+            ctypes.POINTER(XShmSegmentInfo),
+            ctypes.c_uint,
+            ctypes.c_uint,
+        ]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.POINTER(XImage),
+            ctypes.c_int,
+            ctypes.c_int,
+            ctypes.c_ulong,
+        ]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+        x11.XInitThreads()
+        x11.XSetErrorHandler(_record_x_error)
+        return _libraries
+
+
+class XShmGrabber:
+    """
+    Keeps one X connection and one shared memory segment open for repeated grabs.
+
+    Attributes:
+        width (int): The root window width in pixels.
+        height (int): The root window height in pixels.
+    """
+
+    def __init__(self, display_name=None):
+        libraries = _load_libraries()
+        self._x11 = libraries["x11"]
+        self._xext = libraries["xext"]
+        self._libc = libraries["c"]
+        self._display = None
+        self._image = None
+        self._shminfo = XShmSegmentInfo()
+        self._shminfo.shmid = -1
+        self._attached = False
+        self._lock = threading.Lock()
+
+        try:
+            self._open(display_name)
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self, display_name):
+        name = display_name.encode("utf-8") if display_name else None
+        self._display = self._x11.XOpenDisplay(name)
+        if not self._display:
+            raise XShmError("Could not open the X display")
+        if not self._xext.XShmQueryExtension(self._display):
+            raise XShmError("The X server does not support MIT-SHM")
+
+        screen = self._x11.XDefaultScreen(self._display)
+        self._root = self._x11.XRootWindow(self._display, screen)
+        self.width = self._x11.XDisplayWidth(self._display, screen)
+        self.height = self._x11.XDisplayHeight(self._display, screen)
+
+        self._image = self._xext.XShmCreateImage(
+            self._display,
+            self._x11.XDefaultVisual(self._display, screen),
+            self._x11.XDefaultDepth(self._display, screen),
+            Z_PIXMAP,
+            None,
+            ctypes.byref(self._shminfo),
+            self.width,
+            self.height,
+        )
+        if not self._image:
+            raise XShmError("XShmCreateImage failed")
+        if self._image.contents.bits_per_pixel != 32:
+            raise XShmError(
+                f"Unsupported pixel depth: {self._image.contents.bits_per_pixel} bits"
+            )
+
+        self.bytes_per_line = self._image.contents.bytes_per_line
+        size = self.bytes_per_line * self.height
+        self._shminfo.shmid = self._libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if self._shminfo.shmid < 0:
+            raise XShmError(f"shmget failed (errno {ctypes.get_errno()})")
+        address = self._libc.shmat(self._shminfo.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            raise XShmError(f"shmat failed (errno {ctypes.get_errno()})")
+        self._shminfo.shmaddr = address
+        self._shminfo.readOnly = 0
+        self._image.contents.data = address
+
+        del _x_errors[:]
+        self._xext.XShmAttach(self._display, ctypes.byref(self._shminfo))
+        self._x11.XSync(self._display, 0)
+        # Remote displays cannot attach to local shared memory
+        if _x_errors:
+            raise XShmError(f"XShmAttach failed with X error {_x_errors[-1]}")
+        self._attached = True
+        self._remove_segment()
+
+        self._buffer = (ctypes.c_ubyte * size).from_address(address)
+        self._pixels = np.ctypeslib.as_array(self._buffer).reshape(
+            self.height, self.bytes_per_line
+        )
+
+    def _remove_segment(self):
+        # The segment is freed automatically once both sides detach
+        if self._shminfo.shmid >= 0:
+            self._libc.shmctl(self._shminfo.shmid, IPC_RMID, None)
+            self._shminfo.shmid = -1
+
+    def _get_image(self):
+        if not self._xext.XShmGetImage(
+            self._display, self._root, self._image, 0, 0, ALL_PLANES
+        ):
+            raise XShmError("XShmGetImage failed")
+
+    def grab(self):
+        """
+        Grabs the screen into the shared buffer and copies it out as an RGB image.
+
+        :return: A PIL image that owns its pixels.
+        """
+        with self._lock:
+            self._get_image()
+            return Image.frombuffer(
+                "RGB",
+                (self.width, self.height),
+                self._buffer,
+                "raw",
+                "BGRX",
+                self.bytes_per_line,
+                1,
+            )
+
+    def grab_preview(self, step):
+        """
+        Grabs the screen and samples every `step`-th pixel of the green channel.
+
+        This skips the full color conversion, so it is cheap enough to poll.
+
+        :return: A small uint8 NumPy array that owns its data.
+        """
+        with self._lock:
+            self._get_image()
+            return self._pixels[::step, 1 : self.width * 4 : 4 * step].copy()
+
+    def close(self):
+        with self._lock:
+            if self._attached:
+                self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+                self._attached = False
+            if self._image:
+                # The data belongs to the shared segment, not to Xlib
+                self._image.contents.data = None
+                self._x11.XDestroyImage(self._image)
+                self._image = None
+            self._remove_segment()
+            if self._shminfo.shmaddr:
+                self._libc.shmdt(self._shminfo.shmaddr)
+                self._shminfo.shmaddr = None
+            if self._display:
+                self._x11.XCloseDisplay(self._display)
+                self._display = None
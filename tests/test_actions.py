@@ -0,0 +1,60 @@
+import unittest
+
+from operate.exceptions import ModelResponseError
+from operate.models.actions import validate_operations
+
+
+class TestValidateOperations(unittest.TestCase):
+    def test_accepts_list_wrapper_and_single_operation(self):
+        operation = {"operation": "done", "summary": "ok"}
+        for value in ([operation], {"operations": [operation]}, operation):
+            with self.subTest(value=value):
+                self.assertEqual(validate_operations(value), [operation])
+
+    def test_normalizes_operations(self):
+        operations = validate_operations(
+            [
+                {"operation": "PRESS", "keys": "enter", "thought": None},
+                {"operation": "scroll", "direction": "Down"},
+                {"operation": "write", "content": 42},
+            ]
+        )
+        self.assertEqual(
+            operations,
+            [
+                {"operation": "press", "keys": ["enter"]},
+                {"operation": "scroll", "direction": "down"},
+                {"operation": "write", "content": "42"},
+            ],
+        )
+
+    def test_click_needs_a_target(self):
+        for operation in (
+            {"operation": "click", "text": "OK"},
+            {"operation": "click", "label": "~3"},
+            {"operation": "click", "x": "0.5", "y": "0.25"},
+        ):
+            with self.subTest(operation=operation):
+                self.assertEqual(validate_operations([operation]), [operation])
+        with self.assertRaises(ModelResponseError):
+            validate_operations([{"operation": "click", "x": "left"}])
+
+    def test_rejects_invalid_replies(self):
+        for value in (
+            [],
+            "click OK",
+            {"operations": []},
+            [{"operation": "jump"}],
+            [{"text": "OK"}],
+            [{"operation": "write"}],
+            [{"operation": "press", "keys": [1, 2]}],
+            [{"operation": "scroll", "direction": "sideways"}],
+            ["done"],
+        ):
+            with self.subTest(value=value):
+                with self.assertRaises(ModelResponseError):
+                    validate_operations(value)
+
+
+if __name__ == "__main__":
+    unittest.main()
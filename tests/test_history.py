@@ -0,0 +1,136 @@
+import json
+import unittest
+
+from operate.models.history import MessageHistory, has_image, payload_bytes
+from operate.models.providers.anthropic_provider import AnthropicProvider, to_openai_messages
+from operate.utils.ocr import ocr_cache
+
+
+def _screenshot(step, data="A" * 1000):
+    return {
+        "role": "user",
+        "content": [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": data}},
+            {"type": "text", "text": f"Step {step}"},
+        ],
+    }
+
+
+def _reply(text):
+    return {"role": "assistant", "content": json.dumps([{"operation": "click", "text": text}])}
+
+
+def _conversation(steps):
+    messages = [{"role": "system", "content": "You operate a computer."}]
+    for step in range(steps):
+        messages.append(_screenshot(step))
+        messages.append(_reply(f"Button {step}"))
+    return messages
+
+
+class _Frame:
+    def __init__(self, content_hash):
+        self.content_hash = content_hash
+
+
+class TestMessageHistory(unittest.TestCase):
+    def test_keeps_the_latest_screenshots(self):
+        messages = _conversation(5)
+        history = MessageHistory(max_images=3)
+        self.assertEqual(history.compact(messages), 3)
+        self.assertEqual([has_image(message) for message in messages[1::2]], [False, False, False, True, True])
+        self.assertEqual(history.compacted, 3)
+        # The current screenshot is added after compaction, so the request carries 3
+        messages.append(_screenshot(5))
+        self.assertEqual(history.track(messages)["history_images"], 3)
+
+    def test_compacted_message_describes_the_actions_taken(self):
+        messages = _conversation(2)
+        MessageHistory(max_images=1).compact(messages)
+        self.assertIsInstance(messages[1]["content"], str)
+        self.assertIn('click "Button 0"', messages[1]["content"])
+        self.assertIn('click "Button 1"', messages[3]["content"])
+
+    def test_compacted_message_carries_the_frame_text(self):
+        reader = object()
+        messages = _conversation(1)
+        history = MessageHistory(max_images=1)
+        history.track(messages, _Frame("history-test"), reader)
+        ocr_cache.put(("history-test", id(reader)), [(None, "Sign in", 0.9), (None, "noise", 0.1)])
+        history.compact(messages)
+        self.assertIn("Text on that screen: Sign in", messages[1]["content"])
+        self.assertNotIn("noise", messages[1]["content"])
+
+    def test_compacts_again_only_new_screenshots(self):
+        messages = _conversation(3)
+        history = MessageHistory(max_images=2)
+        history.compact(messages)
+        compacted = messages[:4]
+        messages.append(_screenshot(3))
+        messages.append(_reply("Button 3"))
+        history.compact(messages)
+        # Earlier compacted messages are left as they are, so the prefix stays the same
+        self.assertEqual(messages[:4], compacted)
+        self.assertEqual(history.compacted, 3)
+
+    def test_byte_budget_compacts_recent_screenshots(self):
+        messages = _conversation(3)
+        history = MessageHistory(max_images=10, max_bytes=1500)
+        self.assertEqual(history.compact(messages), 2)
+        self.assertLessEqual(payload_bytes(messages), 1500)
+        self.assertTrue(has_image(messages[5]))
+
+    def test_ollama_images_are_dropped(self):
+        messages = [
+            {"role": "system", "content": "You operate a computer."},
+            {"role": "user", "content": "Step 0", "images": ["A" * 100]},
+            _reply("OK"),
+        ]
+        MessageHistory(max_images=1).compact(messages)
+        self.assertIsNone(messages[1]["images"])
+        self.assertFalse(has_image(messages[1]))
+
+
+class TestClaudeConversation(unittest.TestCase):
+    def test_fallback_keeps_compacted_messages(self):
+        messages = _conversation(4)
+        MessageHistory(max_images=2).compact(messages)
+        converted = to_openai_messages(messages)
+        self.assertEqual(len(converted), len(messages))
+        self.assertEqual(converted[1]["content"], messages[1]["content"])
+        self.assertTrue(converted[1]["content"].startswith("[An earlier screenshot"))
+        self.assertEqual(converted[7]["content"][0]["type"], "image_url")
+        self.assertEqual(converted[7]["content"][0]["image_url"]["url"], "data:image/jpeg;base64," + "A" * 1000)
+        self.assertEqual(converted[7]["content"][1], {"type": "text", "text": "Step 3"})
+
+    def test_cache_breakpoint_stays_on_an_unchanged_prefix(self):
+        provider = AnthropicProvider()
+        history = MessageHistory(max_images=3)
+        messages = _conversation(0)
+        previous = None
+        for step in range(6):
+            history.compact(messages)
+            messages.append(_screenshot(step))
+            system, request = provider.cached_request(messages)
+            self.assertIn("cache_control", system[0])
+            marked = [
+                index
+                for index, message in enumerate(request)
+                if isinstance(message["content"], list)
+                and any("cache_control" in part for part in message["content"])
+            ]
+            self.assertLessEqual(len(marked), 1)
+            if marked:
+                index = marked[0]
+                self.assertFalse(any(has_image(message) for message in request[: index + 1]))
+                if previous is not None:
+                    # The previous breakpoint's prefix is sent unchanged
+                    self.assertEqual(messages[1 : previous + 2], snapshot)
+                previous = index
+                snapshot = [dict(message) for message in messages[1 : index + 2]]
+            messages.append(_reply(f"Button {step}"))
+        self.assertIsNotNone(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from operate.utils.json_stream import JSONArrayStream
+
+
+def _feed(parser, text, size):
+    objects = []
+    for start in range(0, len(text), size):
+        objects.extend(parser.feed(text[start : start + size]))
+    return objects
+
+
+class TestJSONArrayStream(unittest.TestCase):
+    def test_emits_each_object_once_it_is_complete(self):
+        parser = JSONArrayStream()
+        self.assertEqual(parser.feed('[{"operation": "click", "text": "OK"}, {"oper'), [
+            {"operation": "click", "text": "OK"}
+        ])
+        self.assertEqual(parser.feed('ation": "done"}]'), [{"operation": "done"}])
+
+    def test_chunk_boundaries_do_not_matter(self):
+        text = '[{"operation": "write", "content": "a \\"quoted\\" } ]"}, {"operation": "press", "keys": ["enter"]}]'
+        for size in (1, 2, 7, len(text)):
+            with self.subTest(size=size):
+                self.assertEqual(_feed(JSONArrayStream(), text, size), [
+                    {"operation": "write", "content": 'a "quoted" } ]'},
+                    {"operation": "press", "keys": ["enter"]},
+                ])
+
+    def test_accepts_fence_wrapper_and_single_object(self):
+        for text, expected in [
+            ('```json\n[{"operation": "done"}]\n```', [{"operation": "done"}]),
+            ('{"operations": [{"operation": "done"}, {"operation": "click", "label": "~1"}]}', [
+                {"operation": "done"},
+                {"operation": "click", "label": "~1"},
+            ]),
+            ('{"operation": "done", "summary": "ok"}', [{"operation": "done", "summary": "ok"}]),
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(_feed(JSONArrayStream(), text, 3), expected)
+
+    def test_nested_objects_are_not_emitted_on_their_own(self):
+        text = '[{"operation": "solve_quiz", "extra": {"a": {"b": 1}}}]'
+        self.assertEqual(_feed(JSONArrayStream(), text, 4), [
+            {"operation": "solve_quiz", "extra": {"a": {"b": 1}}}
+        ])
+
+    def test_prose_disables_the_parser(self):
+        parser = JSONArrayStream()
+        self.assertEqual(parser.feed('Sure! [{"operation": "done"}]'), [])
+        self.assertTrue(parser.disabled)
+        self.assertEqual(parser.text, 'Sure! [{"operation": "done"}]')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from operate.exceptions import RateLimitExceeded
+from operate.models.rate_limit import RateLimiter, RateLimiters
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_no_limits_never_wait(self):
+        limiter = RateLimiter("test/model")
+        for _ in range(100):
+            self.assertEqual(limiter.reserve(1000), 0.0)
+
+    def test_reservations_queue_in_arrival_order(self):
+        limiter = RateLimiter("test/model", requests_per_minute=60)
+        waits = [limiter.reserve(0) for _ in range(63)]
+        self.assertEqual(waits[:60], [0.0] * 60)
+        # One request per second refills, each later request waits about a second longer
+        self.assertAlmostEqual(waits[60], 1.0, delta=0.1)
+        self.assertAlmostEqual(waits[62], 3.0, delta=0.1)
+
+    def test_token_limit(self):
+        limiter = RateLimiter("test/model", tokens_per_minute=600)
+        self.assertEqual(limiter.reserve(600), 0.0)
+        self.assertAlmostEqual(limiter.reserve(300), 30.0, delta=0.1)
+
+    def test_release_gives_back_the_reservation(self):
+        limiter = RateLimiter("test/model", requests_per_minute=1)
+        limiter.reserve(0)
+        limiter.release(0)
+        self.assertEqual(limiter.reserve(0), 0.0)
+
+    def test_acquire_raises_instead_of_waiting_past_max_wait(self):
+        limiter = RateLimiter("test/model", requests_per_minute=1)
+        self.assertEqual(asyncio.run(limiter.acquire(max_wait=1)), 0.0)
+        with self.assertRaises(RateLimitExceeded):
+            asyncio.run(limiter.acquire(max_wait=1))
+        # The failed request did not keep its reservation
+        self.assertAlmostEqual(limiter.reserve(0), 60.0, delta=0.1)
+        self.assertEqual(limiter.stats()["requests"], 1)
+
+    def test_learns_limits_from_headers(self):
+        limiter = RateLimiter("test/model")
+        limiter.observe(
+            200,
+            {
+                "x-ratelimit-limit-requests": "500",
+                "x-ratelimit-remaining-requests": "0",
+                "x-ratelimit-limit-tokens": "30000",
+                "x-ratelimit-remaining-tokens": "29000",
+            },
+        )
+        stats = limiter.stats()
+        self.assertEqual(stats["requests_per_minute"], 500)
+        self.assertEqual(stats["tokens_per_minute"], 30000)
+        # Other clients used up the requests, the next one waits for a refill
+        self.assertAlmostEqual(limiter.reserve(0), 60 / 500, delta=0.01)
+
+    def test_learns_anthropic_headers(self):
+        limiter = RateLimiter("test/model")
+        limiter.observe(200, {"anthropic-ratelimit-requests-limit": "50"})
+        self.assertEqual(limiter.stats()["requests_per_minute"], 50)
+
+    def test_429_holds_back_every_request(self):
+        limiter = RateLimiter("test/model")
+        limiter.observe(429, {"retry-after": "5"})
+        self.assertAlmostEqual(limiter.reserve(0), 5.0, delta=0.1)
+        self.assertAlmostEqual(limiter.reserve(0), 5.0, delta=0.1)
+        self.assertEqual(limiter.stats()["throttled"], 1)
+
+    def test_settle_charges_the_actual_tokens(self):
+        limiter = RateLimiter("test/model", tokens_per_minute=600)
+        asyncio.run(limiter.acquire())
+        limiter.settle(0, 600)
+        self.assertEqual(limiter.token_estimate, 600)
+        self.assertAlmostEqual(limiter.reserve(0), 0.0, delta=0.1)
+        self.assertAlmostEqual(limiter.reserve(60), 6.0, delta=0.1)
+
+    def test_file_shares_the_buckets_between_limiters(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = RateLimiters().get("test", "model", requests_per_minute=1, directory=directory)
+            second = RateLimiters().get("test", "model", requests_per_minute=1, directory=directory)
+            self.assertIsNot(first, second)
+            self.assertEqual(os.path.dirname(first.path), directory)
+            self.assertEqual(first.reserve(0), 0.0)
+            self.assertAlmostEqual(second.reserve(0), 60.0, delta=0.1)
+
+
+class TestRateLimiters(unittest.TestCase):
+    def test_one_limiter_per_provider_and_model(self):
+        limiters = RateLimiters()
+        limiter = limiters.get("openai", "gpt-4o", requests_per_minute=10)
+        self.assertIs(limiters.get("openai", "gpt-4o"), limiter)
+        self.assertIsNot(limiters.get("openai", "gpt-4.1"), limiter)
+        self.assertEqual(set(limiters.stats()), {"openai/gpt-4o", "openai/gpt-4.1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
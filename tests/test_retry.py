@@ -0,0 +1,118 @@
+import json
+import time
+import unittest
+
+from operate.exceptions import (
+    APIError,
+    ModelNotRecognizedException,
+    ModelResponseError,
+    OCRError,
+    RetryBudgetExceeded,
+)
+from operate.models import retry
+from operate.models.retry import RetryBudget, classify, header_delay
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = _Response(status_code, headers)
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class TestClassify(unittest.TestCase):
+    def test_kinds(self):
+        for error, kind in [
+            (_HTTPError(429), retry.RATE_LIMIT),
+            (RateLimitError("slow down"), retry.RATE_LIMIT),
+            (_HTTPError(503), retry.TRANSIENT),
+            (_HTTPError(408), retry.TRANSIENT),
+            (_HTTPError(401), retry.FATAL),
+            (ModelNotRecognizedException("gpt-0"), retry.FATAL),
+            (ConnectionError(), retry.TRANSIENT),
+            (OCRError(), retry.OCR_MISS),
+            (ModelResponseError(), retry.PARSE),
+            (json.JSONDecodeError("bad", "", 0), retry.PARSE),
+            (ValueError(), retry.TRANSIENT),
+        ]:
+            with self.subTest(error=error):
+                self.assertEqual(classify(error), kind)
+
+    def test_looks_at_the_errors_it_was_raised_from(self):
+        try:
+            try:
+                raise _HTTPError(429)
+            except _HTTPError as error:
+                raise APIError("The fallback failed") from error
+        except APIError as error:
+            self.assertEqual(classify(error), retry.RATE_LIMIT)
+
+
+class TestHeaderDelay(unittest.TestCase):
+    def test_headers(self):
+        self.assertEqual(header_delay({"retry-after": "7"}), 7.0)
+        self.assertEqual(header_delay({"retry-after-ms": "1500", "retry-after": "7"}), 1.5)
+        self.assertIsNone(header_delay({}))
+        self.assertIsNone(header_delay({"retry-after": "soon"}))
+        self.assertEqual(header_delay({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}), 0.0)
+
+
+class TestRetryBudget(unittest.TestCase):
+    def test_backoff_doubles_and_is_jittered(self):
+        budget = RetryBudget(max_attempts=10, step_timeout=0, session_timeout=0)
+        for failures in range(1, 5):
+            backoff = retry.BASE_DELAYS[retry.TRANSIENT] * 2 ** (failures - 1)
+            delay = budget.retry_delay(ConnectionError())
+            self.assertGreaterEqual(delay, backoff / 2)
+            self.assertLessEqual(delay, backoff)
+        self.assertEqual(budget.retries, {retry.TRANSIENT: 4})
+
+    def test_backoff_is_capped_unless_the_server_asks_for_more(self):
+        budget = RetryBudget(max_attempts=10, step_timeout=0, session_timeout=0, max_delay=1.0)
+        for _ in range(5):
+            self.assertLessEqual(budget.retry_delay(_HTTPError(429)), 1.0)
+        self.assertGreaterEqual(budget.retry_delay(_HTTPError(429, {"retry-after": "20"})), 20.0)
+
+    def test_parse_errors_are_retried_right_away(self):
+        budget = RetryBudget()
+        self.assertEqual(budget.retry_delay(ModelResponseError()), 0.0)
+
+    def test_gives_up_after_max_attempts(self):
+        budget = RetryBudget(max_attempts=2)
+        budget.retry_delay(ModelResponseError())
+        with self.assertRaises(RetryBudgetExceeded):
+            budget.retry_delay(ModelResponseError())
+        budget.start_step()
+        self.assertEqual(budget.retry_delay(ModelResponseError()), 0.0)
+
+    def test_fatal_errors_only_go_to_the_fallback(self):
+        budget = RetryBudget()
+        self.assertEqual(budget.retry_delay(_HTTPError(401), fallback=True), 0.0)
+        with self.assertRaises(RetryBudgetExceeded):
+            budget.retry_delay(_HTTPError(401))
+
+    def test_gives_up_when_the_backoff_passes_the_deadline(self):
+        budget = RetryBudget(step_timeout=5)
+        with self.assertRaises(RetryBudgetExceeded):
+            budget.retry_delay(_HTTPError(429, {"retry-after": "10"}))
+
+    def test_deadline_is_the_earlier_of_step_and_session(self):
+        budget = RetryBudget(step_timeout=60, session_timeout=30)
+        self.assertAlmostEqual(budget.deadline(), budget.session_start + 30)
+        self.assertIsNone(RetryBudget(step_timeout=0, session_timeout=0).remaining())
+        budget.step_start = time.time() - 120
+        budget.step_timeout = 60
+        self.assertEqual(budget.remaining(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
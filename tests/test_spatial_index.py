@@ -0,0 +1,85 @@
+import random
+import unittest
+
+import numpy as np
+
+from operate.utils.geometry import BoxArray
+from operate.utils.spatial_index import SpatialIndex
+
+FRAME_SIZE = (1000, 800)
+
+
+def _index(text_boxes=(), detection_boxes=(), cell_size=64):
+    texts = BoxArray(np.array(text_boxes, dtype=np.float64), FRAME_SIZE) if text_boxes else None
+    detections = BoxArray(np.array(detection_boxes, dtype=np.float64), FRAME_SIZE) if detection_boxes else None
+    return SpatialIndex.build(FRAME_SIZE, ocr_result=texts, detections=detections, cell_size=cell_size)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def test_empty(self):
+        index = _index()
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.within(0, 0, 1, 1), [])
+        self.assertEqual(index.at_point(0.5, 0.5), [])
+        self.assertIsNone(index.nearest((0, 0, 10, 10)))
+
+    def test_within_returns_centered_elements_in_reading_order(self):
+        index = _index(
+            text_boxes=[(500, 100, 600, 120), (100, 100, 200, 120), (100, 300, 200, 320)],
+            detection_boxes=[(90, 90, 610, 130)],
+        )
+        found = index.within(0, 0, 0.7, 0.2)
+        self.assertEqual([(element.kind, element.index) for element in found], [
+            ("detection", 0),
+            ("text", 1),
+            ("text", 0),
+        ])
+        self.assertEqual([element.index for element in index.within(0, 0, 0.7, 0.2, kinds=("text",))], [1, 0])
+
+    def test_within_matches_a_linear_scan(self):
+        random.seed(7)
+        boxes = []
+        for _ in range(300):
+            x, y = random.uniform(0, 950), random.uniform(0, 770)
+            boxes.append((x, y, x + random.uniform(5, 50), y + random.uniform(5, 30)))
+        index = _index(text_boxes=boxes)
+        array = BoxArray(np.array(boxes), FRAME_SIZE)
+        for region in [(0.1, 0.1, 0.3, 0.2), (0.0, 0.5, 1.0, 0.1), (0.42, 0.42, 0.05, 0.05)]:
+            with self.subTest(region=region):
+                expected = set(np.nonzero(array.in_region(*region))[0].tolist())
+                self.assertEqual({element.index for element in index.within(*region)}, expected)
+
+    def test_at_point_returns_the_smallest_element_first(self):
+        index = _index(text_boxes=[(110, 110, 150, 130)], detection_boxes=[(100, 100, 400, 200)])
+        found = index.at_point(0.13, 0.15)
+        self.assertEqual([element.kind for element in found], ["text", "detection"])
+        self.assertEqual(index.at_point(0.9, 0.9), [])
+
+    def test_nearest_to_the_right_and_below(self):
+        label = (100, 100, 160, 120)
+        index = _index(
+            detection_boxes=[
+                (400, 95, 600, 125),  # right, further away
+                (180, 98, 380, 122),  # right, closest
+                (100, 140, 300, 170),  # below
+                (180, 300, 380, 330),  # neither aligned right nor below
+            ]
+        )
+        self.assertEqual(index.nearest(label, "right").index, 1)
+        self.assertEqual(index.nearest(label, "below").index, 2)
+        # A gap larger than max_distance is not a neighbour
+        self.assertIsNone(index.nearest(label, "right", max_distance=0.01))
+
+    def test_nearest_filters_kinds(self):
+        label = (100, 100, 160, 120)
+        index = _index(text_boxes=[(170, 100, 220, 120)], detection_boxes=[(300, 98, 500, 122)])
+        self.assertEqual(index.nearest(label, "right").kind, "text")
+        self.assertEqual(index.nearest(label, "right", kinds=("detection",)).index, 0)
+
+    def test_nearest_rejects_unknown_directions(self):
+        with self.assertRaises(ValueError):
+            _index().nearest((0, 0, 1, 1), "left")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+from operate.utils.text_index import TextIndex
+
+
+def _result(*texts):
+    # EasyOCR results: a box, the text and a confidence per element
+    return [
+        ([[0, 40 * i], [100, 40 * i], [100, 40 * i + 30], [0, 40 * i + 30]], text, 0.9)
+        for i, text in enumerate(texts)
+    ]
+
+
+class TestTextIndex(unittest.TestCase):
+    def test_different_words_do_not_match(self):
+        for query, text in [
+            ("Save", "Sale"),
+            ("Deselect", "Select"),
+            ("Cancel", "Cancal"),
+            ("Open", "Opera"),
+            ("Next", "Text"),
+        ]:
+            with self.subTest(query=query, text=text):
+                self.assertIsNone(TextIndex(_result(text)).best(query))
+
+    def test_misreads_and_substrings_match(self):
+        for query, text in [
+            ("Submit", "Submlt"),
+            ("Password", "Passw0rd"),
+            ("Settings", "Setings"),
+            ("Sign in", "SIGN IN"),
+            ("Save", "Save as..."),
+        ]:
+            with self.subTest(query=query, text=text):
+                match = TextIndex(_result(text)).best(query)
+                self.assertIsNotNone(match)
+                self.assertEqual(match.text, text)
+
+    def test_exact_match_wins_over_misread(self):
+        index = TextIndex(_result("Sale", "Save", "Save draft"))
+        self.assertEqual(index.best("Save").text, "Save")
+
+
+if __name__ == "__main__":
+    unittest.main()
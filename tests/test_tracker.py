@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from operate.utils.frame import Frame
+from operate.utils.geometry import BoxArray
+from operate.utils.tracker import ElementTracker
+
+SIZE = (1280, 800)
+
+
+def _frame(boxes):
+    image = Image.new("RGB", SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for x1, y1, x2, y2 in boxes:
+        draw.rectangle((x1, y1, x2 - 1, y2 - 1), fill="black")
+    return Frame(image)
+
+
+class _Detector:
+    """
+    Detects the filled black rectangles of an image or crop.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def detect(self, image):
+        self.calls.append(image.size)
+        dark = np.asarray(image.convert("L")) < 128
+        boxes = []
+        while dark.any():
+            y, x = np.argwhere(dark)[0]
+            x2 = x
+            while x2 < dark.shape[1] and dark[y, x2]:
+                x2 += 1
+            y2 = y
+            while y2 < dark.shape[0] and dark[y2, x]:
+                y2 += 1
+            dark[y:y2, x:x2] = False
+            boxes.append((x, y, x2, y2))
+        return BoxArray(np.array(boxes, dtype=np.float64).reshape(-1, 4), image.size)
+
+
+def _ids_by_box(ids, boxes):
+    return {tuple(int(value) for value in box): int(id_) for id_, box in zip(ids, boxes.xyxy)}
+
+
+class TestElementTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = ElementTracker()
+        self.detector = _Detector()
+
+    def test_first_frame_is_detected_in_full(self):
+        ids, boxes = self.tracker.update(_frame([(100, 100, 200, 140), (300, 100, 400, 140)]), self.detector)
+        self.assertEqual(sorted(ids.tolist()), [0, 1])
+        self.assertEqual(len(boxes), 2)
+        self.assertEqual(self.detector.calls, [SIZE])
+        self.assertEqual(self.tracker.stats()["full_detections"], 1)
+
+    def test_unchanged_frame_reuses_everything(self):
+        boxes = [(100, 100, 200, 140), (300, 100, 400, 140)]
+        first_ids, _ = self.tracker.update(_frame(boxes), self.detector)
+        ids, _ = self.tracker.update(_frame(boxes), self.detector)
+        self.assertEqual(ids.tolist(), first_ids.tolist())
+        self.assertEqual(len(self.detector.calls), 1)
+        self.assertEqual(self.tracker.stats()["reused_frames"], 1)
+
+    def test_ids_carry_over_and_new_elements_get_new_ids(self):
+        button, field = (100, 100, 200, 140), (900, 600, 1100, 640)
+        first = _ids_by_box(*self.tracker.update(_frame([button, field]), self.detector))
+
+        popup = (900, 100, 1000, 130)
+        ids = _ids_by_box(*self.tracker.update(_frame([button, field, popup]), self.detector))
+        self.assertEqual(ids[button], first[button])
+        self.assertEqual(ids[field], first[field])
+        self.assertEqual(ids[popup], 2)
+        # Only the changed area was detected again
+        self.assertLess(self.detector.calls[-1][0] * self.detector.calls[-1][1], SIZE[0] * SIZE[1] / 4)
+        self.assertEqual(self.tracker.stats()["partial_detections"], 1)
+
+    def test_redrawn_element_keeps_its_id(self):
+        button, field = (100, 100, 200, 140), (900, 600, 1100, 640)
+        first = _ids_by_box(*self.tracker.update(_frame([button, field]), self.detector))
+        moved = (102, 100, 202, 140)
+        ids = _ids_by_box(*self.tracker.update(_frame([moved, field]), self.detector))
+        self.assertEqual(ids[moved], first[button])
+        self.assertEqual(ids[field], first[field])
+        self.assertEqual(len(ids), 2)
+
+    def test_removed_element_is_dropped(self):
+        button, field = (100, 100, 200, 140), (900, 600, 1100, 640)
+        first = _ids_by_box(*self.tracker.update(_frame([button, field]), self.detector))
+        ids = _ids_by_box(*self.tracker.update(_frame([field]), self.detector))
+        self.assertEqual(ids, {field: first[field]})
+
+    def test_large_change_is_detected_in_full(self):
+        self.tracker.update(_frame([(100, 100, 200, 140)]), self.detector)
+        self.tracker.update(_frame([(0, 0, 1280, 500), (100, 600, 200, 640)]), self.detector)
+        self.assertEqual(self.detector.calls[-1], SIZE)
+        self.assertEqual(self.tracker.stats()["full_detections"], 2)
+
+    def test_reset_forgets_ids(self):
+        self.tracker.update(_frame([(100, 100, 200, 140)]), self.detector)
+        self.tracker.reset()
+        ids, _ = self.tracker.update(_frame([(300, 300, 400, 340)]), self.detector)
+        self.assertEqual(ids.tolist(), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()